@@ -0,0 +1,67 @@
+import numpy as np
+from tstrait import genotype
+
+from .common import NUM_INDIVIDUALS
+from .common import RECURRENT
+from .common import tree_sequence
+
+
+class _Genotype:
+    timeout = 1200
+
+    def setup(self, *args):
+        self.ts = tree_sequence(**self.ts_kwargs(*args))
+        self.engine = genotype.GenotypeEngine(self.ts)
+        self.site_id = np.arange(self.ts.num_sites)
+        # Causal sites of the tree with the largest number of sites
+        tree_num_sites = [tree.num_sites for tree in self.ts.trees()]
+        self.tree = self.ts.at_index(int(np.argmax(tree_num_sites)))
+        self.tree_site = list(self.tree.sites())
+        self.tree_site_id = np.array([site.id for site in self.tree_site])
+        allele_offset, allele_mutation, _ = self.engine.allele_count(self.tree_site_id)
+        self.tree_causal_code = np.array(
+            [
+                self.engine.allele_code(site.id, allele_mutation[allele_offset[j]])
+                for j, site in enumerate(self.tree_site)
+            ],
+            dtype=np.int32,
+        )
+        # Compile the numba kernels before timing
+        self.time_tree_genotype_matrix()
+        self.engine.allele_count(self.site_id[:1])
+
+    def time_allele_count(self, *args):
+        self.engine.allele_count(self.site_id)
+
+    def peakmem_allele_count(self, *args):
+        self.engine.allele_count(self.site_id)
+
+    def time_site_frequency(self, *args):
+        self.engine._site_frequency = None
+        self.engine.site_frequency()
+
+    def time_tree_genotype_matrix(self, *args):
+        self.engine.tree_genotype_matrix(
+            self.tree, self.tree_site_id, self.tree_causal_code
+        )
+
+    def peakmem_tree_genotype_matrix(self, *args):
+        self.engine.tree_genotype_matrix(
+            self.tree, self.tree_site_id, self.tree_causal_code
+        )
+
+
+class GenotypeIndividuals(_Genotype):
+    params = [NUM_INDIVIDUALS]
+    param_names = ["num_individuals"]
+
+    def ts_kwargs(self, num_individuals):
+        return dict(num_individuals=num_individuals)
+
+
+class GenotypeRecurrent(_Genotype):
+    params = [RECURRENT]
+    param_names = ["recurrent"]
+
+    def ts_kwargs(self, recurrent):
+        return dict(recurrent=recurrent)
@@ -0,0 +1,12 @@
+class TimeImport:
+    """
+    Time of importing tstrait in a new interpreter. The simulation module and
+    numba are loaded on first use, so this should stay close to the import
+    time of numpy.
+    """
+
+    def timeraw_import_tstrait(self):
+        return "import tstrait"
+
+    def timeraw_import_simulate_phenotype(self):
+        return "import tstrait.simulate_phenotype"
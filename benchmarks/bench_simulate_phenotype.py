@@ -0,0 +1,108 @@
+import numpy as np
+import tstrait
+
+from .common import NUM_CAUSAL
+from .common import NUM_INDIVIDUALS
+from .common import RECOMBINATION_RATE
+from .common import RECURRENT
+from .common import SEQUENCE_LENGTH
+from .common import tree_sequence
+
+
+class _SimPhenotype:
+    timeout = 1200
+
+    def setup(self, *args):
+        self.ts = tree_sequence(**self.ts_kwargs(*args))
+        self.num_causal = min(self.num_causal(*args), self.ts.num_sites)
+        self.model = tstrait.TraitModelAdditive(trait_mean=0, trait_var=1)
+        # Compile the numba kernels before timing
+        tstrait.sim_phenotype(
+            self.ts, num_causal=1, model=self.model, h2=0.3, random_seed=1
+        )
+
+    def num_causal(self, *args):
+        return 100
+
+    def time_sim_phenotype(self, *args):
+        tstrait.sim_phenotype(
+            self.ts,
+            num_causal=self.num_causal,
+            model=self.model,
+            h2=0.3,
+            random_seed=1,
+        )
+
+    def peakmem_sim_phenotype(self, *args):
+        self.time_sim_phenotype(*args)
+
+    def time_sim_genetic_value(self, *args):
+        simulator = tstrait.PhenotypeSimulator(
+            self.ts,
+            num_causal=self.num_causal,
+            h2=0.3,
+            model=self.model,
+            random_seed=1,
+        )
+        simulator.sim_genetic_value()
+
+    def peakmem_sim_genetic_value(self, *args):
+        self.time_sim_genetic_value(*args)
+
+
+class SimPhenotypeIndividuals(_SimPhenotype):
+    params = [NUM_INDIVIDUALS, NUM_CAUSAL]
+    param_names = ["num_individuals", "num_causal"]
+
+    def ts_kwargs(self, num_individuals, num_causal):
+        return dict(num_individuals=num_individuals)
+
+    def num_causal(self, num_individuals, num_causal):
+        return num_causal
+
+
+class SimPhenotypeSites(_SimPhenotype):
+    params = [SEQUENCE_LENGTH]
+    param_names = ["sequence_length"]
+
+    def ts_kwargs(self, sequence_length):
+        return dict(sequence_length=sequence_length)
+
+
+class SimPhenotypeRecombination(_SimPhenotype):
+    params = [RECOMBINATION_RATE]
+    param_names = ["recombination_rate"]
+
+    def ts_kwargs(self, recombination_rate):
+        return dict(recombination_rate=recombination_rate)
+
+
+class SimPhenotypeRecurrent(_SimPhenotype):
+    params = [RECURRENT]
+    param_names = ["recurrent"]
+
+    def ts_kwargs(self, recurrent):
+        return dict(recurrent=recurrent)
+
+
+class SimEnvironmentNoise:
+    params = [NUM_INDIVIDUALS, [1, 10]]
+    param_names = ["num_individuals", "num_replicates"]
+
+    def setup(self, num_individuals, num_replicates):
+        rng = np.random.default_rng(1)
+        self.genetic_value = rng.normal(size=(num_individuals, num_replicates))
+        model = tstrait.TraitModelAdditive(trait_mean=0, trait_var=1)
+        self.simulator = tstrait.PhenotypeSimulator(
+            tree_sequence(num_individuals=100),
+            num_causal=1,
+            h2=0.3,
+            model=model,
+            random_seed=1,
+        )
+
+    def time_sim_environment_noise(self, num_individuals, num_replicates):
+        self.simulator._sim_environment_noise(self.genetic_value)
+
+    def peakmem_sim_environment_noise(self, num_individuals, num_replicates):
+        self.simulator._sim_environment_noise(self.genetic_value)
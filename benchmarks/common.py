@@ -0,0 +1,71 @@
+"""
+Tree sequences that are used by the benchmarks. They are simulated with msprime on
+first use and saved in a cache directory, so that they are only simulated once
+across benchmark processes and commits. The directory can be set with the
+`TSTRAIT_BENCHMARK_CACHE` environment variable.
+"""
+import os
+import tempfile
+
+import msprime
+import tskit
+
+CACHE_DIR = os.environ.get(
+    "TSTRAIT_BENCHMARK_CACHE",
+    os.path.join(tempfile.gettempdir(), "tstrait-benchmarks"),
+)
+
+# Scale regimes of the benchmarks. The default tree sequence has 10^4 individuals,
+# about 4,000 trees and 4,000 sites, and each grid varies one of its parameters.
+NUM_INDIVIDUALS = [10**2, 10**4, 10**6]
+SEQUENCE_LENGTH = [10**5, 10**6, 10**7]
+RECOMBINATION_RATE = [1e-9, 1e-8, 1e-7]
+RECURRENT = [False, True]
+NUM_CAUSAL = [1, 100, 1000]
+
+DEFAULT_NUM_INDIVIDUALS = 10**4
+DEFAULT_SEQUENCE_LENGTH = 10**6
+DEFAULT_RECOMBINATION_RATE = 1e-8
+DEFAULT_MUTATION_RATE = 1e-8
+
+
+def tree_sequence(
+    num_individuals=DEFAULT_NUM_INDIVIDUALS,
+    sequence_length=DEFAULT_SEQUENCE_LENGTH,
+    recombination_rate=DEFAULT_RECOMBINATION_RATE,
+    recurrent=False,
+):
+    """
+    Returns a tree sequence of diploid individuals. If `recurrent` is True, the
+    mutations are simulated on a discrete genome with a hundred times higher
+    mutation rate on a hundred times shorter genome, so that the number of sites is
+    similar but many sites have more than one mutation.
+    """
+    mutation_rate = DEFAULT_MUTATION_RATE
+    if recurrent:
+        sequence_length //= 100
+        mutation_rate *= 100
+    filename = os.path.join(
+        CACHE_DIR,
+        f"n{num_individuals}_L{sequence_length}_r{recombination_rate}"
+        f"_u{mutation_rate}_{recurrent}.trees",
+    )
+    if os.path.exists(filename):
+        return tskit.load(filename)
+    ts = msprime.sim_ancestry(
+        samples=num_individuals,
+        sequence_length=sequence_length,
+        recombination_rate=recombination_rate,
+        population_size=10**4,
+        random_seed=1,
+    )
+    ts = msprime.sim_mutations(
+        ts, rate=mutation_rate, discrete_genome=recurrent, random_seed=1
+    )
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write to a temporary file first, so that benchmark processes that run at the
+    # same time never load a partially written file.
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, delete=False) as f:
+        ts.dump(f)
+    os.replace(f.name, filename)
+    return ts
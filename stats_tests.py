@@ -1,16 +1,31 @@
+"""
+Statistical validation of the simulated genetic values and environmental noise.
+The replicates of each simulation setting are simulated with
+:func:`sim_phenotype_replicates` in chunks that are processed in parallel worker
+processes, and their distribution is compared with the expected distribution by
+Kolmogorov-Smirnov and Anderson-Darling tests. A check fails if the p-value of
+either test is below the significance level divided by the number of tests of the
+run (Bonferroni correction), so that the significance level bounds the probability
+that a correct simulation fails any check. QQ plots are only drawn if `--plot` is
+given, which requires matplotlib and statsmodels.
+
+Usage:
+    python stats_tests.py [--num-replicates N] [--num-workers N] [--plot] [TEST ...]
+"""
+import argparse
+import concurrent.futures
 import inspect
 import itertools
+import multiprocessing
+import os
 import pathlib
 import sys
 
-import matplotlib.pyplot as plt
 import numpy as np
 import scipy.stats as stats
-import statsmodels.api as sm
 import tskit
 import tstrait.simulate_phenotype as simulate_phenotype
 import tstrait.trait_model as trait_model
-from tqdm import tqdm
 
 
 def sim_tree_seq():
@@ -30,7 +45,7 @@ def sim_tree_seq():
 
     Individual 0: Node 0 and 1
     Individual 1: Node 2 and 3
-    Individual 3: Node 4 and 5
+    Individual 2: Node 4 and 5
 
     Site 0 Ancestral State: "A"
         Causal Mutation: Node 8
@@ -85,8 +100,10 @@ def sim_tree_internal():
     0  1  2  3
 
     Individual 0: Node 4 and 5
-    Individual 1: Node 2 and 3
-    Individual 3: Node 4 and 5
+    Individual 1: Node 0 and 1
+    Individual 2: Node 2 and 3
+
+    The internal nodes 4 and 5 are sample nodes.
 
     Site 0 Ancestral State: "A"
         Causal Mutation: Node 4
@@ -123,6 +140,10 @@ def sim_tree_internal():
     individuals[4] = 0
     individuals[5] = 0
     tables.nodes.individual = individuals
+    flags = tables.nodes.flags
+    flags[4] = tskit.NODE_IS_SAMPLE
+    flags[5] = tskit.NODE_IS_SAMPLE
+    tables.nodes.flags = flags
 
     tables.mutations.add_row(site=0, node=4, derived_state="T")
     tables.mutations.add_row(site=1, node=2, derived_state="T")
@@ -132,21 +153,150 @@ def sim_tree_internal():
     return ts
 
 
+TREE_SEQUENCES = {"sim_tree_seq": sim_tree_seq, "sim_tree_internal": sim_tree_internal}
+
+
+def simulate_chunk(ts_name, alpha, trait_mean, trait_var, h2, num_replicates, seed):
+    """
+    Simulates a chunk of replicates with two causal sites in a worker process, and
+    returns the genetic values and the environmental noise, with one row per
+    individual and one column per replicate.
+    """
+    ts = TREE_SEQUENCES[ts_name]()
+    model = trait_model.TraitModelAlleleFrequency(trait_mean, trait_var, alpha)
+    sim_result = simulate_phenotype.sim_phenotype_replicates(
+        ts,
+        num_causal=2,
+        model=model,
+        h2=h2,
+        num_replicates=num_replicates,
+        random_seed=seed,
+    )
+    phenotype_result = sim_result.phenotype
+    return phenotype_result.genetic_value, phenotype_result.environment_noise
+
+
+def effect_size_distribution(freq, alpha, trait_mean, trait_var, num_causal=2):
+    """
+    Returns the mean and standard deviation of the effect size of a causal site
+    with causal allele frequency `freq`.
+
+    SD Formula:
+        trait_sd / sqrt(num_causal) * [sqrt(2 * freq * (1 - freq))] ^ alpha
+    """
+    scale = np.sqrt(pow(2 * freq * (1 - freq), alpha))
+    mean = trait_mean / num_causal * scale
+    sd = np.sqrt(trait_var / num_causal) * scale
+    return mean, sd
+
+
+def _anderson_darling_pvalue(statistic):
+    """
+    Returns the p-value of an Anderson-Darling statistic from its asymptotic
+    distribution, which is computed by the approximation of Marsaglia and
+    Marsaglia (2004).
+    """
+    z = statistic
+    if z < 2:
+        cdf = (
+            np.exp(-1.2337141 / z)
+            / np.sqrt(z)
+            * (
+                2.00012
+                + (
+                    0.247105
+                    - (0.0649821 - (0.0347962 - (0.011672 - 0.00168691 * z) * z) * z)
+                    * z
+                )
+                * z
+            )
+        )
+    else:
+        cdf = np.exp(
+            -np.exp(
+                1.0776
+                - (
+                    2.30695
+                    - (0.43424 - (0.082433 - (0.008056 - 0.0003146 * z) * z) * z) * z
+                )
+                * z
+            )
+        )
+    return 1 - cdf
+
+
+def anderson_darling(data, dist):
+    """
+    Anderson-Darling test of `data` against a fully specified continuous
+    distribution `dist` (a frozen scipy.stats distribution). Returns the statistic
+    and its asymptotic p-value.
+    """
+    x = np.sort(data)
+    n = len(x)
+    i = np.arange(1, n + 1)
+    statistic = -n - np.mean((2 * i - 1) * (dist.logcdf(x) + dist.logsf(x[::-1])))
+    return statistic, _anderson_darling_pvalue(statistic)
+
+
+def anderson_darling_2samp(x, y):
+    """
+    Two-sample Anderson-Darling test of Pettitt (1976) for continuous samples.
+    The statistic has the same asymptotic distribution as the one-sample
+    statistic, so its p-value is not capped, unlike the p-value of
+    :func:`scipy.stats.anderson_ksamp`. Returns the statistic and its asymptotic
+    p-value.
+    """
+    m = len(x)
+    n = len(y)
+    N = m + n
+    is_x = np.concatenate([np.ones(m), np.zeros(n)])[np.argsort(np.concatenate([x, y]))]
+    i = np.arange(1, N)
+    M = np.cumsum(is_x)[:-1]
+    statistic = np.sum((M * N - m * i) ** 2 / (i * (N - i))) / (m * n)
+    return statistic, _anderson_darling_pvalue(statistic)
+
+
+class _SerialExecutor:
+    """
+    Executor that runs the simulations in the current process.
+    """
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self):
+        pass
+
+
 class Test:
-    def __init__(self, basedir, cl_name):
+    def __init__(
+        self,
+        basedir,
+        cl_name,
+        executor,
+        num_replicates=10_000,
+        chunk_size=1000,
+        plot=False,
+        random_seed=1,
+    ):
         self.basedir = basedir
         self.name = cl_name
-        self.set_output_dir(cl_name)
+        self.executor = executor
+        self.num_replicates = num_replicates
+        self.chunk_size = chunk_size
+        self.plot = plot
+        self.seed_sequence = np.random.SeedSequence(random_seed)
+        self.results = []
+        if plot:
+            self.set_output_dir(cl_name)
 
     def set_output_dir(self, cl_name):
         output_dir = pathlib.Path(self.basedir) / cl_name
         output_dir.mkdir(parents=True, exist_ok=True)
         self.output_dir = output_dir
 
-    def require_output_dir(self, folder_name):
-        output_dir = self.output_dir / folder_name
-        output_dir.mkdir(parents=True, exist_ok=True)
-
     def _get_tests(self):
         return [
             value
@@ -161,10 +311,80 @@ class Test:
         for method in all_results:
             method()
 
+    def submit(self, ts_name, alpha, trait_mean, trait_var, h2):
+        """
+        Submits the replicates of a simulation setting to the executor in chunks of
+        `chunk_size` replicates, each with its own random seed. Returns the list of
+        futures, whose outputs are combined by :meth:`collect`.
+        """
+        num_chunks = -(-self.num_replicates // self.chunk_size)
+        futures = []
+        for j, seed in enumerate(self.seed_sequence.spawn(num_chunks)):
+            num_replicates = min(
+                self.chunk_size, self.num_replicates - j * self.chunk_size
+            )
+            futures.append(
+                self.executor.submit(
+                    simulate_chunk,
+                    ts_name,
+                    alpha,
+                    trait_mean,
+                    trait_var,
+                    h2,
+                    num_replicates,
+                    int(seed.generate_state(1)[0]),
+                )
+            )
+        return futures
+
+    def collect(self, futures):
+        """
+        Returns the genetic values and the environmental noise of all replicates of
+        a simulation setting, with one row per individual and one column per
+        replicate.
+        """
+        genetic_value, environment_noise = zip(*(f.result() for f in futures))
+        return np.hstack(genetic_value), np.hstack(environment_noise)
+
+    def _record(self, check, ks_pvalue, ad_pvalue):
+        self.results.append((self.name, check, ks_pvalue, ad_pvalue))
+
+    def check_normal(self, data, loc, scale, check, title=""):
+        """
+        Compares `data` with a normal distribution.
+        """
+        dist = stats.norm(loc=loc, scale=scale)
+        ks = stats.kstest(data, dist.cdf)
+        _, ad_pvalue = anderson_darling(data, dist)
+        self._record(check, ks.pvalue, ad_pvalue)
+        if self.plot:
+            self.plot_qq_normal(data, loc, scale, check, title)
+
+    def check_two_sample(self, data, reference, check, x_label, title=""):
+        """
+        Compares `data` with a sample from the expected distribution.
+        """
+        ks = stats.ks_2samp(data, reference)
+        _, ad_pvalue = anderson_darling_2samp(data, reference)
+        self._record(check, ks.pvalue, ad_pvalue)
+        if self.plot:
+            self.plot_qq_compare(data, reference, x_label, "Simulated values", check)
+
+    def check_equal(self, data, expected, check):
+        """
+        Checks that `data` is exactly equal to `expected`, which is recorded with
+        p-values of 1 or 0.
+        """
+        pvalue = float(np.array_equal(data, expected))
+        self._record(check, pvalue, pvalue)
+
     def _build_filename(self, filename, extension=".png"):
         return self.output_dir / (filename + extension)
 
     def plot_qq_compare(self, v1, v2, x_label, y_label, filename, title=""):
+        import matplotlib.pyplot as plt
+        import statsmodels.api as sm
+
         sm.qqplot_2samples(v1, v2, x_label, y_label, line="45")
         plt.title(title)
         f = self._build_filename(filename)
@@ -172,6 +392,9 @@ class Test:
         plt.close("all")
 
     def plot_qq_normal(self, data, loc, scale, filename, title=""):
+        import matplotlib.pyplot as plt
+        import statsmodels.api as sm
+
         sm.qqplot(data, stats.norm, loc=loc, scale=scale, line="45")
         plt.title(title)
         f = self._build_filename(filename)
@@ -194,138 +417,63 @@ class TestGenetic(Test):
 
         Site 1 Genotype:
             [A, A, A, A, A, T]
-            Ancestral state: T
+            Ancestral state: A
             Causal allele freq: 1/6
             Individual 0: 0 causal
             Individual 1: 0 causal
             Individual 2: 1 causal
 
-        Effect size distribution:
-
-        SD Formula:
-            trait_sd / sqrt(2) * [sqrt(2 * freq * (1 - freq))] ^ alpha
-            sqrt(2) from 2 causal sites
-
         Environmental noise is simulated from a normal distribution where standard
-        deviation depends on the variance of the simulated genetic values
+        deviation depends on the variance of the simulated genetic values, so it is
+        compared with a sample that is simulated from the effect size distribution.
         """
-        rng = np.random.default_rng(1)
-        alpha_array = np.array([0, -0.3])
-        trait_mean_array = np.array([0, 1])
-        trait_var_array = np.array([1, 2])
-        h2_array = np.array([0.3, 0.8])
-
-        ts = sim_tree_seq()
-
-        count = 0
-
-        prod = itertools.product(
-            alpha_array, trait_mean_array, trait_var_array, h2_array
-        )
-
-        for element in tqdm(prod, total=16):
-            alpha = element[0]
-            trait_mean = element[1]
-            trait_var = element[2]
-            trait_sd = np.sqrt(trait_var)
-            h2 = element[3]
-            model = trait_model.TraitModelAlleleFrequency(trait_mean, trait_var, alpha)
-            trait_mean /= 2
-            genetic0 = np.zeros(1000)
-            genetic1 = np.zeros(1000)
-            genetic2 = np.zeros(1000)
-
-            environment0 = np.zeros(1000)
-            environment1 = np.zeros(1000)
-            environment2 = np.zeros(1000)
-
-            for i in range(1000):
-                sim_result = simulate_phenotype.sim_phenotype(
-                    ts, num_causal=2, model=model, h2=h2, random_seed=i
-                )
-                phenotype_result = sim_result.phenotype
-                genetic0[i] = phenotype_result.genetic_value[0]
-                genetic1[i] = phenotype_result.genetic_value[1]
-                genetic2[i] = phenotype_result.genetic_value[2]
-
-                environment0[i] = phenotype_result.environment_noise[0]
-                environment1[i] = phenotype_result.environment_noise[1]
-                environment2[i] = phenotype_result.environment_noise[2]
-            assert np.array_equal(genetic0, np.zeros(1000))
-
-            effect_size_sd0 = (
-                trait_sd / np.sqrt(2) * np.sqrt(pow(2 * 0.5 * (1 - 0.5), alpha))
-            )
-            effect_size_sd1 = (
-                trait_sd / np.sqrt(2) * np.sqrt(pow(2 * 1 / 6 * (1 - 1 / 6), alpha))
-            )
-
-            effect_size_mean0 = trait_mean * np.sqrt(pow(2 * 0.5 * (1 - 0.5), alpha))
-            effect_size_mean1 = trait_mean * np.sqrt(
-                pow(2 * 1 / 6 * (1 - 1 / 6), alpha)
-            )
-
-            ind_sd1 = effect_size_sd0 * 2
-            ind_sd2 = np.sqrt((effect_size_sd0**2) + (effect_size_sd1**2))
-
-            self.plot_qq_normal(
-                data=genetic1,
-                loc=2 * effect_size_mean0,
-                scale=ind_sd1,
-                filename=f"ind_1_genetic_{count}",
-                title=f"Individual 1 Genetic, alpha = {alpha}, "
-                f"trait_mean = {trait_mean}, trait_sd = {trait_sd}, h2 = {h2}",
-            )
-            self.plot_qq_normal(
-                data=genetic2,
-                loc=effect_size_mean0 + effect_size_mean1,
-                scale=ind_sd2,
-                filename=f"ind_2_genetic_{count}",
-                title=f"Individual 2 Genetic, alpha = {alpha}, "
-                f"trait_mean = {trait_mean}, trait_sd = {trait_sd}, h2 = {h2}",
+        rng = np.random.default_rng(self.seed_sequence.spawn(1)[0])
+        settings = list(itertools.product([0, -0.3], [0, 1], [1, 2], [0.3, 0.8]))
+        futures = [self.submit("sim_tree_seq", *setting) for setting in settings]
+
+        for count, (setting, chunk_futures) in enumerate(zip(settings, futures)):
+            alpha, trait_mean, trait_var, h2 = setting
+            genetic_value, environment_noise = self.collect(chunk_futures)
+            mean0, sd0 = effect_size_distribution(0.5, alpha, trait_mean, trait_var)
+            mean1, sd1 = effect_size_distribution(1 / 6, alpha, trait_mean, trait_var)
+            title = (
+                f"alpha = {alpha}, trait_mean = {trait_mean}, "
+                f"trait_var = {trait_var}, h2 = {h2}"
             )
 
-            genetic_sim = np.zeros(3)
-            env_sim = np.zeros(1000)
-
-            for i in range(1000):
-                x1 = rng.normal(loc=effect_size_mean0, scale=effect_size_sd0)
-                x2 = rng.normal(loc=effect_size_mean1, scale=effect_size_sd1)
-                genetic_sim[0] = 0
-                genetic_sim[1] = 2 * x1
-                genetic_sim[2] = x1 + x2
-                env_std = np.sqrt((1 - h2) / h2 * np.var(genetic_sim))
-                env_sim[i] = rng.normal(loc=0, scale=env_std)
-
-            self.plot_qq_compare(
-                v1=environment0,
-                v2=env_sim,
-                x_label="Individual 0 Environment",
-                y_label="Simulated values",
-                filename=f"ind_0_env_{count}",
-                title=f"Individual 0 Env, alpha = {alpha}, trait_mean = {trait_mean}, "
-                f"trait_sd = {trait_sd}, h2 = {h2}",
+            self.check_equal(
+                genetic_value[0],
+                np.zeros(self.num_replicates),
+                f"ind_0_genetic_{count}",
             )
-            self.plot_qq_compare(
-                v1=environment1,
-                v2=env_sim,
-                x_label="Individual 1 Environment",
-                y_label="Simulated values",
-                filename=f"ind_1_env_{count}",
-                title=f"Individual 1 Env, alpha = {alpha}, trait_mean = {trait_mean}, "
-                f"trait_sd = {trait_sd}, h2 = {h2}",
+            self.check_normal(
+                genetic_value[1],
+                loc=2 * mean0,
+                scale=2 * sd0,
+                check=f"ind_1_genetic_{count}",
+                title=f"Individual 1 Genetic, {title}",
             )
-            self.plot_qq_compare(
-                v1=environment2,
-                v2=env_sim,
-                x_label="Individual 2 Environment",
-                y_label="Simulated values",
-                filename=f"ind_2_env_{count}",
-                title=f"Individual 2 Env, alpha = {alpha}, trait_mean = {trait_mean}, "
-                f"trait_sd = {trait_sd}, h2 = {h2}",
+            self.check_normal(
+                genetic_value[2],
+                loc=mean0 + mean1,
+                scale=np.sqrt(sd0**2 + sd1**2),
+                check=f"ind_2_genetic_{count}",
+                title=f"Individual 2 Genetic, {title}",
             )
 
-            count += 1
+            x1 = rng.normal(loc=mean0, scale=sd0, size=self.num_replicates)
+            x2 = rng.normal(loc=mean1, scale=sd1, size=self.num_replicates)
+            genetic_sim = np.array([np.zeros(self.num_replicates), 2 * x1, x1 + x2])
+            env_std = np.sqrt((1 - h2) / h2 * np.var(genetic_sim, axis=0))
+            env_sim = rng.normal(loc=0, scale=env_std)
+            for i in range(3):
+                self.check_two_sample(
+                    environment_noise[i],
+                    env_sim,
+                    check=f"ind_{i}_env_{count}",
+                    x_label=f"Individual {i} Environment",
+                    title=f"Individual {i} Env, {title}",
+                )
 
 
 class TestInternal(Test):
@@ -348,96 +496,100 @@ class TestInternal(Test):
             Individual 0: 0 causal
             Individual 1: 0 causal
             Individual 2: 1 causal
-
-        Effect size distribution:
-
-        SD Formula:
-            trait_sd / sqrt(2) * [sqrt(2 * freq * (1 - freq))] ^ alpha
-            sqrt(2) from 2 causal sites
-
-        Environmental noise is simulated from a normal distribution where standard
-        deviation depends on the variance of the simulated genetic values
         """
-
-        ts = sim_tree_internal()
-
-        alpha_array = np.array([0, -1])
-        trait_mean_array = np.array([0, 1])
-        trait_var_array = np.array([1, 2])
-        h2_array = np.array([0.3, 0.8])
-
-        count = 0
-
-        prod = itertools.product(
-            alpha_array, trait_mean_array, trait_var_array, h2_array
-        )
-
-        for element in tqdm(prod, total=16):
-            alpha = element[0]
-            trait_mean = element[1]
-            trait_var = element[2]
-            trait_sd = np.sqrt(trait_var)
-            h2 = element[3]
-            model = trait_model.TraitModelAlleleFrequency(trait_mean, trait_var, alpha)
-            trait_mean /= 2
-            genetic0 = np.zeros(1000)
-            genetic1 = np.zeros(1000)
-            genetic2 = np.zeros(1000)
-
-            for i in range(1000):
-                sim_result = simulate_phenotype.sim_phenotype(
-                    ts, num_causal=2, model=model, h2=h2, random_seed=i
-                )
-                phenotype_result = sim_result.phenotype
-                genetic0[i] = phenotype_result.genetic_value[0]
-                genetic1[i] = phenotype_result.genetic_value[1]
-                genetic2[i] = phenotype_result.genetic_value[2]
-
-            effect_size_sd0 = (
-                trait_sd / np.sqrt(2) * np.sqrt(pow(2 * 0.5 * (1 - 0.5), alpha))
-            )
-            effect_size_sd1 = (
-                trait_sd / np.sqrt(2) * np.sqrt(pow(2 * 1 / 6 * (1 - 1 / 6), alpha))
-            )
-            effect_size_mean0 = trait_mean * np.sqrt(pow(2 * 0.5 * (1 - 0.5), alpha))
-            effect_size_mean1 = trait_mean * np.sqrt(
-                pow(2 * 1 / 6 * (1 - 1 / 6), alpha)
+        settings = list(itertools.product([0, -1], [0, 1], [1, 2], [0.3, 0.8]))
+        futures = [self.submit("sim_tree_internal", *setting) for setting in settings]
+
+        for count, (setting, chunk_futures) in enumerate(zip(settings, futures)):
+            alpha, trait_mean, trait_var, h2 = setting
+            genetic_value, _ = self.collect(chunk_futures)
+            mean0, sd0 = effect_size_distribution(0.5, alpha, trait_mean, trait_var)
+            mean1, sd1 = effect_size_distribution(1 / 6, alpha, trait_mean, trait_var)
+            title = (
+                f"alpha = {alpha}, trait_mean = {trait_mean}, "
+                f"trait_var = {trait_var}, h2 = {h2}"
             )
 
-            self.plot_qq_normal(
-                data=genetic0,
-                loc=effect_size_mean0,
-                scale=effect_size_sd0,
-                filename=f"internal_ind_0_genetic_{count}",
-                title=f"Individual 0 Genetic, alpha = {alpha}, "
-                f"trait_mean = {trait_mean}, trait_sd = {trait_sd}, h2 = {h2}",
+            self.check_normal(
+                genetic_value[0],
+                loc=mean0,
+                scale=sd0,
+                check=f"internal_ind_0_genetic_{count}",
+                title=f"Individual 0 Genetic, {title}",
             )
-            self.plot_qq_normal(
-                data=genetic1,
-                loc=2 * effect_size_mean0,
-                scale=2 * effect_size_sd0,
-                filename=f"internal_ind_1_genetic_{count}",
-                title=f"Individual 1 Genetic, alpha = {alpha}, "
-                f"trait_mean = {trait_mean}, trait_sd = {trait_sd}, h2 = {h2}",
+            self.check_normal(
+                genetic_value[1],
+                loc=2 * mean0,
+                scale=2 * sd0,
+                check=f"internal_ind_1_genetic_{count}",
+                title=f"Individual 1 Genetic, {title}",
             )
-            self.plot_qq_normal(
-                data=genetic2,
-                loc=effect_size_mean1,
-                scale=effect_size_sd1,
-                filename=f"internal_ind_2_genetic_{count}",
-                title=f"Individual 2 Genetic, alpha = {alpha}, "
-                f"trait_mean = {trait_mean}, trait_sd = {trait_sd}, h2 = {h2}",
+            self.check_normal(
+                genetic_value[2],
+                loc=mean1,
+                scale=sd1,
+                check=f"internal_ind_2_genetic_{count}",
+                title=f"Individual 2 Genetic, {title}",
             )
 
-            count += 1
 
-
-def run_tests(suite, output_dir):
+def run_tests(suite, output_dir, num_workers=None, significance=0.01, **kwargs):
+    """
+    Runs the test classes in `suite`, prints the result of each check and returns
+    whether all checks passed. The simulations are run in `num_workers` worker
+    processes, or in the current process if `num_workers` is 1.
+    """
     print(f"[+] Test suite contains {len(suite)} tests.")
-    for cl_name in suite:
-        instance = getattr(sys.modules[__name__], cl_name)(output_dir, cl_name)
-        instance._run_tests()
+    if num_workers == 1:
+        executor = _SerialExecutor()
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    results = []
+    try:
+        for cl_name in suite:
+            instance = getattr(sys.modules[__name__], cl_name)(
+                output_dir, cl_name, executor, **kwargs
+            )
+            instance._run_tests()
+            results.extend(instance.results)
+    finally:
+        executor.shutdown()
+
+    threshold = significance / (2 * len(results))
+    num_failed = 0
+    for name, check, ks_pvalue, ad_pvalue in results:
+        passed = ks_pvalue > threshold and ad_pvalue > threshold
+        num_failed += not passed
+        status = "PASS" if passed else "FAIL"
+        print(f"{status} {name}.{check}: ks p={ks_pvalue:.3g}, ad p={ad_pvalue:.3g}")
+    print(
+        f"[+] {len(results) - num_failed} passed, {num_failed} failed "
+        f"(p-value threshold {threshold:.3g})."
+    )
+    return num_failed == 0
 
 
 if __name__ == "__main__":
-    run_tests(["TestGenetic", "TestInternal"], "_output/stats_tests_output")
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("tests", nargs="*", default=["TestGenetic", "TestInternal"])
+    parser.add_argument("--num-replicates", type=int, default=10_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--significance", type=float, default=0.01)
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--plot", action="store_true")
+    parser.add_argument("--output-dir", default="_output/stats_tests_output")
+    args = parser.parse_args()
+    passed = run_tests(
+        args.tests,
+        args.output_dir,
+        num_workers=args.num_workers,
+        num_replicates=args.num_replicates,
+        chunk_size=args.chunk_size,
+        significance=args.significance,
+        plot=args.plot,
+        random_seed=args.random_seed,
+    )
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,67 @@
+import functools
+
+import msprime
+import numpy as np
+
+
+@functools.lru_cache(maxsize=None)
+def sim_ts(num_individuals, random_seed=1):
+    """
+    Simulate a diploid tree sequence with recombination and mutations, which is
+    shared by the tests that need more than a handful of trees and sites.
+    """
+    ts = msprime.sim_ancestry(
+        num_individuals,
+        sequence_length=100_000,
+        recombination_rate=1e-8,
+        population_size=10**4,
+        random_seed=random_seed,
+    )
+    return msprime.sim_mutations(ts, rate=1e-7, random_seed=random_seed)
+
+
+def tree_genotype(engine, tree, site_id, causal_code):
+    """
+    Returns the genotype of individuals at the causal sites of `tree` as a dense
+    array with one row per causal site, built from the sparse genotype matrix of
+    the engine.
+    """
+    indptr, indices, data = engine.tree_genotype_matrix(tree, site_id, causal_code)
+    genotype = np.zeros((len(site_id), engine.num_individuals))
+    for i in range(len(site_id)):
+        genotype[i, indices[indptr[i] : indptr[i + 1]]] = data[
+            indptr[i] : indptr[i + 1]
+        ]
+    return genotype
+
+
+def individual_genotype(engine, tree, site_id, causal_state):
+    """
+    Returns the number of copies of `causal_state` carried by each individual at a
+    single site of `tree`.
+    """
+    causal_code = engine.state_code([causal_state])
+    return tree_genotype(engine, tree, np.array([site_id]), causal_code)[0]
+
+
+def allele_count_dict(engine, site_id):
+    """
+    Returns one dictionary per site in `site_id`, which maps the states of the
+    non-ancestral alleles of the site to their counts among the samples.
+    """
+    allele_offset, allele_mutation, allele_count = engine.allele_count(site_id)
+    output = []
+    for i, site in enumerate(site_id):
+        counts = {}
+        for a in range(allele_offset[i], allele_offset[i + 1]):
+            state = engine.allele_state(site, allele_mutation[a])
+            counts[state] = allele_count[a]
+        output.append(counts)
+    return output
+
+
+def site_allele_count(engine, site_id):
+    """
+    Returns the dictionary of :func:`allele_count_dict` of a single site.
+    """
+    return allele_count_dict(engine, np.array([site_id]))[0]
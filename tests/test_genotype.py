@@ -0,0 +1,563 @@
+import numba
+import msprime
+import numpy as np
+import pytest
+import tskit
+import tstrait.genotype as genotype
+
+from .data import allele_count_dict
+from .data import sim_ts
+from .data import tree_genotype
+
+
+def binary_tree_ts():
+    #  3.00   6
+    #     ┊ ┏━┻━┓    ┊
+    # 2.00┊ ┃   5   ┊
+    #     ┊ ┃ ┏━┻┓   ┊
+    # 1.00┊ ┃ ┃  4  ┊
+    #     ┊ ┃ ┃ ┏┻┓  ┊
+    # 0.00 0 1 2 3
+    #
+    ts = tskit.Tree.generate_comb(4, span=15).tree_sequence
+    tables = ts.dump_tables()
+    for j in range(12):
+        tables.sites.add_row(j, "A")
+
+    tables.individuals.add_row()
+    tables.individuals.add_row()
+    individuals = tables.nodes.individual
+    individuals[0] = 0
+    individuals[1] = 0
+    individuals[2] = 1
+    individuals[3] = 1
+    tables.nodes.individual = individuals
+
+    tables.mutations.add_row(site=0, node=0, derived_state="T")
+    tables.mutations.add_row(site=1, node=4, derived_state="T")
+    tables.mutations.add_row(site=2, node=1, derived_state="T")
+
+    tables.mutations.add_row(site=3, node=5, derived_state="T")
+    tables.mutations.add_row(site=3, node=2, derived_state="T", parent=3)
+
+    tables.mutations.add_row(site=4, node=0, derived_state="T")
+    tables.mutations.add_row(site=4, node=4, derived_state="T")
+
+    tables.mutations.add_row(site=5, node=0, derived_state="T")
+    tables.mutations.add_row(site=5, node=0, derived_state="A", parent=7)
+
+    tables.mutations.add_row(site=6, node=0, derived_state="T")
+    tables.mutations.add_row(site=6, node=0, derived_state="G", parent=9)
+    tables.mutations.add_row(site=6, node=0, derived_state="T", parent=10)
+    tables.mutations.add_row(site=6, node=0, derived_state="C", parent=11)
+
+    tables.mutations.add_row(site=7, node=5, derived_state="T")
+    tables.mutations.add_row(site=7, node=4, derived_state="C", parent=13)
+
+    tables.mutations.add_row(site=8, node=5, derived_state="T")
+    tables.mutations.add_row(site=8, node=4, derived_state="C", parent=15)
+    tables.mutations.add_row(site=8, node=4, derived_state="T", parent=16)
+    tables.mutations.add_row(site=8, node=4, derived_state="A", parent=17)
+    tables.mutations.add_row(site=8, node=4, derived_state="T", parent=18)
+
+    tables.mutations.add_row(site=9, node=6, derived_state="A")
+
+    tables.mutations.add_row(site=10, node=6, derived_state="C")
+
+    tables.mutations.add_row(site=11, node=5, derived_state="C")
+    tables.mutations.add_row(site=11, node=0, derived_state="T")
+
+    return tables.tree_sequence()
+
+
+class Test_tree_genotype:
+    def test_binary_tree(self):
+        ts = binary_tree_ts()
+        engine = genotype.GenotypeEngine(ts)
+        causal_state = ["T", "T", "T", "T", "T", "A", "C", "T", "T", "A", "C", "C"]
+        causal_code = engine.state_code(causal_state)
+        g = tree_genotype(engine, ts.first(), np.arange(12), causal_code)
+
+        expected = np.array(
+            [
+                [1, 0],
+                [0, 2],
+                [1, 0],
+                [1, 2],
+                [1, 2],
+                [2, 2],
+                [1, 0],
+                [1, 0],
+                [1, 2],
+                [2, 2],
+                [2, 2],
+                [1, 2],
+            ]
+        )
+        assert np.array_equal(g, expected)
+        assert not np.any(engine.has_mutation)
+
+    def test_site_subset(self):
+        ts = binary_tree_ts()
+        engine = genotype.GenotypeEngine(ts)
+        g = tree_genotype(
+            engine, ts.first(), np.array([3, 8, 11]), engine.state_code(["T", "C", "T"])
+        )
+
+        assert np.array_equal(g, np.array([[1, 2], [0, 0], [1, 0]]))
+
+    def test_multiple_character_state(self):
+        ts = tskit.Tree.generate_comb(4, span=10).tree_sequence
+        tables = ts.dump_tables()
+        tables.sites.add_row(0, "AT")
+        tables.individuals.add_row()
+        tables.individuals.add_row()
+        tables.nodes.individual = np.array([0, 0, 1, 1, -1, -1, -1], dtype=np.int32)
+        tables.mutations.add_row(site=0, node=5, derived_state="ATT")
+        tables.mutations.add_row(site=0, node=3, derived_state="A", parent=0)
+        ts = tables.tree_sequence()
+        engine = genotype.GenotypeEngine(ts)
+        tree = ts.first()
+
+        assert np.array_equal(
+            tree_genotype(engine, tree, np.array([0]), engine.state_code(["ATT"])),
+            np.array([[1, 1]]),
+        )
+        assert np.array_equal(
+            tree_genotype(engine, tree, np.array([0]), engine.state_code(["A"])),
+            np.array([[0, 1]]),
+        )
+        assert np.array_equal(
+            tree_genotype(engine, tree, np.array([0]), engine.state_code(["AT"])),
+            np.array([[1, 0]]),
+        )
+
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    def test_individual_genotype(self, random_seed):
+        ts = sim_ts(20, random_seed)
+        engine = genotype.GenotypeEngine(ts)
+        samples_individual = ts.nodes_individual[ts.samples()]
+
+        for tree in ts.trees():
+            site_id = np.array([site.id for site in tree.sites()], dtype=np.int32)
+            causal_state = [site.mutations[-1].derived_state for site in tree.sites()]
+            causal_code = engine.state_code(causal_state)
+            g = tree_genotype(engine, tree, site_id, causal_code)
+            for i, variant in enumerate(ts.variants(left=tree.interval.left)):
+                if i == len(site_id):
+                    break
+                is_causal = variant.genotypes == variant.alleles.index(causal_state[i])
+                expected = np.bincount(
+                    samples_individual, weights=is_causal, minlength=ts.num_individuals
+                )
+                assert np.array_equal(g[i], expected)
+
+
+class Test_allele_count:
+    def test_binary_tree(self):
+        ts = binary_tree_ts()
+        engine = genotype.GenotypeEngine(ts)
+        counts = allele_count_dict(engine, np.arange(12))
+
+        assert counts == [
+            {"T": 1},
+            {"T": 2},
+            {"T": 1},
+            {"T": 3},
+            {"T": 3},
+            {"A": 4},
+            {"C": 1},
+            {"T": 1, "C": 2},
+            {"T": 3},
+            {"A": 4},
+            {"C": 4},
+            {"C": 3, "T": 1},
+        ]
+
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    def test_variants(self, random_seed):
+        ts = msprime.sim_ancestry(
+            20,
+            sequence_length=100_000,
+            recombination_rate=1e-8,
+            population_size=10**4,
+            random_seed=random_seed,
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-6, random_seed=random_seed)
+        engine = genotype.GenotypeEngine(ts)
+        rng = np.random.default_rng(random_seed)
+        site_id = np.sort(rng.choice(ts.num_sites, size=50, replace=False))
+        counts = allele_count_dict(engine, site_id)
+
+        for i, site in enumerate(site_id):
+            variant = next(ts.variants(left=ts.site(site).position))
+            allele_count = np.bincount(
+                variant.genotypes, minlength=len(variant.alleles)
+            )
+            # Non-ancestral alleles that are present in the samples, in the order of
+            # their first mutation, or the ancestral allele if there are none
+            expected = {
+                allele: count
+                for allele, count in zip(variant.alleles[1:], allele_count[1:])
+                if count > 0
+            }
+            if len(expected) == 0:
+                expected = {variant.alleles[0]: ts.num_samples}
+            assert list(counts[i].items()) == list(expected.items())
+
+
+class Test_causal_allele_frequency:
+    def test_binary_tree(self):
+        ts = binary_tree_ts()
+        engine = genotype.GenotypeEngine(ts)
+        causal_state = ["T", "T", "T", "T", "T", "A", "C", "T", "T", "A", "C", "C"]
+        causal_code = engine.state_code(causal_state)
+        site_id = np.arange(12)
+        g = tree_genotype(engine, ts.first(), site_id, causal_code)
+        frequency = engine.causal_allele_frequency(site_id, causal_code)
+
+        np.testing.assert_array_equal(frequency, np.sum(g, axis=1) / 4)
+        np.testing.assert_array_equal(
+            engine.subset([1]).causal_allele_frequency(site_id, causal_code),
+            frequency,
+        )
+
+    def test_samples_without_individual(self):
+        ts = binary_tree_ts()
+        tables = ts.dump_tables()
+        individual = tables.nodes.individual
+        individual[2:4] = tskit.NULL
+        tables.nodes.individual = individual
+        ts = tables.tree_sequence()
+        engine = genotype.GenotypeEngine(ts)
+        causal_code = engine.state_code(["T", "T", "T"])
+        site_id = np.array([0, 1, 3])
+        allele_count = engine.allele_count(site_id)
+        frequency = engine.causal_allele_frequency(site_id, causal_code, allele_count)
+
+        np.testing.assert_array_equal(frequency, [0.5, 0, 0.5])
+
+
+class Test_tree_genotype_matrix:
+    def test_binary_tree(self):
+        ts = binary_tree_ts()
+        engine = genotype.GenotypeEngine(ts)
+        causal_state = ["T", "T", "T", "T", "T", "A", "C", "T", "T", "A", "C", "C"]
+        causal_code = engine.state_code(causal_state)
+        site_id = np.arange(12)
+        indptr, indices, data = engine.tree_genotype_matrix(
+            ts.first(), site_id, causal_code
+        )
+
+        assert np.array_equal(indptr, [0, 1, 2, 3, 5, 7, 9, 10, 11, 13, 15, 17, 19])
+        assert np.array_equal(
+            indices, [0, 1, 0, 0, 1, 0, 1, 0, 1, 0, 0, 0, 1, 0, 1, 0, 1, 0, 1]
+        )
+        assert np.array_equal(
+            data, [1, 2, 1, 1, 2, 1, 2, 2, 2, 1, 1, 1, 2, 2, 2, 2, 2, 1, 2]
+        )
+        assert not np.any(engine.individual_count)
+
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    def test_sorted_entries(self, random_seed):
+        ts = msprime.sim_ancestry(
+            20,
+            sequence_length=100_000,
+            recombination_rate=1e-8,
+            population_size=10**4,
+            random_seed=random_seed,
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-7, random_seed=random_seed)
+        engine = genotype.GenotypeEngine(ts)
+
+        for tree in ts.trees():
+            site_id = np.array([site.id for site in tree.sites()], dtype=np.int32)
+            causal_state = [site.mutations[-1].derived_state for site in tree.sites()]
+            causal_code = engine.state_code(causal_state)
+            indptr, indices, data = engine.tree_genotype_matrix(
+                tree, site_id, causal_code
+            )
+            assert len(indptr) == len(site_id) + 1
+            assert np.all(data > 0)
+            for i in range(len(site_id)):
+                column = indices[indptr[i] : indptr[i + 1]]
+                assert np.all(np.diff(column) > 0)
+
+
+class Test_tree_genetic_value:
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    @pytest.mark.parametrize("num_trait", [1, 2])
+    def test_genotype_matrix(self, random_seed, num_trait):
+        ts = msprime.sim_ancestry(
+            20,
+            sequence_length=100_000,
+            recombination_rate=1e-8,
+            population_size=10**4,
+            random_seed=random_seed,
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-7, random_seed=random_seed)
+        engine = genotype.GenotypeEngine(ts)
+        rng = np.random.default_rng(random_seed)
+
+        for tree in ts.trees():
+            site_id = np.array([site.id for site in tree.sites()], dtype=np.int32)
+            causal_state = [site.mutations[-1].derived_state for site in tree.sites()]
+            causal_code = engine.state_code(causal_state)
+            beta = rng.normal(size=(len(site_id), num_trait))
+            genetic_value = rng.normal(size=(ts.num_individuals, num_trait))
+            expected = genetic_value.copy()
+            indptr, indices, data = engine.tree_genotype_matrix(
+                tree, site_id, causal_code
+            )
+            genotype._csc_accumulate(indptr, indices, data, beta, expected)
+            engine.tree_genetic_value(tree, site_id, causal_code, beta, genetic_value)
+
+            np.testing.assert_array_equal(genetic_value, expected)
+            assert not np.any(engine.individual_count)
+            assert not np.any(engine.has_mutation)
+
+
+class Test_tree_genetic_value_threaded:
+    def test_binary_tree(self):
+        ts = binary_tree_ts()
+        engine = genotype.GenotypeEngine(ts)
+        causal_state = ["T", "T", "T", "T", "T", "A", "C", "T", "T", "A", "C", "C"]
+        causal_code = engine.state_code(causal_state)
+        beta = np.arange(24, dtype=np.float64).reshape(12, 2)
+        genetic_value = np.ones((2, 2))
+        engine.tree_genetic_value_threaded(
+            ts.first(), np.arange(12), causal_code, beta, genetic_value
+        )
+        g = tree_genotype(engine, ts.first(), np.arange(12), causal_code)
+
+        np.testing.assert_array_equal(genetic_value, 1 + g.T @ beta)
+        assert not np.any(engine.thread_has_mutation)
+
+    @pytest.mark.parametrize("num_threads", [1, 2, 3])
+    def test_num_threads(self, num_threads):
+        if num_threads > numba.config.NUMBA_NUM_THREADS:
+            pytest.skip("Not enough numba threads")
+        ts = msprime.sim_ancestry(
+            20, sequence_length=100_000, population_size=10**4, random_seed=1
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-7, random_seed=1)
+        engine = genotype.GenotypeEngine(ts)
+        rng = np.random.default_rng(1)
+        default_num_threads = numba.get_num_threads()
+        numba.set_num_threads(num_threads)
+        try:
+            for tree in ts.trees():
+                site_id = np.array([site.id for site in tree.sites()], dtype=np.int32)
+                causal_code = engine.state_code(
+                    [site.mutations[-1].derived_state for site in tree.sites()]
+                )
+                beta = rng.normal(size=(len(site_id), 1))
+                genetic_value = np.zeros((ts.num_individuals, 1))
+                expected = np.zeros((ts.num_individuals, 1))
+                engine.tree_genetic_value_threaded(
+                    tree, site_id, causal_code, beta, genetic_value
+                )
+                engine.tree_genetic_value(tree, site_id, causal_code, beta, expected)
+                np.testing.assert_array_equal(genetic_value, expected)
+            assert engine.thread_stack.shape[0] == num_threads
+        finally:
+            numba.set_num_threads(default_num_threads)
+
+
+class Test_csc_accumulate:
+    def test_accumulate(self):
+        rng = np.random.default_rng(1)
+        dense = rng.integers(0, 3, size=(6, 4)).astype(np.int32)
+        indptr = np.concatenate([[0], np.cumsum(np.count_nonzero(dense, axis=0))])
+        indices = np.concatenate([np.flatnonzero(column) for column in dense.T])
+        data = dense[indices, np.repeat(np.arange(4), np.diff(indptr))]
+        x = rng.normal(size=(4, 2))
+        output = np.ones((6, 2))
+        genotype._csc_accumulate(indptr, indices.astype(np.int32), data, x, output)
+
+        assert np.allclose(output, 1 + dense @ x)
+
+
+class Test_encode_states:
+    def test_binary_tree(self):
+        ts = binary_tree_ts()
+        engine = genotype.GenotypeEngine(ts)
+
+        assert sorted(engine.state_lookup) == ["A", "C", "G", "T"]
+        assert list(engine.state_lookup[engine.site_code]) == ["A"] * 12
+        assert list(engine.state_lookup[engine.mutation_code]) == [
+            mutation.derived_state for mutation in ts.mutations()
+        ]
+        assert np.array_equal(
+            engine.state_code(["T", "A", "AT"]),
+            [
+                list(engine.state_lookup).index("T"),
+                list(engine.state_lookup).index("A"),
+                -1,
+            ],
+        )
+
+    def test_multiple_character_state(self):
+        ts = tskit.Tree.generate_comb(4, span=10).tree_sequence
+        tables = ts.dump_tables()
+        tables.sites.add_row(0, "AT")
+        tables.sites.add_row(1, "")
+        tables.mutations.add_row(site=0, node=5, derived_state="ATT")
+        tables.mutations.add_row(site=0, node=3, derived_state="TA", parent=0)
+        tables.mutations.add_row(site=1, node=2, derived_state="AT")
+        tables.mutations.add_row(site=1, node=3, derived_state="ÅT")
+        ts = tables.tree_sequence()
+        engine = genotype.GenotypeEngine(ts)
+
+        assert list(engine.state_lookup[engine.site_code]) == ["AT", ""]
+        assert list(engine.state_lookup[engine.mutation_code]) == [
+            "ATT",
+            "TA",
+            "AT",
+            "ÅT",
+        ]
+        assert engine.mutation_code[2] == engine.site_code[0]
+        assert len(set(engine.state_lookup)) == len(engine.state_lookup)
+
+
+class Test_engine_individuals:
+    def test_mixed_ploidy(self):
+        ts = msprime.sim_ancestry(
+            samples=[msprime.SampleSet(2, ploidy=1), msprime.SampleSet(2, ploidy=3)],
+            sequence_length=10_000,
+            random_seed=1,
+        )
+        engine = genotype.GenotypeEngine(ts)
+        np.testing.assert_array_equal(engine.individual_id, np.arange(4))
+        np.testing.assert_array_equal(engine.ploidy, [1, 1, 3, 3])
+        assert engine.total_ploidy == ts.num_samples
+        samples = ts.samples()
+        np.testing.assert_array_equal(
+            engine.nodes_genotype_index[samples], ts.nodes_individual[samples]
+        )
+
+    def test_non_sample_individuals(self):
+        ts = msprime.sim_ancestry(3, sequence_length=10_000, random_seed=1)
+        tables = ts.dump_tables()
+        individual = tables.nodes.individual
+        # Assign the root of the first tree to an individual before the samples
+        tables.individuals.clear()
+        tables.individuals.add_row()
+        for _ in range(ts.num_individuals):
+            tables.individuals.add_row()
+        individual[individual != tskit.NULL] += 1
+        individual[ts.first().root] = 0
+        tables.nodes.individual = individual
+        ts = tables.tree_sequence()
+
+        engine = genotype.GenotypeEngine(ts)
+        np.testing.assert_array_equal(engine.individual_id, [1, 2, 3])
+        np.testing.assert_array_equal(engine.individual_ploidy, [0, 2, 2, 2])
+        assert engine.num_individuals == 3
+        assert engine.nodes_genotype_index[ts.first().root] == tskit.NULL
+        np.testing.assert_array_equal(
+            engine.nodes_genotype_index[ts.samples()], [0, 0, 1, 1, 2, 2]
+        )
+
+
+class Test_engine_subset:
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    def test_tree_genotype(self, random_seed):
+        ts = sim_ts(20, random_seed)
+        engine = genotype.GenotypeEngine(ts)
+        individuals = np.array([7, 2, 15, 3])
+        subset = engine.subset(individuals)
+        np.testing.assert_array_equal(subset.individual_id, individuals)
+        np.testing.assert_array_equal(subset.ploidy, [2, 2, 2, 2])
+        assert subset.total_ploidy == 8
+        assert engine.num_individuals == ts.num_individuals
+
+        for tree in ts.trees():
+            site_id = np.array([site.id for site in tree.sites()], dtype=np.int32)
+            if len(site_id) == 0:
+                continue
+            causal_code = engine.mutation_code[engine.site_mutation_offset[site_id]]
+            full = tree_genotype(engine, tree, site_id, causal_code)
+            g = tree_genotype(subset, tree, site_id, causal_code)
+            np.testing.assert_array_equal(g, full[:, individuals])
+
+    def test_tracked_nodes(self):
+        ts = sim_ts(20, 1)
+        subset = genotype.GenotypeEngine(ts).subset([4])
+        tracked_sample = ts.individual(4).nodes
+        for tree in ts.trees():
+            node_tracked = subset._node_tracked(tree)
+            expected = np.zeros(ts.num_nodes + 1, dtype=bool)
+            expected[-1] = True
+            for node in tracked_sample:
+                while node != tskit.NULL:
+                    expected[node] = True
+                    node = tree.parent(node)
+            np.testing.assert_array_equal(node_tracked, expected)
+
+    def test_site_frequency(self):
+        ts = sim_ts(20, 1)
+        engine = genotype.GenotypeEngine(ts)
+        site_frequency = engine.subset([4, 2]).site_frequency()
+        assert engine._site_frequency is site_frequency
+        assert engine.subset([1]).site_frequency() is site_frequency
+        assert engine.subset([1]).subset([3]).site_frequency() is site_frequency
+        np.testing.assert_array_equal(
+            site_frequency, genotype.GenotypeEngine(ts).site_frequency()
+        )
+
+
+class Test_site_frequency:
+    def test_samples_without_individual(self):
+        ts = sim_ts(20)
+        tables = ts.dump_tables()
+        nodes_individual = tables.nodes.individual
+        nodes_individual[ts.individual(0).nodes] = tskit.NULL
+        tables.nodes.individual = nodes_individual
+        ts = tables.tree_sequence()
+        engine = genotype.GenotypeEngine(ts)
+        site_frequency = engine.site_frequency()
+
+        is_counted = ts.nodes_individual[ts.samples()] != tskit.NULL
+        for variant in ts.variants():
+            frequency = np.mean(variant.genotypes[is_counted] > 0)
+            expected = min(frequency, 1 - frequency)
+            assert np.isclose(site_frequency[variant.site.id], expected)
+
+        site_id = np.arange(ts.num_sites, dtype=np.int32)
+        causal_code = engine.mutation_code[engine.site_mutation_offset[site_id]]
+        biallelic = np.diff(engine.site_mutation_offset) == 1
+        frequency = engine.causal_allele_frequency(site_id, causal_code)
+        np.testing.assert_allclose(
+            site_frequency[biallelic],
+            np.minimum(frequency, 1 - frequency)[biallelic],
+        )
+
+
+class Test_tree_num_traversed:
+    def test_binary_tree(self):
+        ts = binary_tree_ts()
+        engine = genotype.GenotypeEngine(ts)
+        tree = ts.first()
+        # Mutation on sample node 0, on internal node 4 with two samples, and
+        # ancestral state at the virtual root, where the subtree of node 5 has the
+        # derived allele
+        site_id = np.array([0, 1, 3])
+        causal_code = engine.state_code(["T", "T", "A"])
+        num_traversed = engine.tree_num_traversed(tree, site_id[:1], causal_code[:1])
+        assert num_traversed == 1
+        num_traversed = engine.tree_num_traversed(tree, site_id[1:2], causal_code[1:2])
+        assert num_traversed == 3
+        num_traversed = engine.tree_num_traversed(tree, site_id[2:], causal_code[2:])
+        assert num_traversed == 3
+        assert engine.tree_num_traversed(tree, site_id, causal_code) == 7
+        assert not np.any(engine.has_mutation)
+
+    def test_subset(self):
+        ts = binary_tree_ts()
+        engine = genotype.GenotypeEngine(ts).subset([0])
+        tree = ts.first()
+        num_traversed = engine.tree_num_traversed(
+            tree, np.array([1]), engine.state_code(["T"])
+        )
+        assert num_traversed == 0
@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+import pytest
+import tstrait
+
+
+def run_python(code):
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    )
+    return output.stdout.split()
+
+
+class Test_lazy_import:
+    @pytest.mark.parametrize("module", ["numba", "tskit", "tstrait.simulate_phenotype"])
+    def test_not_imported(self, module):
+        code = f"import sys, tstrait; print({module!r} in sys.modules)"
+        assert run_python(code) == ["False"]
+
+    def test_trait_model(self):
+        code = (
+            "import sys, tstrait; "
+            "model = tstrait.TraitModelAdditive(trait_mean=0, trait_var=1); "
+            "print('numba' in sys.modules)"
+        )
+        assert run_python(code) == ["False"]
+
+    @pytest.mark.parametrize("name", ["sim_phenotype", "PhenotypeSimulator", "warmup"])
+    def test_first_use(self, name):
+        code = (
+            "import sys, tstrait; "
+            f"tstrait.{name}; "
+            "print('numba' in sys.modules, 'tskit' in sys.modules)"
+        )
+        assert run_python(code) == ["True", "True"]
+
+    def test_from_import(self):
+        code = "from tstrait import sim_phenotype; print(sim_phenotype.__module__)"
+        assert run_python(code) == ["tstrait.simulate_phenotype"]
+
+    @pytest.mark.parametrize("name", tstrait.__all__)
+    def test_all(self, name):
+        assert name in dir(tstrait)
+        assert getattr(tstrait, name).__name__ == name
+
+    def test_unknown_attribute(self):
+        with pytest.raises(AttributeError, match="has no attribute 'sim_genotype'"):
+            tstrait.sim_genotype
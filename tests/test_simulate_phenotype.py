@@ -1,12 +1,21 @@
 import functools
+import pickle
+import tracemalloc
 
 import msprime
+import numba
 import numpy as np
 import pytest
 import tskit
+import tstrait
+import tstrait.genotype as genotype
 import tstrait.simulate_phenotype as simulate_phenotype
 import tstrait.trait_model as trait_model
 
+from .data import individual_genotype
+from .data import sim_ts
+from .data import site_allele_count
+
 
 @functools.lru_cache(maxsize=None)
 def all_trees_ts(n):
@@ -54,7 +63,7 @@ class Test_sim_phenotype_output_dim:
         genetic_result = sim_result.genotype
 
         assert len(phenotype_result.__dict__) == 4
-        assert len(genetic_result.__dict__) == 4
+        assert len(genetic_result.__dict__) == 5
 
         assert len(phenotype_result.individual_id) == num_ind
         assert len(phenotype_result.phenotype) == num_ind
@@ -86,7 +95,7 @@ class Test_sim_phenotype_output_dim:
         genetic_result = sim_result.genotype
 
         assert len(phenotype_result.__dict__) == 4
-        assert len(genetic_result.__dict__) == 4
+        assert len(genetic_result.__dict__) == 5
 
         assert len(phenotype_result.individual_id) == num_ind
         assert len(phenotype_result.phenotype) == num_ind
@@ -116,7 +125,7 @@ class Test_sim_phenotype_output_dim:
         genetic_result = sim_result.genotype
 
         assert len(phenotype_result.__dict__) == 4
-        assert len(genetic_result.__dict__) == 4
+        assert len(genetic_result.__dict__) == 5
 
         assert len(phenotype_result.individual_id) == num_ind
         assert len(phenotype_result.phenotype) == num_ind
@@ -134,12 +143,17 @@ class Test_sim_phenotype_output_dim:
 
 
 class Test_sim_phenotype_input:
-    @pytest.mark.parametrize("ts", [0, "a", [1, 1]])
+    @pytest.mark.parametrize("ts", [0, 1.5, [1, 1]])
     def test_ts(self, ts):
         model = trait_model.TraitModelAdditive(0, 1)
         with pytest.raises(TypeError, match="Input should be a tree sequence data"):
             simulate_phenotype.sim_phenotype(ts, 2, model, 0.3, 1)
 
+    def test_ts_path(self, tmp_path):
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(FileNotFoundError):
+            simulate_phenotype.sim_phenotype(tmp_path / "a.trees", 2, model, 0.3, 1)
+
     @pytest.mark.parametrize("num_ind", [1, 2, 5])
     @pytest.mark.parametrize("num_causal", [1, 2, 3])
     @pytest.mark.parametrize("h2", [0.1, 0.5])
@@ -306,35 +320,33 @@ class Test_site_genotypes:
 
         ts = tables.tree_sequence()
 
-        model = trait_model.TraitModelAdditive(0, 1)
-        rng = np.random.default_rng(1)
-        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, rng)
+        engine = genotype.GenotypeEngine(ts)
         tree = ts.first()
 
-        g1 = simulator._individual_genotype(tree, ts.site(0), "T", ts.num_nodes)
-        g2 = simulator._individual_genotype(tree, ts.site(1), "T", ts.num_nodes)
-        g3 = simulator._individual_genotype(tree, ts.site(2), "T", ts.num_nodes)
-        g4 = simulator._individual_genotype(tree, ts.site(3), "T", ts.num_nodes)
-        g5 = simulator._individual_genotype(tree, ts.site(4), "T", ts.num_nodes)
-        g6 = simulator._individual_genotype(tree, ts.site(5), "A", ts.num_nodes)
-        g7 = simulator._individual_genotype(tree, ts.site(6), "C", ts.num_nodes)
-        g8 = simulator._individual_genotype(tree, ts.site(7), "T", ts.num_nodes)
-        g9 = simulator._individual_genotype(tree, ts.site(8), "T", ts.num_nodes)
-        g10 = simulator._individual_genotype(tree, ts.site(9), "A", ts.num_nodes)
-        g11 = simulator._individual_genotype(tree, ts.site(10), "C", ts.num_nodes)
-        g12 = simulator._individual_genotype(tree, ts.site(11), "C", ts.num_nodes)
-
-        c1 = simulator._obtain_allele_frequency(tree, ts.site(0))
-        c2 = simulator._obtain_allele_frequency(tree, ts.site(1))
-        c3 = simulator._obtain_allele_frequency(tree, ts.site(2))
-        c4 = simulator._obtain_allele_frequency(tree, ts.site(3))
-        c5 = simulator._obtain_allele_frequency(tree, ts.site(4))
-        c6 = simulator._obtain_allele_frequency(tree, ts.site(5))
-        c7 = simulator._obtain_allele_frequency(tree, ts.site(6))
-        c8 = simulator._obtain_allele_frequency(tree, ts.site(7))
-        c9 = simulator._obtain_allele_frequency(tree, ts.site(8))
-        c10 = simulator._obtain_allele_frequency(tree, ts.site(10))
-        c11 = simulator._obtain_allele_frequency(tree, ts.site(11))
+        g1 = individual_genotype(engine, tree, 0, "T")
+        g2 = individual_genotype(engine, tree, 1, "T")
+        g3 = individual_genotype(engine, tree, 2, "T")
+        g4 = individual_genotype(engine, tree, 3, "T")
+        g5 = individual_genotype(engine, tree, 4, "T")
+        g6 = individual_genotype(engine, tree, 5, "A")
+        g7 = individual_genotype(engine, tree, 6, "C")
+        g8 = individual_genotype(engine, tree, 7, "T")
+        g9 = individual_genotype(engine, tree, 8, "T")
+        g10 = individual_genotype(engine, tree, 9, "A")
+        g11 = individual_genotype(engine, tree, 10, "C")
+        g12 = individual_genotype(engine, tree, 11, "C")
+
+        c1 = site_allele_count(engine, 0)
+        c2 = site_allele_count(engine, 1)
+        c3 = site_allele_count(engine, 2)
+        c4 = site_allele_count(engine, 3)
+        c5 = site_allele_count(engine, 4)
+        c6 = site_allele_count(engine, 5)
+        c7 = site_allele_count(engine, 6)
+        c8 = site_allele_count(engine, 7)
+        c9 = site_allele_count(engine, 8)
+        c10 = site_allele_count(engine, 10)
+        c11 = site_allele_count(engine, 11)
 
         assert np.array_equal(g1, np.array([1, 0]))
         assert np.array_equal(g2, np.array([0, 2]))
@@ -412,30 +424,28 @@ class Test_site_genotypes:
         tables.mutations.add_row(site=8, node=4, derived_state="T", parent=18)
         ts = tables.tree_sequence()
 
-        model = trait_model.TraitModelAdditive(0, 1)
-        rng = np.random.default_rng(1)
-        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, rng)
+        engine = genotype.GenotypeEngine(ts)
         tree = ts.first()
 
-        g1 = simulator._individual_genotype(tree, ts.site(0), "T", ts.num_nodes)
-        g2 = simulator._individual_genotype(tree, ts.site(1), "T", ts.num_nodes)
-        g3 = simulator._individual_genotype(tree, ts.site(2), "T", ts.num_nodes)
-        g4 = simulator._individual_genotype(tree, ts.site(3), "T", ts.num_nodes)
-        g5 = simulator._individual_genotype(tree, ts.site(4), "T", ts.num_nodes)
-        g6 = simulator._individual_genotype(tree, ts.site(5), "A", ts.num_nodes)
-        g7 = simulator._individual_genotype(tree, ts.site(6), "C", ts.num_nodes)
-        g8 = simulator._individual_genotype(tree, ts.site(7), "T", ts.num_nodes)
-        g9 = simulator._individual_genotype(tree, ts.site(8), "T", ts.num_nodes)
-
-        c1 = simulator._obtain_allele_frequency(tree, ts.site(0))
-        c2 = simulator._obtain_allele_frequency(tree, ts.site(1))
-        c3 = simulator._obtain_allele_frequency(tree, ts.site(2))
-        c4 = simulator._obtain_allele_frequency(tree, ts.site(3))
-        c5 = simulator._obtain_allele_frequency(tree, ts.site(4))
-        c6 = simulator._obtain_allele_frequency(tree, ts.site(5))
-        c7 = simulator._obtain_allele_frequency(tree, ts.site(6))
-        c8 = simulator._obtain_allele_frequency(tree, ts.site(7))
-        c9 = simulator._obtain_allele_frequency(tree, ts.site(8))
+        g1 = individual_genotype(engine, tree, 0, "T")
+        g2 = individual_genotype(engine, tree, 1, "T")
+        g3 = individual_genotype(engine, tree, 2, "T")
+        g4 = individual_genotype(engine, tree, 3, "T")
+        g5 = individual_genotype(engine, tree, 4, "T")
+        g6 = individual_genotype(engine, tree, 5, "A")
+        g7 = individual_genotype(engine, tree, 6, "C")
+        g8 = individual_genotype(engine, tree, 7, "T")
+        g9 = individual_genotype(engine, tree, 8, "T")
+
+        c1 = site_allele_count(engine, 0)
+        c2 = site_allele_count(engine, 1)
+        c3 = site_allele_count(engine, 2)
+        c4 = site_allele_count(engine, 3)
+        c5 = site_allele_count(engine, 4)
+        c6 = site_allele_count(engine, 5)
+        c7 = site_allele_count(engine, 6)
+        c8 = site_allele_count(engine, 7)
+        c9 = site_allele_count(engine, 8)
 
         assert np.array_equal(g1, np.array([1, 0]))
         assert np.array_equal(g2, np.array([1, 1]))
@@ -497,20 +507,19 @@ class Test_site_genotypes:
 
         ts = tables.tree_sequence()
 
-        model = trait_model.TraitModelAdditive(0, 1)
-        rng = np.random.default_rng(1)
-        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, rng)
+        engine = genotype.GenotypeEngine(ts)
         tree = ts.first()
 
-        g1 = simulator._individual_genotype(tree, ts.site(0), "G", ts.num_nodes)
-        g2 = simulator._individual_genotype(tree, ts.site(1), "T", ts.num_nodes)
-        g3 = simulator._individual_genotype(tree, ts.site(2), "T", ts.num_nodes)
-        g4 = simulator._individual_genotype(tree, ts.site(2), "G", ts.num_nodes)
+        g1 = individual_genotype(engine, tree, 0, "G")
+        g2 = individual_genotype(engine, tree, 1, "T")
+        g3 = individual_genotype(engine, tree, 2, "T")
+        g4 = individual_genotype(engine, tree, 2, "G")
 
-        assert np.array_equal(g1, np.array([1, 0, 2]))
-        assert np.array_equal(g2, np.array([1, 1, 0]))
-        assert np.array_equal(g3, np.array([1, 0, 0]))
-        assert np.array_equal(g4, np.array([0, 1, 0]))
+        # Individual 0 has no sample nodes, so only individuals 1 and 2 are genotyped
+        assert np.array_equal(g1, np.array([0, 2]))
+        assert np.array_equal(g2, np.array([1, 0]))
+        assert np.array_equal(g3, np.array([0, 0]))
+        assert np.array_equal(g4, np.array([1, 0]))
 
     def test_non_binary_tree(self):
         # 2.00      7
@@ -543,18 +552,16 @@ class Test_site_genotypes:
         tables.mutations.add_row(site=2, node=5, derived_state="T", parent=3)
 
         ts = tables.tree_sequence()
-        model = trait_model.TraitModelAdditive(0, 1)
-        rng = np.random.default_rng(1)
-        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, rng)
+        engine = genotype.GenotypeEngine(ts)
         tree = ts.first()
 
-        g1 = simulator._individual_genotype(tree, ts.site(0), "T", ts.num_nodes)
-        g2 = simulator._individual_genotype(tree, ts.site(1), "T", ts.num_nodes)
-        g3 = simulator._individual_genotype(tree, ts.site(2), "C", ts.num_nodes)
+        g1 = individual_genotype(engine, tree, 0, "T")
+        g2 = individual_genotype(engine, tree, 1, "T")
+        g3 = individual_genotype(engine, tree, 2, "C")
 
-        c1 = simulator._obtain_allele_frequency(tree, ts.site(0))
-        c2 = simulator._obtain_allele_frequency(tree, ts.site(1))
-        c3 = simulator._obtain_allele_frequency(tree, ts.site(2))
+        c1 = site_allele_count(engine, 0)
+        c2 = site_allele_count(engine, 1)
+        c3 = site_allele_count(engine, 2)
 
         assert np.array_equal(g1, np.array([0, 1, 2]))
         assert np.array_equal(g2, np.array([1, 0, 0]))
@@ -599,16 +606,14 @@ class Test_site_genotypes:
 
         ts = tables.tree_sequence()
 
-        model = trait_model.TraitModelAdditive(0, 1)
-        rng = np.random.default_rng(1)
-        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, rng)
+        engine = genotype.GenotypeEngine(ts)
         tree = ts.first()
 
-        g1 = simulator._individual_genotype(tree, ts.site(0), "T", ts.num_nodes)
-        g2 = simulator._individual_genotype(tree, ts.site(1), "A", ts.num_nodes)
-        g3 = simulator._individual_genotype(tree, ts.site(2), "T", ts.num_nodes)
-        g4 = simulator._individual_genotype(tree, ts.site(3), "C", ts.num_nodes)
-        g5 = simulator._individual_genotype(tree, ts.site(4), "A", ts.num_nodes)
+        g1 = individual_genotype(engine, tree, 0, "T")
+        g2 = individual_genotype(engine, tree, 1, "A")
+        g3 = individual_genotype(engine, tree, 2, "T")
+        g4 = individual_genotype(engine, tree, 3, "C")
+        g5 = individual_genotype(engine, tree, 4, "A")
 
         assert np.array_equal(g1, np.array([2, 1]))
         assert np.array_equal(g2, np.array([3, 3]))
@@ -655,16 +660,14 @@ class Test_site_genotypes:
 
         ts = tables.tree_sequence()
 
-        model = trait_model.TraitModelAdditive(0, 1)
-        rng = np.random.default_rng(1)
-        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, rng)
+        engine = genotype.GenotypeEngine(ts)
         tree = ts.first()
 
-        g1 = simulator._individual_genotype(tree, ts.site(0), "T", ts.num_nodes)
-        g2 = simulator._individual_genotype(tree, ts.site(1), "A", ts.num_nodes)
-        g3 = simulator._individual_genotype(tree, ts.site(2), "T", ts.num_nodes)
-        g4 = simulator._individual_genotype(tree, ts.site(3), "C", ts.num_nodes)
-        g5 = simulator._individual_genotype(tree, ts.site(4), "A", ts.num_nodes)
+        g1 = individual_genotype(engine, tree, 0, "T")
+        g2 = individual_genotype(engine, tree, 1, "A")
+        g3 = individual_genotype(engine, tree, 2, "T")
+        g4 = individual_genotype(engine, tree, 3, "C")
+        g5 = individual_genotype(engine, tree, 4, "A")
 
         assert np.array_equal(g1, np.array([0, 0, 0, 1, 1, 1]))
         assert np.array_equal(g2, np.array([1, 1, 1, 1, 1, 1]))
@@ -673,7 +676,7 @@ class Test_site_genotypes:
         assert np.array_equal(g5, np.array([1, 1, 1, 1, 1, 1]))
 
 
-class Test_obtain_allele_frequency:
+class Test_site_allele_count:
     def test_binary_tree(self):
         ts = tskit.Tree.generate_comb(6, span=10).tree_sequence
         tables = ts.dump_tables()
@@ -709,16 +712,13 @@ class Test_obtain_allele_frequency:
 
         ts = tables.tree_sequence()
 
-        model = trait_model.TraitModelAdditive(0, 1)
-        rng = np.random.default_rng(1)
-        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, rng)
-        tree = ts.first()
+        engine = genotype.GenotypeEngine(ts)
 
-        g1 = simulator._obtain_allele_frequency(tree, ts.site(0))
-        g2 = simulator._obtain_allele_frequency(tree, ts.site(1))
-        g3 = simulator._obtain_allele_frequency(tree, ts.site(2))
-        g4 = simulator._obtain_allele_frequency(tree, ts.site(3))
-        g5 = simulator._obtain_allele_frequency(tree, ts.site(4))
+        g1 = site_allele_count(engine, 0)
+        g2 = site_allele_count(engine, 1)
+        g3 = site_allele_count(engine, 2)
+        g4 = site_allele_count(engine, 3)
+        g5 = site_allele_count(engine, 4)
 
         assert g1 == {"T": 3}
         assert g2 == {"A": 6}
@@ -782,3 +782,1587 @@ class Test_sim_genetic_value:
             genotypic_effect_data.allele_frequency,
             np.array([0.5, 0.75, 0.25, 0.25, 0.25, 0.5]),
         )
+
+
+class Test_choose_causal_site:
+    @pytest.mark.parametrize("num_causal", [1, 30, 100])
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    def test_range_output(self, num_causal, random_seed):
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelAdditive(0, 1)
+        simulator = simulate_phenotype.PhenotypeSimulator(
+            ts, num_causal, 0.3, model, random_seed
+        )
+        rng = np.random.default_rng(random_seed)
+        expected = np.sort(
+            rng.choice(range(ts.num_sites), size=num_causal, replace=False)
+        )
+
+        assert np.array_equal(simulator._choose_causal_site(), expected)
+
+
+class Test_group_sites_by_tree:
+    def test_all_trees(self):
+        ts = all_trees_ts(4)
+        tables = ts.dump_tables()
+        for position in [0, 0.5, 3, 3.2, 3.9, 7, 15]:
+            tables.sites.add_row(position, "A")
+        ts = tables.tree_sequence()
+        model = trait_model.TraitModelAdditive(0, 1)
+        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, 1)
+        tree_index, tree_start = simulator._group_sites_by_tree(np.arange(7))
+
+        assert np.array_equal(tree_index, np.array([0, 3, 7, 15]))
+        assert np.array_equal(tree_start, np.array([0, 2, 5, 6, 7]))
+
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    def test_single_pass(self, random_seed):
+        ts = msprime.sim_ancestry(
+            10,
+            sequence_length=100_000,
+            recombination_rate=1e-8,
+            population_size=10**4,
+            random_seed=random_seed,
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-8, random_seed=random_seed)
+        model = trait_model.TraitModelAlleleFrequency(0, 1, -1)
+        simulator = simulate_phenotype.PhenotypeSimulator(
+            ts, ts.num_sites, 0.3, model, random_seed
+        )
+        genotypic_effect_data, individual_genetic_array = simulator.sim_genetic_value()
+
+        engine = genotype.GenotypeEngine(ts)
+        tree = tskit.Tree(ts)
+        expected_genetic_array = np.zeros(ts.num_individuals)
+        for i, site_id in enumerate(genotypic_effect_data.site_id):
+            tree.seek(ts.site(site_id).position)
+            g = individual_genotype(
+                engine, tree, site_id, genotypic_effect_data.causal_allele[i]
+            )
+            assert genotypic_effect_data.allele_frequency[i] == np.sum(g) / (
+                2 * ts.num_individuals
+            )
+            expected_genetic_array += g * genotypic_effect_data.effect_size[i]
+
+        assert np.allclose(individual_genetic_array, expected_genetic_array)
+
+
+class Test_genotype_matrix:
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    @pytest.mark.parametrize(
+        "model",
+        [
+            trait_model.TraitModelAdditive(0, 1),
+            trait_model.TraitModelAlleleFrequency(0, 1, -1),
+        ],
+    )
+    def test_dense_sparse(self, random_seed, model):
+        ts = msprime.sim_ancestry(
+            20,
+            sequence_length=100_000,
+            recombination_rate=1e-8,
+            population_size=10**4,
+            random_seed=random_seed,
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-8, random_seed=random_seed)
+        dense_result = simulate_phenotype.sim_phenotype(ts, 20, model, 0.3, random_seed)
+        sparse_result = simulate_phenotype.sim_phenotype(
+            ts, 20, model, 0.3, random_seed, genotype_matrix=True
+        )
+
+        assert dense_result.genotype_matrix is None
+        assert np.array_equal(
+            dense_result.phenotype.genetic_value,
+            sparse_result.phenotype.genetic_value,
+        )
+        assert np.array_equal(
+            dense_result.phenotype.phenotype, sparse_result.phenotype.phenotype
+        )
+        assert np.array_equal(
+            dense_result.genotype.effect_size, sparse_result.genotype.effect_size
+        )
+        assert np.array_equal(
+            dense_result.genotype.allele_frequency,
+            sparse_result.genotype.allele_frequency,
+        )
+
+    def test_genotype_matrix(self):
+        ts = msprime.sim_ancestry(
+            20,
+            sequence_length=100_000,
+            recombination_rate=1e-8,
+            population_size=10**4,
+            random_seed=1,
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-8, random_seed=1)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts, 20, model, 0.3, 1, genotype_matrix=True
+        )
+        genotype_matrix = sim_result.genotype_matrix
+        X = genotype_matrix.to_dense()
+
+        assert genotype_matrix.shape == (ts.num_individuals, 20)
+        assert X.shape == (ts.num_individuals, 20)
+        assert np.allclose(
+            X.sum(axis=0) / (2 * ts.num_individuals),
+            sim_result.genotype.allele_frequency,
+        )
+        assert np.allclose(
+            X @ sim_result.genotype.effect_size, sim_result.phenotype.genetic_value
+        )
+        beta = np.random.default_rng(1).normal(size=(20, 3))
+        assert np.allclose(genotype_matrix.dot(beta), X @ beta)
+
+        engine = genotype.GenotypeEngine(ts)
+        tree = tskit.Tree(ts)
+        for i, site_id in enumerate(sim_result.genotype.site_id):
+            tree.seek(ts.site(site_id).position)
+            g = individual_genotype(
+                engine, tree, site_id, sim_result.genotype.causal_allele[i]
+            )
+            assert np.array_equal(X[:, i], g)
+
+    def test_to_scipy(self):
+        pytest.importorskip("scipy")
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts, 5, model, 0.3, 1, genotype_matrix=True
+        )
+        genotype_matrix = sim_result.genotype_matrix
+
+        assert np.array_equal(
+            genotype_matrix.to_scipy().toarray(), genotype_matrix.to_dense()
+        )
+
+
+class Test_sim_phenotype_replicates:
+    @pytest.mark.parametrize("num_replicates", [1, 5, np.array([3])[0]])
+    @pytest.mark.parametrize("h2", [0, 0.3, 1])
+    @pytest.mark.parametrize(
+        "model",
+        [
+            trait_model.TraitModelAdditive(0, 1),
+            trait_model.TraitModelAlleleFrequency(0, 1, -1),
+        ],
+    )
+    def test_output(self, num_replicates, h2, model):
+        num_ind = 10
+        num_causal = 5
+        ts = msprime.sim_ancestry(num_ind, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        sim_result = simulate_phenotype.sim_phenotype_replicates(
+            ts, num_causal, model, h2, num_replicates, random_seed=1
+        )
+        phenotype_result = sim_result.phenotype
+        genetic_result = sim_result.genotype
+        shape = (num_ind, num_replicates)
+
+        assert np.array_equal(phenotype_result.individual_id, np.arange(num_ind))
+        assert phenotype_result.phenotype.shape == shape
+        assert phenotype_result.environment_noise.shape == shape
+        assert phenotype_result.genetic_value.shape == shape
+        assert len(genetic_result.site_id) == num_causal
+        assert len(genetic_result.causal_allele) == num_causal
+        assert len(genetic_result.allele_frequency) == num_causal
+        assert genetic_result.effect_size.shape == (num_causal, num_replicates)
+
+        X = sim_result.genotype_matrix.to_dense()
+        assert np.allclose(
+            phenotype_result.genetic_value, X @ genetic_result.effect_size
+        )
+        if h2 == 0:
+            assert np.array_equal(
+                phenotype_result.phenotype, phenotype_result.environment_noise
+            )
+        else:
+            assert np.allclose(
+                phenotype_result.phenotype,
+                phenotype_result.genetic_value + phenotype_result.environment_noise,
+            )
+        if h2 == 1:
+            assert np.array_equal(phenotype_result.environment_noise, np.zeros(shape))
+
+    def test_replicates_differ(self):
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype_replicates(
+            ts, 5, model, 0.3, 2, random_seed=1
+        )
+        effect_size = sim_result.genotype.effect_size
+        environment_noise = sim_result.phenotype.environment_noise
+
+        assert not np.array_equal(effect_size[:, 0], effect_size[:, 1])
+        assert not np.array_equal(environment_noise[:, 0], environment_noise[:, 1])
+
+    @pytest.mark.parametrize("num_replicates", ["1", None])
+    def test_num_replicates(self, num_replicates):
+        ts = msprime.sim_ancestry(2, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(
+            TypeError, match="Number of replicates should be an integer"
+        ):
+            simulate_phenotype.sim_phenotype_replicates(
+                ts, 1, model, 0.3, num_replicates
+            )
+
+    @pytest.mark.parametrize("num_replicates", [0, -1, 1.5])
+    def test_num_replicates_value(self, num_replicates):
+        ts = msprime.sim_ancestry(2, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(
+            ValueError, match="Number of replicates should be a positive integer"
+        ):
+            simulate_phenotype.sim_phenotype_replicates(
+                ts, 1, model, 0.3, num_replicates
+            )
+
+
+class Test_multivariate:
+    @pytest.mark.parametrize("h2", [0.3, [0, 0.5, 1]])
+    @pytest.mark.parametrize("genotype_matrix", [True, False])
+    def test_output(self, h2, genotype_matrix):
+        num_ind = 10
+        num_causal = 5
+        ts = msprime.sim_ancestry(num_ind, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelMultivariateNormal(
+            [0, 1, 2], [[1, 0.5, 0], [0.5, 1, 0], [0, 0, 2]]
+        )
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts, num_causal, model, h2, random_seed=1, genotype_matrix=genotype_matrix
+        )
+        phenotype_result = sim_result.phenotype
+        genetic_result = sim_result.genotype
+        shape = (num_ind, 3)
+
+        assert phenotype_result.phenotype.shape == shape
+        assert phenotype_result.environment_noise.shape == shape
+        assert phenotype_result.genetic_value.shape == shape
+        assert genetic_result.effect_size.shape == (num_causal, 3)
+
+        X = simulate_phenotype.sim_phenotype(
+            ts, num_causal, model, h2, random_seed=1, genotype_matrix=True
+        ).genotype_matrix.to_dense()
+        assert np.allclose(
+            phenotype_result.genetic_value, X @ genetic_result.effect_size
+        )
+        if np.ndim(h2) > 0:
+            assert np.array_equal(
+                phenotype_result.phenotype[:, 0],
+                phenotype_result.environment_noise[:, 0],
+            )
+            assert np.all(phenotype_result.environment_noise[:, 2] == 0)
+        assert np.allclose(
+            phenotype_result.phenotype[:, 1:],
+            phenotype_result.genetic_value[:, 1:]
+            + phenotype_result.environment_noise[:, 1:],
+        )
+
+    def test_dense_sparse(self):
+        ts = msprime.sim_ancestry(20, sequence_length=100_000, random_seed=2)
+        ts = msprime.sim_mutations(ts, rate=0.001, random_seed=2)
+        model = trait_model.TraitModelMultivariateNormal([0, 0], [[1, 0.9], [0.9, 1]])
+        dense = simulate_phenotype.sim_phenotype(ts, 10, model, [0.3, 0.6], 3)
+        sparse = simulate_phenotype.sim_phenotype(
+            ts, 10, model, [0.3, 0.6], 3, genotype_matrix=True
+        )
+
+        assert np.array_equal(dense.genotype.effect_size, sparse.genotype.effect_size)
+        assert np.allclose(
+            dense.phenotype.genetic_value, sparse.phenotype.genetic_value
+        )
+
+    def test_replicates(self):
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2))
+        sim_result = simulate_phenotype.sim_phenotype_replicates(
+            ts, 5, model, [0.3, 0.6], 4, random_seed=1
+        )
+
+        assert sim_result.phenotype.phenotype.shape == (10, 4, 2)
+        assert sim_result.genotype.effect_size.shape == (5, 4, 2)
+        X = sim_result.genotype_matrix.to_dense()
+        assert np.allclose(
+            sim_result.phenotype.genetic_value,
+            np.einsum("ij,jrt->irt", X, sim_result.genotype.effect_size),
+        )
+
+    @pytest.mark.parametrize("h2", [[0.3], [0.3, 0.3, 0.3], [[0.3, 0.3]]])
+    def test_h2_length(self, h2):
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2))
+        with pytest.raises(ValueError, match="one value per trait"):
+            simulate_phenotype.sim_phenotype(ts, 5, model, h2, random_seed=1)
+
+    @pytest.mark.parametrize("h2", [[-0.1, 0.3], [0.3, 1.1]])
+    def test_h2_value(self, h2):
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2))
+        with pytest.raises(ValueError, match="Heritability should be 0 <= h2 <= 1"):
+            simulate_phenotype.sim_phenotype(ts, 5, model, h2, random_seed=1)
+
+    @pytest.mark.parametrize("h2", [["a", "b"], None])
+    def test_h2_type(self, h2):
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2))
+        with pytest.raises(TypeError, match="Heritability should be a number"):
+            simulate_phenotype.sim_phenotype(ts, 5, model, h2, random_seed=1)
+
+    def test_h2_array_univariate(self):
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(TypeError, match="Heritability should be a number"):
+            simulate_phenotype.sim_phenotype(ts, 5, model, [0.3], random_seed=1)
+
+
+class Test_num_workers:
+    @pytest.mark.parametrize("genotype_matrix", [True, False])
+    @pytest.mark.parametrize(
+        "model",
+        [
+            trait_model.TraitModelAdditive(0, 1),
+            trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2)),
+        ],
+    )
+    def test_worker_count(self, monkeypatch, genotype_matrix, model):
+        monkeypatch.setattr(simulate_phenotype, "_PARALLEL_CHUNK_SIZE", 7)
+        ts = msprime.sim_ancestry(
+            20,
+            sequence_length=100_000,
+            recombination_rate=1e-8,
+            population_size=10**4,
+            random_seed=1,
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-7, random_seed=1)
+        results = [
+            simulate_phenotype.sim_phenotype(
+                ts,
+                30,
+                model,
+                0.3,
+                random_seed=1,
+                genotype_matrix=genotype_matrix,
+                num_workers=num_workers,
+            )
+            for num_workers in [1, 2]
+        ]
+        for sim_result in results[1:]:
+            assert np.array_equal(
+                sim_result.genotype.site_id, results[0].genotype.site_id
+            )
+            assert np.array_equal(
+                sim_result.genotype.effect_size, results[0].genotype.effect_size
+            )
+            assert np.array_equal(
+                sim_result.phenotype.phenotype, results[0].phenotype.phenotype
+            )
+
+        sim_result = results[0]
+        X = simulate_phenotype.sim_phenotype(
+            ts, 30, model, 0.3, random_seed=1, genotype_matrix=True
+        ).genotype_matrix.to_dense()
+        assert np.allclose(
+            sim_result.phenotype.genetic_value, X @ sim_result.genotype.effect_size
+        )
+        if genotype_matrix:
+            assert np.array_equal(sim_result.genotype_matrix.to_dense(), X)
+        else:
+            assert sim_result.genotype_matrix is None
+
+    def test_dense_tree(self, monkeypatch):
+        if numba.config.NUMBA_NUM_THREADS < 2:
+            pytest.skip("Not enough numba threads")
+        # A single tree with more causal sites than a chunk
+        ts = msprime.sim_ancestry(
+            50, sequence_length=1_000_000, population_size=10**4, random_seed=1
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-7, random_seed=1)
+        assert ts.num_trees == 1
+        monkeypatch.setattr(simulate_phenotype, "_THREADED_MIN_CARRIERS", 0)
+        model = trait_model.TraitModelAdditive(0, 1)
+        default_num_threads = numba.get_num_threads()
+        numba.set_num_threads(numba.config.NUMBA_NUM_THREADS)
+        try:
+            results = [
+                simulate_phenotype.sim_phenotype(
+                    ts, 2000, model, 0.3, random_seed=1, num_workers=num_workers
+                )
+                for num_workers in [1, 2]
+            ]
+        finally:
+            numba.set_num_threads(default_num_threads)
+
+        assert np.array_equal(
+            results[0].phenotype.genetic_value, results[1].phenotype.genetic_value
+        )
+        assert np.array_equal(
+            results[0].phenotype.phenotype, results[1].phenotype.phenotype
+        )
+
+    def test_worker_reset(self, monkeypatch):
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelAdditive(0, 1)
+
+        def fail_chunk(*args):
+            raise RuntimeError("chunk failed")
+
+        monkeypatch.setattr(simulate_phenotype, "_worker_chunk", fail_chunk)
+        with pytest.raises(RuntimeError, match="chunk failed"):
+            simulate_phenotype.sim_phenotype(ts, 5, model, num_workers=1)
+        assert simulate_phenotype._worker_simulator is None
+        assert simulate_phenotype._worker_engine is None
+
+    @pytest.mark.parametrize("num_workers", [0, -1, 1.5])
+    def test_num_workers_value(self, num_workers):
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(
+            ValueError, match="Number of workers should be a positive integer"
+        ):
+            simulate_phenotype.sim_phenotype(ts, 5, model, num_workers=num_workers)
+
+    @pytest.mark.parametrize("num_workers", ["1", [1]])
+    def test_num_workers_type(self, num_workers):
+        ts = msprime.sim_ancestry(10, sequence_length=100_000, random_seed=1)
+        ts = msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(TypeError, match="Number of workers should be an integer"):
+            simulate_phenotype.sim_phenotype(ts, 5, model, num_workers=num_workers)
+
+
+class Test_threaded_genotype:
+    @pytest.mark.parametrize(
+        "model",
+        [
+            trait_model.TraitModelAdditive(0, 1),
+            trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2)),
+        ],
+    )
+    def test_threaded_output(self, monkeypatch, model):
+        if numba.config.NUMBA_NUM_THREADS < 2:
+            pytest.skip("Not enough numba threads")
+        # A single tree with many causal sites
+        ts = msprime.sim_ancestry(
+            50, sequence_length=100_000, population_size=10**4, random_seed=1
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-7, random_seed=1)
+        assert ts.num_trees == 1
+        monkeypatch.setattr(simulate_phenotype, "_THREADED_MIN_CARRIERS", 0)
+        default_num_threads = numba.get_num_threads()
+        results = []
+        try:
+            for num_threads in [1, 2, numba.config.NUMBA_NUM_THREADS]:
+                numba.set_num_threads(num_threads)
+                results.append(simulate_phenotype.sim_phenotype(ts, 200, model, 0.3, 1))
+        finally:
+            numba.set_num_threads(default_num_threads)
+
+        for sim_result in results[1:]:
+            assert np.array_equal(
+                sim_result.genotype.effect_size, results[0].genotype.effect_size
+            )
+            assert np.array_equal(
+                sim_result.phenotype.genetic_value, results[0].phenotype.genetic_value
+            )
+            assert np.array_equal(
+                sim_result.phenotype.phenotype, results[0].phenotype.phenotype
+            )
+
+    def test_threshold(self, monkeypatch):
+        ts = sim_ts(20)
+        model = trait_model.TraitModelAdditive(0, 1)
+        calls = []
+        monkeypatch.setattr(
+            genotype.GenotypeEngine,
+            "tree_genetic_value_threaded",
+            lambda self, *args, **kwargs: calls.append(args),
+        )
+        simulate_phenotype.sim_phenotype(ts, 30, model, 0.3, 1)
+        assert len(calls) == 0
+
+
+class Test_candidate_site:
+    def small_ts(self):
+        ts = msprime.sim_ancestry(10, sequence_length=100, random_seed=1)
+        return msprime.sim_mutations(ts, rate=0.01, random_seed=1)
+
+    def test_intervals(self):
+        ts = self.small_ts()
+        intervals = np.array([[0, 10], [10, 25.5], [60, 80]])
+        candidate_site = simulate_phenotype._candidate_site(ts, None, intervals)
+        position = ts.sites_position
+        expected = np.flatnonzero(
+            (position < 25.5) | ((position >= 60) & (position < 80))
+        )
+
+        assert np.array_equal(candidate_site, expected)
+
+    def test_site_mask_and_intervals(self):
+        ts = self.small_ts()
+        rng = np.random.default_rng(1)
+        site_mask = rng.random(ts.num_sites) < 0.5
+        intervals = [[5, 30], [40, 70]]
+        position = ts.sites_position
+
+        assert np.array_equal(
+            simulate_phenotype._candidate_site(ts, site_mask, None),
+            np.flatnonzero(site_mask),
+        )
+        expected = np.flatnonzero(
+            site_mask
+            & (
+                ((position >= 5) & (position < 30))
+                | ((position >= 40) & (position < 70))
+            )
+        )
+        assert np.array_equal(
+            simulate_phenotype._candidate_site(ts, site_mask, intervals), expected
+        )
+
+    def test_none(self):
+        ts = self.small_ts()
+        assert simulate_phenotype._candidate_site(ts, None, None) is None
+
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    def test_sim_phenotype(self, random_seed):
+        ts = self.small_ts()
+        model = trait_model.TraitModelAdditive(0, 1)
+        intervals = [[20, 50]]
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=random_seed, intervals=intervals
+        )
+        position = ts.sites_position[sim_result.genotype.site_id]
+
+        assert len(sim_result.genotype.site_id) == 5
+        assert np.all((position >= 20) & (position < 50))
+
+    def test_sim_phenotype_all_sites(self):
+        ts = self.small_ts()
+        model = trait_model.TraitModelAdditive(0, 1)
+        expected = simulate_phenotype.sim_phenotype(ts, 5, model, random_seed=1)
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, site_mask=np.ones(ts.num_sites, dtype=bool)
+        )
+
+        assert np.array_equal(sim_result.genotype.site_id, expected.genotype.site_id)
+        assert np.array_equal(
+            sim_result.phenotype.phenotype, expected.phenotype.phenotype
+        )
+
+    def test_num_causal(self):
+        ts = self.small_ts()
+        model = trait_model.TraitModelAdditive(0, 1)
+        site_mask = np.zeros(ts.num_sites, dtype=bool)
+        site_mask[:3] = True
+        with pytest.raises(
+            ValueError, match="There are less number of candidate sites than"
+        ):
+            simulate_phenotype.sim_phenotype(ts, 4, model, site_mask=site_mask)
+
+    @pytest.mark.parametrize("site_mask", [[True, False], np.ones(3, dtype=int)])
+    def test_site_mask_value(self, site_mask):
+        ts = self.small_ts()
+        with pytest.raises(ValueError, match="Site mask should be a boolean array"):
+            simulate_phenotype._candidate_site(ts, site_mask, None)
+
+    @pytest.mark.parametrize(
+        "intervals, message",
+        [
+            ([0, 10], "Intervals should be an array of shape"),
+            ([[10, 5]], "Intervals should be sorted and non-overlapping"),
+            ([[0, 10], [5, 20]], "Intervals should be sorted and non-overlapping"),
+            ([[50, 60], [0, 10]], "Intervals should be sorted and non-overlapping"),
+            ([[0, 101]], "Intervals should be within the sequence length"),
+            ([[-1, 10]], "Intervals should be within the sequence length"),
+        ],
+    )
+    def test_intervals_value(self, intervals, message):
+        ts = self.small_ts()
+        with pytest.raises(ValueError, match=message):
+            simulate_phenotype._candidate_site(ts, None, intervals)
+
+
+class Test_frequency_sampling:
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    def test_site_frequency(self, random_seed):
+        ts = sim_ts(30, random_seed)
+        model = trait_model.TraitModelAdditive(0, 1)
+        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, 1)
+        site_frequency = simulator.site_frequency()
+
+        expected = np.zeros(ts.num_sites)
+        for variant in ts.variants():
+            ancestral = variant.alleles.index(variant.site.ancestral_state)
+            frequency = np.mean(variant.genotypes != ancestral)
+            expected[variant.site.id] = min(frequency, 1 - frequency)
+        assert np.allclose(site_frequency, expected)
+        assert simulator.site_frequency() is site_frequency
+
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    def test_frequency_bins(self, random_seed):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        frequency_bins = [(0, 0.05, 6), (0.05, 0.2, 3), (0.2, 0.51, 1)]
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts, 10, model, random_seed=random_seed, frequency_bins=frequency_bins
+        )
+        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, 1)
+        frequency = simulator.site_frequency()[sim_result.genotype.site_id]
+
+        assert np.all(np.diff(sim_result.genotype.site_id) > 0)
+        assert np.sum(frequency < 0.05) == 6
+        assert np.sum((frequency >= 0.05) & (frequency < 0.2)) == 3
+        assert np.sum(frequency >= 0.2) == 1
+
+    def test_frequency_weight(self):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        intervals = [[0, 50_000]]
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts,
+            10,
+            model,
+            random_seed=1,
+            intervals=intervals,
+            frequency_weight=lambda frequency: (frequency < 0.1).astype(float),
+        )
+        simulator = simulate_phenotype.PhenotypeSimulator(ts, 1, 0.3, model, 1)
+        frequency = simulator.site_frequency()[sim_result.genotype.site_id]
+
+        assert np.all(frequency < 0.1)
+        assert np.all(ts.sites_position[sim_result.genotype.site_id] < 50_000)
+
+    def test_bin_num_causal(self):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(ValueError, match="less number of sites in the frequency"):
+            simulate_phenotype.sim_phenotype(
+                ts, 5, model, frequency_bins=[(0.6, 0.7, 5)]
+            )
+
+    @pytest.mark.parametrize(
+        "frequency_bins, message",
+        [
+            ([(0, 0.1, 2)], "should sum to the number of causal sites"),
+            ([(0, 0.1)], "should be a list of"),
+            ([(0, 0.1, 1.5), (0.1, 0.5, 1.5)], "should be a non-negative integer"),
+            ([(0, 0.2, 2), (0.1, 0.5, 1)], "should be sorted and non-overlapping"),
+            ([(0.2, 0.1, 3)], "should be sorted and non-overlapping"),
+        ],
+    )
+    def test_frequency_bins_value(self, frequency_bins, message):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(ValueError, match=message):
+            simulate_phenotype.sim_phenotype(
+                ts, 3, model, frequency_bins=frequency_bins
+            )
+
+    def test_frequency_weight_value(self):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(ValueError, match="non-negative finite weight"):
+            simulate_phenotype.sim_phenotype(
+                ts, 3, model, frequency_weight=lambda frequency: -frequency
+            )
+        with pytest.raises(ValueError, match="positive frequency weight"):
+            simulate_phenotype.sim_phenotype(
+                ts, 3, model, frequency_weight=lambda frequency: 0 * frequency
+            )
+        with pytest.raises(ValueError, match="cannot both be specified"):
+            simulate_phenotype.sim_phenotype(
+                ts,
+                3,
+                model,
+                frequency_bins=[(0, 0.5, 3)],
+                frequency_weight=lambda frequency: frequency,
+            )
+
+    def test_frequency_weight_type(self):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(TypeError, match="Frequency weight should be a callable"):
+            simulate_phenotype.sim_phenotype(ts, 3, model, frequency_weight=1)
+
+
+class Test_simulation_session:
+    def test_input(self):
+        with pytest.raises(TypeError, match="Input should be a tree sequence data"):
+            simulate_phenotype.SimulationSession(1)
+
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    @pytest.mark.parametrize("genotype_matrix", [True, False])
+    @pytest.mark.parametrize(
+        "model",
+        [
+            trait_model.TraitModelAdditive(0, 1),
+            trait_model.TraitModelAlleleFrequency(0, 1, -1),
+            trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2)),
+        ],
+    )
+    def test_simulate(self, random_seed, genotype_matrix, model):
+        ts = sim_ts(20)
+        session = simulate_phenotype.SimulationSession(ts)
+        for _ in range(2):
+            sim_result = session.simulate(
+                5, model, random_seed=random_seed, genotype_matrix=genotype_matrix
+            )
+            expected = simulate_phenotype.sim_phenotype(
+                ts, 5, model, random_seed=random_seed, genotype_matrix=genotype_matrix
+            )
+            np.testing.assert_array_equal(
+                sim_result.genotype.site_id, expected.genotype.site_id
+            )
+            np.testing.assert_array_equal(
+                sim_result.genotype.causal_allele, expected.genotype.causal_allele
+            )
+            np.testing.assert_array_equal(
+                sim_result.genotype.effect_size, expected.genotype.effect_size
+            )
+            np.testing.assert_array_equal(
+                sim_result.phenotype.phenotype, expected.phenotype.phenotype
+            )
+
+    @pytest.mark.parametrize("random_seed", [1, 2])
+    def test_simulate_replicates(self, random_seed):
+        ts = sim_ts(20)
+        model = trait_model.TraitModelAdditive(0, 1)
+        session = simulate_phenotype.SimulationSession(ts)
+        sim_result = session.simulate_replicates(
+            5, model, num_replicates=3, random_seed=random_seed
+        )
+        expected = simulate_phenotype.sim_phenotype_replicates(
+            ts, 5, model, num_replicates=3, random_seed=random_seed
+        )
+        np.testing.assert_array_equal(
+            sim_result.genotype.effect_size, expected.genotype.effect_size
+        )
+        np.testing.assert_array_equal(
+            sim_result.phenotype.phenotype, expected.phenotype.phenotype
+        )
+
+    def test_frequency_bins(self):
+        ts = sim_ts(20)
+        model = trait_model.TraitModelAdditive(0, 1)
+        session = simulate_phenotype.SimulationSession(ts)
+        site_frequency = session.site_frequency()
+        frequency_bins = [(0, 0.1, 3), (0.1, 0.51, 2)]
+        sim_result = session.simulate(
+            5, model, random_seed=1, frequency_bins=frequency_bins
+        )
+        expected = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, frequency_bins=frequency_bins
+        )
+        np.testing.assert_array_equal(
+            sim_result.genotype.site_id, expected.genotype.site_id
+        )
+        assert session.site_frequency() is site_frequency
+
+    def test_cached_arrays(self):
+        ts = sim_ts(20)
+        session = simulate_phenotype.SimulationSession(ts)
+        np.testing.assert_array_equal(session.nodes_individual, ts.nodes_individual)
+        np.testing.assert_array_equal(
+            session.sample_individual, ts.nodes_individual[ts.samples()]
+        )
+        np.testing.assert_array_equal(
+            session.individual_ploidy, np.full(ts.num_individuals, 2)
+        )
+        np.testing.assert_array_equal(session.sites_position, ts.sites_position)
+        np.testing.assert_array_equal(
+            session.mutations_parent, ts.tables.mutations.parent
+        )
+
+    def test_engine_reused(self, monkeypatch):
+        ts = sim_ts(20)
+        model = trait_model.TraitModelAdditive(0, 1)
+        session = simulate_phenotype.SimulationSession(ts)
+
+        def fail(ts):
+            raise AssertionError("Genotype engine should not be created")
+
+        monkeypatch.setattr(simulate_phenotype.genotype, "GenotypeEngine", fail)
+        session.simulate(5, model, random_seed=1)
+        session.simulate(5, model, random_seed=1, num_workers=1)
+        session.simulate_replicates(5, model, num_replicates=2, random_seed=1)
+
+
+class Test_tree_sequence_path:
+    @pytest.mark.parametrize("as_str", [True, False])
+    @pytest.mark.parametrize("genotype_matrix", [True, False])
+    def test_sim_phenotype(self, tmp_path, as_str, genotype_matrix):
+        ts = sim_ts(20)
+        path = tmp_path / "sim.trees"
+        ts.dump(path)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(
+            str(path) if as_str else path,
+            5,
+            model,
+            random_seed=1,
+            genotype_matrix=genotype_matrix,
+        )
+        expected = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, genotype_matrix=genotype_matrix
+        )
+        np.testing.assert_array_equal(
+            sim_result.genotype.site_id, expected.genotype.site_id
+        )
+        np.testing.assert_array_equal(
+            sim_result.phenotype.phenotype, expected.phenotype.phenotype
+        )
+
+    def test_sim_phenotype_replicates(self, tmp_path):
+        ts = sim_ts(20)
+        path = tmp_path / "sim.trees"
+        ts.dump(path)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype_replicates(
+            path, 5, model, num_replicates=2, random_seed=1
+        )
+        expected = simulate_phenotype.sim_phenotype_replicates(
+            ts, 5, model, num_replicates=2, random_seed=1
+        )
+        np.testing.assert_array_equal(
+            sim_result.phenotype.phenotype, expected.phenotype.phenotype
+        )
+
+    def test_session(self, tmp_path):
+        ts = sim_ts(20)
+        path = tmp_path / "sim.trees"
+        ts.dump(path)
+        model = trait_model.TraitModelAdditive(0, 1)
+        session = simulate_phenotype.SimulationSession(path)
+        assert session.ts_path == str(path)
+        sim_result = session.simulate(5, model, random_seed=1)
+        expected = simulate_phenotype.sim_phenotype(ts, 5, model, random_seed=1)
+        np.testing.assert_array_equal(
+            sim_result.phenotype.phenotype, expected.phenotype.phenotype
+        )
+
+    def test_pickle(self, tmp_path):
+        ts = sim_ts(20)
+        path = tmp_path / "sim.trees"
+        ts.dump(path)
+        model = trait_model.TraitModelAdditive(0, 1)
+        simulator = simulate_phenotype.PhenotypeSimulator(path, 5, 0.3, model, 1)
+        simulator._genotype_engine()
+        state = simulator.__getstate__()
+        assert state["ts"] is None
+        assert state["engine"] is None
+
+        copy = pickle.loads(pickle.dumps(simulator))
+        assert copy.ts.tables.equals(ts.tables, ignore_provenance=True)
+
+    def test_num_workers(self, tmp_path):
+        ts = sim_ts(20)
+        path = tmp_path / "sim.trees"
+        ts.dump(path)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(
+            path, 5, model, random_seed=1, num_workers=2
+        )
+        expected = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, num_workers=1
+        )
+        np.testing.assert_array_equal(
+            sim_result.phenotype.phenotype, expected.phenotype.phenotype
+        )
+
+
+def assert_result_equal(result, expected):
+    for name in ["individual_id", "phenotype", "environment_noise", "genetic_value"]:
+        np.testing.assert_array_equal(
+            getattr(result.phenotype, name), getattr(expected.phenotype, name)
+        )
+    for name in [
+        "site_id",
+        "causal_allele_code",
+        "allele_state",
+        "causal_allele",
+        "effect_size",
+        "allele_frequency",
+    ]:
+        np.testing.assert_array_equal(
+            getattr(result.genotype, name), getattr(expected.genotype, name)
+        )
+    if expected.genotype_matrix is None:
+        assert result.genotype_matrix is None
+    else:
+        np.testing.assert_array_equal(
+            result.genotype_matrix.to_dense(), expected.genotype_matrix.to_dense()
+        )
+
+
+class Test_result_io:
+    @pytest.mark.parametrize("compressed", [True, False])
+    @pytest.mark.parametrize("genotype_matrix", [True, False])
+    @pytest.mark.parametrize(
+        "model",
+        [
+            trait_model.TraitModelAdditive(0, 1),
+            trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2)),
+        ],
+    )
+    def test_npz(self, tmp_path, compressed, genotype_matrix, model):
+        ts = sim_ts(10)
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, genotype_matrix=genotype_matrix
+        )
+        sim_result.to_npz(tmp_path / "result.npz", compressed=compressed)
+        result = simulate_phenotype.Result.from_npz(tmp_path / "result.npz")
+        assert_result_equal(result, sim_result)
+        assert result.genotype.allele_state.dtype == object
+
+    @pytest.mark.parametrize("mmap_mode", ["r", None])
+    @pytest.mark.parametrize("genotype_matrix", [True, False])
+    def test_directory(self, tmp_path, mmap_mode, genotype_matrix):
+        ts = sim_ts(10)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, genotype_matrix=genotype_matrix
+        )
+        sim_result.to_directory(tmp_path / "result")
+        result = simulate_phenotype.Result.from_directory(
+            tmp_path / "result", mmap_mode=mmap_mode
+        )
+        assert_result_equal(result, sim_result)
+        assert isinstance(result.phenotype.phenotype, np.memmap) == (
+            mmap_mode is not None
+        )
+
+    @pytest.mark.parametrize(
+        "model",
+        [
+            trait_model.TraitModelAdditive(0, 1),
+            trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2)),
+        ],
+    )
+    def test_append_replicates(self, tmp_path, model):
+        ts = sim_ts(10)
+        sim_result = simulate_phenotype.sim_phenotype_replicates(
+            ts, 5, model, num_replicates=3, random_seed=1
+        )
+        path = tmp_path / "result"
+        sim_result.to_directory(path, replicates=True)
+        assert_result_equal(simulate_phenotype.Result.from_directory(path), sim_result)
+        for _ in range(2):
+            sim_result.to_directory(path, append=True)
+
+        result = simulate_phenotype.Result.from_directory(path)
+        assert result.phenotype.phenotype.shape[1] == 9
+        for name in ["phenotype", "environment_noise", "genetic_value"]:
+            np.testing.assert_array_equal(
+                getattr(result.phenotype, name),
+                np.concatenate([getattr(sim_result.phenotype, name)] * 3, axis=1),
+            )
+        np.testing.assert_array_equal(
+            result.genotype.effect_size,
+            np.concatenate([sim_result.genotype.effect_size] * 3, axis=1),
+        )
+        np.testing.assert_array_equal(
+            result.genotype.causal_allele, sim_result.genotype.causal_allele
+        )
+
+    def test_append_header_growth(self, tmp_path):
+        filename = tmp_path / "array.npy"
+        np.save(filename, np.zeros((1, 2)))
+        for _ in range(12):
+            simulate_phenotype._append_npy(filename, np.ones((9, 2)))
+        array = np.load(filename)
+        assert array.shape == (109, 2)
+        assert np.all(array[1:] == 1)
+
+    def test_append_bad_shape(self, tmp_path):
+        filename = tmp_path / "array.npy"
+        np.save(filename, np.zeros((1, 2)))
+        with pytest.raises(ValueError, match="same data type and shape"):
+            simulate_phenotype._append_npy(filename, np.zeros((1, 3)))
+
+    def test_no_replicate_axis(self, tmp_path):
+        ts = sim_ts(10)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(ts, 5, model, random_seed=1)
+        with pytest.raises(ValueError, match="should have a replicate axis"):
+            sim_result.to_directory(tmp_path / "result", replicates=True)
+
+    def test_append_without_replicates(self, tmp_path):
+        ts = sim_ts(10)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype_replicates(
+            ts, 5, model, num_replicates=2, random_seed=1
+        )
+        sim_result.to_directory(tmp_path / "result")
+        with pytest.raises(ValueError, match="written with replicates"):
+            sim_result.to_directory(tmp_path / "result", append=True)
+
+    def test_append_different_sites(self, tmp_path):
+        ts = sim_ts(10)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype_replicates(
+            ts, 5, model, num_replicates=2, random_seed=1
+        )
+        other_result = simulate_phenotype.sim_phenotype_replicates(
+            ts, 5, model, num_replicates=2, random_seed=2
+        )
+        sim_result.to_directory(tmp_path / "result", replicates=True)
+        with pytest.raises(ValueError, match="same individuals, causal sites"):
+            other_result.to_directory(tmp_path / "result", append=True)
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 5])
+    def test_iter_replicates(self, tmp_path, chunk_size):
+        ts = sim_ts(10)
+        model = trait_model.TraitModelAdditive(0, 1)
+        session = simulate_phenotype.SimulationSession(ts)
+        chunks = list(
+            session.iter_replicates(
+                5, model, num_replicates=5, chunk_size=chunk_size, random_seed=1
+            )
+        )
+        assert len(chunks) == -(-5 // chunk_size)
+        path = tmp_path / "result"
+        for i, sim_result in enumerate(chunks):
+            np.testing.assert_array_equal(
+                sim_result.genotype.site_id, chunks[0].genotype.site_id
+            )
+            assert sim_result.genotype_matrix is chunks[0].genotype_matrix
+            sim_result.to_directory(path, replicates=True, append=i > 0)
+
+        result = simulate_phenotype.Result.from_directory(path)
+        np.testing.assert_array_equal(
+            result.phenotype.phenotype,
+            np.concatenate([x.phenotype.phenotype for x in chunks], axis=1),
+        )
+        np.testing.assert_array_equal(
+            result.genotype.effect_size,
+            np.concatenate([x.genotype.effect_size for x in chunks], axis=1),
+        )
+        if chunk_size == 5:
+            expected = session.simulate_replicates(
+                5, model, num_replicates=5, random_seed=1
+            )
+            assert_result_equal(chunks[0], expected)
+
+    @pytest.mark.parametrize("chunk_size", [0, 1.5])
+    def test_iter_replicates_chunk_size(self, chunk_size):
+        ts = sim_ts(10)
+        model = trait_model.TraitModelAdditive(0, 1)
+        session = simulate_phenotype.SimulationSession(ts)
+        with pytest.raises(ValueError, match="Chunk size should be a positive"):
+            session.iter_replicates(5, model, num_replicates=5, chunk_size=chunk_size)
+
+
+class Test_h2_sweep:
+    @pytest.mark.parametrize("h2", [0.1, 0.3, 0.9])
+    @pytest.mark.parametrize("random_seed", [1, 2])
+    def test_single_h2(self, h2, random_seed):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        simulator = simulate_phenotype.PhenotypeSimulator(ts, 5, h2, model, random_seed)
+        _, genetic_value = simulator.sim_genetic_value()
+        rng = np.random.default_rng()
+        rng.bit_generator.state = simulator.rng.bit_generator.state
+        expected = simulator.sim_environment(genetic_value)
+        phenotype, environment_noise = simulate_phenotype._sim_environment_sweep(
+            genetic_value, np.array([h2]), 1.0, rng
+        )
+        np.testing.assert_array_equal(phenotype[0], expected.phenotype)
+        np.testing.assert_array_equal(environment_noise[0], expected.environment_noise)
+
+    def test_sweep(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(ts, 5, model, random_seed=1)
+        h2 = np.linspace(0, 1, 11)
+        sweep = sim_result.phenotype.sim_h2_sweep(h2, model.trait_var, random_seed=1)
+        num_individuals = ts.num_individuals
+        assert sweep.phenotype.shape == (len(h2), num_individuals)
+        assert sweep.environment_noise.shape == (len(h2), num_individuals)
+        assert sweep.genetic_value is sim_result.phenotype.genetic_value
+        assert sweep.individual_id is sim_result.phenotype.individual_id
+        np.testing.assert_array_equal(sweep.phenotype[0], sweep.environment_noise[0])
+        np.testing.assert_array_equal(
+            sweep.phenotype[-1], sim_result.phenotype.genetic_value
+        )
+        np.testing.assert_allclose(
+            sweep.phenotype[1:-1],
+            sim_result.phenotype.genetic_value + sweep.environment_noise[1:-1],
+        )
+
+    def test_trait_var(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 4)
+        sim_result = simulate_phenotype.sim_phenotype(ts, 5, model, random_seed=1)
+        sweep = sim_result.phenotype.sim_h2_sweep([0], model.trait_var, random_seed=1)
+        expected = np.random.default_rng(1).normal(scale=2, size=ts.num_individuals)
+        np.testing.assert_array_equal(sweep.phenotype[0], expected)
+        with pytest.raises(TypeError, match="trait_var"):
+            sim_result.phenotype.sim_h2_sweep([0])
+
+    def test_random_seed(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(ts, 5, model, random_seed=1)
+        sweep1 = sim_result.phenotype.sim_h2_sweep([0.2, 0.5], 1, random_seed=3)
+        sweep2 = sim_result.phenotype.sim_h2_sweep([0.2, 0.5], 1, random_seed=3)
+        np.testing.assert_array_equal(sweep1.phenotype, sweep2.phenotype)
+
+    def test_multivariate(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelMultivariateNormal([0, 0], [[1, 0], [0, 4]])
+        sim_result = simulate_phenotype.sim_phenotype(ts, 5, model, random_seed=1)
+        sweep = sim_result.phenotype.sim_h2_sweep(
+            [0, 0.5], trait_var=model.trait_var, random_seed=1
+        )
+        assert sweep.phenotype.shape == (2, ts.num_individuals, 2)
+        np.testing.assert_array_equal(sweep.phenotype[0], sweep.environment_noise[0])
+
+    @pytest.mark.parametrize("h2", [[-0.1], [1.1], [0.5, 2]])
+    def test_h2_range(self, h2):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(ts, 5, model, random_seed=1)
+        with pytest.raises(ValueError, match="Heritability should be 0 <= h2 <= 1"):
+            sim_result.phenotype.sim_h2_sweep(h2, 1)
+
+    def test_h2_input(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(ts, 5, model, random_seed=1)
+        with pytest.raises(TypeError, match="Heritability should be a number"):
+            sim_result.phenotype.sim_h2_sweep(["a"], 1)
+        with pytest.raises(ValueError, match="one dimensional array"):
+            sim_result.phenotype.sim_h2_sweep(0.5, 1)
+
+
+def add_non_sample_individuals(ts, num_individuals):
+    """
+    Returns a copy of the tree sequence where the oldest non-sample nodes are
+    assigned to new individuals with two nodes each.
+    """
+    tables = ts.dump_tables()
+    non_sample = np.flatnonzero((tables.nodes.flags & tskit.NODE_IS_SAMPLE) == 0)
+    non_sample = non_sample[np.argsort(-tables.nodes.time[non_sample])]
+    individual = tables.nodes.individual
+    for j in range(num_individuals):
+        individual_id = tables.individuals.add_row()
+        individual[non_sample[2 * j : 2 * j + 2]] = individual_id
+    tables.nodes.individual = individual
+    tables.sort()
+    return tables.tree_sequence()
+
+
+class Test_ploidy:
+    def mixed_ploidy_ts(self, random_seed=1):
+        ts = msprime.sim_ancestry(
+            samples=[
+                msprime.SampleSet(5, ploidy=1),
+                msprime.SampleSet(4, ploidy=2),
+                msprime.SampleSet(3, ploidy=4),
+            ],
+            sequence_length=100_000,
+            recombination_rate=1e-8,
+            population_size=10**4,
+            random_seed=random_seed,
+        )
+        return msprime.sim_mutations(ts, rate=1e-7, random_seed=random_seed)
+
+    def expected_genotype(self, ts, sim_result):
+        """
+        Returns the genotype of the sample individuals and the frequency of the
+        causal allele of each causal site, computed from the variants.
+        """
+        individual_id = sim_result.phenotype.individual_id
+        sample_individual = ts.nodes_individual[ts.samples()]
+        genotype = np.zeros((len(individual_id), len(sim_result.genotype.site_id)))
+        frequency = np.zeros(len(sim_result.genotype.site_id))
+        for j, site_id in enumerate(sim_result.genotype.site_id):
+            variant = next(ts.variants(left=ts.site(site_id).position))
+            causal_allele = sim_result.genotype.causal_allele[j]
+            has_allele = np.array(variant.alleles)[variant.genotypes] == causal_allele
+            frequency[j] = np.mean(has_allele)
+            for i, individual in enumerate(individual_id):
+                genotype[i, j] = np.sum(has_allele[sample_individual == individual])
+        return genotype, frequency
+
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    @pytest.mark.parametrize("genotype_matrix", [True, False])
+    def test_mixed_ploidy(self, random_seed, genotype_matrix):
+        ts = self.mixed_ploidy_ts(random_seed)
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, genotype_matrix=genotype_matrix
+        )
+        genotype, frequency = self.expected_genotype(ts, sim_result)
+        np.testing.assert_array_equal(
+            sim_result.phenotype.individual_id, np.arange(ts.num_individuals)
+        )
+        np.testing.assert_allclose(sim_result.genotype.allele_frequency, frequency)
+        np.testing.assert_allclose(
+            sim_result.phenotype.genetic_value,
+            genotype @ sim_result.genotype.effect_size,
+        )
+
+    @pytest.mark.parametrize("random_seed", [1, 2])
+    def test_non_sample_individuals(self, random_seed):
+        ts = msprime.sim_ancestry(
+            10,
+            sequence_length=100_000,
+            recombination_rate=1e-8,
+            population_size=10**4,
+            random_seed=random_seed,
+        )
+        ts = msprime.sim_mutations(ts, rate=1e-7, random_seed=random_seed)
+        full_ts = add_non_sample_individuals(ts, 3)
+        assert full_ts.num_individuals == ts.num_individuals + 3
+        model = trait_model.TraitModelAdditive(0, 1)
+        for genotype_matrix in [True, False]:
+            sim_result = simulate_phenotype.sim_phenotype(
+                full_ts, 5, model, random_seed=1, genotype_matrix=genotype_matrix
+            )
+            expected = simulate_phenotype.sim_phenotype(
+                ts, 5, model, random_seed=1, genotype_matrix=genotype_matrix
+            )
+            np.testing.assert_array_equal(
+                sim_result.phenotype.individual_id, np.arange(ts.num_individuals)
+            )
+            np.testing.assert_array_equal(
+                sim_result.genotype.allele_frequency,
+                expected.genotype.allele_frequency,
+            )
+            np.testing.assert_array_equal(
+                sim_result.phenotype.phenotype, expected.phenotype.phenotype
+            )
+
+    def test_replicates(self):
+        ts = self.mixed_ploidy_ts()
+        model = trait_model.TraitModelAdditive(0, 1)
+        sim_result = simulate_phenotype.sim_phenotype_replicates(
+            ts, 5, model, num_replicates=2, random_seed=1
+        )
+        genotype, frequency = self.expected_genotype(ts, sim_result)
+        np.testing.assert_allclose(sim_result.genotype.allele_frequency, frequency)
+        np.testing.assert_allclose(
+            sim_result.phenotype.genetic_value,
+            genotype @ sim_result.genotype.effect_size,
+        )
+
+
+class Test_individuals:
+    @pytest.mark.parametrize("random_seed", [1, 2, 3])
+    @pytest.mark.parametrize("genotype_matrix", [True, False])
+    def test_subset(self, random_seed, genotype_matrix):
+        ts = sim_ts(30, random_seed)
+        model = trait_model.TraitModelAdditive(0, 1)
+        individuals = np.array([20, 3, 11, 4, 29, 0])
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts,
+            10,
+            model,
+            random_seed=1,
+            genotype_matrix=True,
+            individuals=individuals,
+        )
+        expected = simulate_phenotype.sim_phenotype(
+            ts, 10, model, random_seed=1, genotype_matrix=True
+        )
+        np.testing.assert_array_equal(sim_result.phenotype.individual_id, individuals)
+        assert sim_result.phenotype.phenotype.shape == (len(individuals),)
+        np.testing.assert_array_equal(
+            sim_result.genotype.site_id, expected.genotype.site_id
+        )
+        np.testing.assert_array_equal(
+            sim_result.genotype.causal_allele, expected.genotype.causal_allele
+        )
+        genotype = expected.genotype_matrix.to_dense()[individuals]
+        np.testing.assert_array_equal(sim_result.genotype_matrix.to_dense(), genotype)
+        np.testing.assert_array_equal(
+            sim_result.genotype.allele_frequency, expected.genotype.allele_frequency
+        )
+        np.testing.assert_array_equal(
+            sim_result.genotype.effect_size, expected.genotype.effect_size
+        )
+        np.testing.assert_allclose(
+            sim_result.phenotype.genetic_value,
+            expected.phenotype.genetic_value[individuals],
+        )
+
+    @pytest.mark.parametrize("random_seed", [1, 2, 3, 4, 5])
+    @pytest.mark.parametrize("genotype_matrix", [True, False])
+    def test_allele_frequency_model(self, random_seed, genotype_matrix):
+        ts = sim_ts(30, random_seed)
+        model = trait_model.TraitModelAlleleFrequency(0, 1, -1)
+        individuals = np.arange(3)
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts,
+            50,
+            model,
+            random_seed=random_seed,
+            genotype_matrix=genotype_matrix,
+            individuals=individuals,
+        )
+        expected = simulate_phenotype.sim_phenotype(
+            ts, 50, model, random_seed=random_seed, genotype_matrix=genotype_matrix
+        )
+        np.testing.assert_array_equal(
+            sim_result.genotype.allele_frequency, expected.genotype.allele_frequency
+        )
+        np.testing.assert_array_equal(
+            sim_result.genotype.effect_size, expected.genotype.effect_size
+        )
+        np.testing.assert_allclose(
+            sim_result.phenotype.genetic_value,
+            expected.phenotype.genetic_value[individuals],
+        )
+
+    @pytest.mark.parametrize("genotype_matrix", [True, False])
+    def test_streaming_matches_matrix(self, genotype_matrix):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        individuals = np.arange(0, 30, 3)
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts,
+            10,
+            model,
+            random_seed=1,
+            genotype_matrix=genotype_matrix,
+            individuals=individuals,
+        )
+        expected = simulate_phenotype.sim_phenotype(
+            ts, 10, model, random_seed=1, genotype_matrix=True, individuals=individuals
+        )
+        np.testing.assert_allclose(
+            sim_result.phenotype.phenotype, expected.phenotype.phenotype
+        )
+
+    def test_session(self):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        session = simulate_phenotype.SimulationSession(ts)
+        individuals = [5, 6, 7]
+        sim_result = session.simulate(5, model, random_seed=1, individuals=individuals)
+        expected = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, individuals=individuals
+        )
+        np.testing.assert_array_equal(
+            sim_result.phenotype.phenotype, expected.phenotype.phenotype
+        )
+        full_result = session.simulate(5, model, random_seed=1)
+        assert len(full_result.phenotype.phenotype) == ts.num_individuals
+
+    def test_num_workers(self):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        individuals = [1, 8, 2]
+        sim_result = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, num_workers=1, individuals=individuals
+        )
+        expected = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, num_workers=1
+        )
+        np.testing.assert_allclose(
+            sim_result.phenotype.genetic_value,
+            expected.phenotype.genetic_value[individuals],
+        )
+
+    @pytest.mark.parametrize("individuals", [[1.5], [[1, 2]], ["a"]])
+    def test_individuals_type(self, individuals):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(TypeError, match="one dimensional array of integers"):
+            simulate_phenotype.sim_phenotype(ts, 5, model, individuals=individuals)
+
+    @pytest.mark.parametrize(
+        "individuals, message",
+        [
+            ([-1], "valid individual IDs"),
+            ([30], "valid individual IDs"),
+            ([1, 1], "duplicates"),
+            (np.array([], dtype=int), "not be empty"),
+        ],
+    )
+    def test_individuals_value(self, individuals, message):
+        ts = sim_ts(30)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(ValueError, match=message):
+            simulate_phenotype.sim_phenotype(ts, 5, model, individuals=individuals)
+
+    def test_non_sample_individual(self):
+        ts = add_non_sample_individuals(sim_ts(30), 1)
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(ValueError, match="at least one sample node"):
+            simulate_phenotype.sim_phenotype(
+                ts, 5, model, individuals=[ts.num_individuals - 1]
+            )
+
+
+class Test_warmup:
+    def test_tree_sequence(self):
+        ts = simulate_phenotype._warmup_tree_sequence()
+        assert ts.num_trees == 2
+        assert ts.num_individuals == 2
+        assert ts.num_mutations == 3
+
+    def test_warmup(self):
+        simulate_phenotype.warmup()
+        kernels = [
+            genotype._mutation_num_samples,
+            genotype._allele_count,
+            genotype._tree_genetic_value_threaded,
+            genotype._tree_genotype_matrix,
+            genotype._tree_genetic_value,
+            genotype._tree_num_traversed,
+            genotype._mark_tracked_nodes,
+            genotype._csc_dot,
+        ]
+        for kernel in kernels:
+            assert len(kernel.signatures) > 0
+
+    def test_cache(self):
+        for module in [genotype, simulate_phenotype]:
+            for obj in vars(module).values():
+                if isinstance(obj, numba.core.registry.CPUDispatcher):
+                    assert isinstance(obj._cache, numba.core.caching.FunctionCache)
+
+
+class Test_profile:
+    def test_disabled(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        result = simulate_phenotype.sim_phenotype(ts, 5, model, random_seed=1)
+        assert result.profile is None
+
+    @pytest.mark.parametrize("genotype_matrix", [False, True])
+    def test_profile(self, genotype_matrix):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        expected = simulate_phenotype.sim_phenotype(
+            ts, 20, model, random_seed=1, genotype_matrix=genotype_matrix
+        )
+        result = simulate_phenotype.sim_phenotype(
+            ts, 20, model, random_seed=1, genotype_matrix=genotype_matrix, profile=True
+        )
+        np.testing.assert_array_equal(
+            result.phenotype.phenotype, expected.phenotype.phenotype
+        )
+        np.testing.assert_array_equal(
+            result.genotype.site_id, expected.genotype.site_id
+        )
+
+        profile = result.profile
+        assert isinstance(profile, tstrait.Profile)
+        phases = [
+            "engine",
+            "causal_site",
+            "causal_allele",
+            "seek",
+            "genotype",
+            "allele_frequency",
+            "effect_size",
+            "environment",
+        ]
+        if genotype_matrix:
+            phases.append("genetic_value")
+        assert set(profile.wall_time) == set(phases)
+        assert set(profile.num_calls) == set(phases)
+        assert set(profile.bytes_allocated) == set(phases)
+        assert all(wall_time >= 0 for wall_time in profile.wall_time.values())
+        assert all(size >= 0 for size in profile.bytes_allocated.values())
+        assert profile.total_time == pytest.approx(sum(profile.wall_time.values()))
+
+        position = ts.sites_position[result.genotype.site_id]
+        num_trees = len(np.unique(ts.breakpoints(as_array=True).searchsorted(position)))
+        assert profile.num_trees == num_trees
+        assert profile.num_calls["seek"] == num_trees
+        assert profile.num_calls["genotype"] == num_trees
+        assert profile.num_calls["environment"] == 1
+        assert profile.num_nodes > 0
+        assert not tracemalloc.is_tracing()
+
+    def test_num_nodes(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        result = simulate_phenotype.sim_phenotype(
+            ts, 20, model, random_seed=1, profile=True
+        )
+        genotype_result = result.genotype
+        num_nodes = 0
+        for site_id, allele in zip(
+            genotype_result.site_id, genotype_result.causal_allele
+        ):
+            # The traversal visits the nodes that inherit the causal allele, and
+            # the virtual root if the causal allele is the ancestral state
+            site = ts.site(site_id)
+            tree = ts.at(site.position)
+            node_state = {m.node: m.derived_state for m in site.mutations}
+            num_nodes += site.ancestral_state == allele
+            for node in tree.nodes():
+                u = node
+                while u != tskit.NULL and u not in node_state:
+                    u = tree.parent(u)
+                state = site.ancestral_state if u == tskit.NULL else node_state[u]
+                num_nodes += state == allele
+        assert result.profile.num_nodes == num_nodes
+
+    def test_tracing(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        tracemalloc.start()
+        try:
+            result = simulate_phenotype.sim_phenotype(
+                ts, 5, model, random_seed=1, profile=True
+            )
+            assert tracemalloc.is_tracing()
+        finally:
+            tracemalloc.stop()
+        assert result.profile.num_trees > 0
+
+    def test_str(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        result = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, profile=True
+        )
+        output = str(result.profile)
+        assert "genotype" in output
+        assert "total" in output
+        assert f"num_trees: {result.profile.num_trees}" in output
+
+    def test_session(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        session = simulate_phenotype.SimulationSession(ts)
+        result = session.simulate(5, model, random_seed=1, profile=True)
+        expected = simulate_phenotype.sim_phenotype(
+            ts, 5, model, random_seed=1, profile=True
+        )
+        assert result.profile.num_nodes == expected.profile.num_nodes
+
+    def test_num_workers(self):
+        ts = sim_ts(50)
+        model = trait_model.TraitModelAdditive(0, 1)
+        result = simulate_phenotype.sim_phenotype(
+            ts, 20, model, random_seed=1, num_workers=1, profile=True
+        )
+        assert "workers" not in result.profile.wall_time
+        assert result.profile.num_trees > 0
+        result = simulate_phenotype.sim_phenotype(
+            ts, 20, model, random_seed=1, num_workers=2, profile=True
+        )
+        assert result.profile.num_calls["workers"] == 1
+        assert "genotype" not in result.profile.wall_time
+        assert result.profile.num_trees == 0
@@ -167,3 +167,147 @@ class Test_TraitModelAlleleFrequency:
         beta2 = model2.sim_effect_size(num_causal, allele_freq, rng)
 
         assert np.isclose(beta1, beta2)
+
+
+class Test_TraitModelMultivariateNormal:
+    @pytest.mark.parametrize("num_causal", [1, 5, np.array([3])[0]])
+    @pytest.mark.parametrize("random_seed", [1, None])
+    def test_pass_condition(self, num_causal, random_seed):
+        model = trait_model.TraitModelMultivariateNormal([0, 1], [[1, 0.5], [0.5, 2]])
+        assert model.name == "multi_normal"
+        assert model.num_trait == 2
+        assert np.array_equal(model.trait_var, [1, 2])
+
+        rng = np.random.default_rng(random_seed)
+        beta = model.sim_effect_size(num_causal, 0.5, rng)
+
+        assert beta.shape == (2,)
+
+    @pytest.mark.parametrize("num_causal", [1, 5])
+    def test_zero_cov(self, num_causal):
+        model = trait_model.TraitModelMultivariateNormal([1, -2, 0], np.zeros((3, 3)))
+        rng = np.random.default_rng(1)
+        beta = model.sim_effect_size(num_causal, 0.5, rng)
+
+        assert np.array_equal(beta, np.array([1, -2, 0]) / num_causal)
+
+    def test_correlation(self):
+        cov = np.array([[1, 0.8], [0.8, 2]])
+        model = trait_model.TraitModelMultivariateNormal([0, 1], cov)
+        rng = np.random.default_rng(1)
+        beta = model._sim_effect_sizes(4, np.full(100_000, 0.5), rng)
+
+        assert beta.shape == (100_000, 2)
+        assert np.allclose(np.mean(beta, axis=0), [0, 0.25], atol=0.01)
+        assert np.allclose(np.cov(beta, rowvar=False), cov / 4, atol=0.01)
+
+    @pytest.mark.parametrize("trait_mean", [[], 1, [[0, 1]]])
+    def test_trait_mean_value(self, trait_mean):
+        with pytest.raises(
+            ValueError, match="Trait mean should be a one dimensional array"
+        ):
+            trait_model.TraitModelMultivariateNormal(trait_mean, [[1]])
+
+    @pytest.mark.parametrize("trait_cov", [1, [1, 1], np.eye(3)])
+    def test_trait_cov_shape(self, trait_cov):
+        with pytest.raises(ValueError, match="Trait covariance should be a square"):
+            trait_model.TraitModelMultivariateNormal([0, 0], trait_cov)
+
+    def test_trait_cov_symmetric(self):
+        with pytest.raises(
+            ValueError, match="Trait covariance should be a symmetric matrix"
+        ):
+            trait_model.TraitModelMultivariateNormal([0, 0], [[1, 0.5], [0.2, 1]])
+
+    @pytest.mark.parametrize(
+        "trait_cov", [[[1, 2], [2, 1]], [[-1, 0], [0, 1]], [[0, 0], [0, -0.1]]]
+    )
+    def test_trait_cov_psd(self, trait_cov):
+        with pytest.raises(
+            ValueError, match="Trait covariance should be positive semi-definite"
+        ):
+            trait_model.TraitModelMultivariateNormal([0, 0], trait_cov)
+
+    def test_trait_cov_singular(self):
+        model = trait_model.TraitModelMultivariateNormal([0, 0], [[1, 1], [1, 1]])
+        beta = model.sim_effect_size(1, 0.3, np.random.default_rng(1))
+        assert np.isclose(beta[0], beta[1])
+
+    @pytest.mark.parametrize("num_causal", [0.1, -1.0])
+    def test_num_causal_value(self, num_causal):
+        model = trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2))
+        rng = np.random.default_rng(1)
+        with pytest.raises(
+            ValueError, match="Number of causal sites should be a positive integer"
+        ):
+            model.sim_effect_size(num_causal, 0.3, rng)
+
+    @pytest.mark.parametrize("rng", [1, "a", None])
+    def test_rng(self, rng):
+        model = trait_model.TraitModelMultivariateNormal([0, 0], np.eye(2))
+
+        with pytest.raises(TypeError, match="rng should be a numpy random generator"):
+            model.sim_effect_size(5, 0.5, rng)
+
+
+class Test_sim_effect_sizes:
+    @pytest.mark.parametrize(
+        "model",
+        [
+            trait_model.TraitModelAdditive(1, 2),
+            trait_model.TraitModelAdditive(1, 0),
+            trait_model.TraitModelAlleleFrequency(0, 1, -1),
+            trait_model.TraitModelAlleleFrequency(1, 0, 0.5),
+        ],
+    )
+    @pytest.mark.parametrize("random_seed", [1, 2])
+    def test_sequential_output(self, model, random_seed):
+        allele_freq = np.random.default_rng(10).uniform(0.01, 0.99, size=20)
+        rng = np.random.default_rng(random_seed)
+        beta = model.sim_effect_sizes(20, allele_freq, rng)
+
+        rng = np.random.default_rng(random_seed)
+        expected = [model.sim_effect_size(20, freq, rng) for freq in allele_freq]
+        assert beta.shape == (20,)
+        # The vectorized power may differ from the scalar one in the last bits
+        np.testing.assert_allclose(beta, expected, rtol=1e-12)
+
+    def test_multivariate(self):
+        model = trait_model.TraitModelMultivariateNormal([0, 1], np.eye(2))
+        rng = np.random.default_rng(1)
+        beta = model.sim_effect_sizes(5, np.full(10, 0.5), rng)
+
+        assert beta.shape == (10, 2)
+
+    @pytest.mark.parametrize("num_causal", [0.1, -1.0, 0])
+    def test_num_causal_value(self, num_causal):
+        model = trait_model.TraitModelAdditive(0, 1)
+        rng = np.random.default_rng(1)
+        with pytest.raises(
+            ValueError, match="Number of causal sites should be a positive integer"
+        ):
+            model.sim_effect_sizes(num_causal, np.array([0.3]), rng)
+
+    @pytest.mark.parametrize("allele_freq", [0.3, [[0.3]], ["a"]])
+    def test_allele_freq_type(self, allele_freq):
+        model = trait_model.TraitModelAdditive(0, 1)
+        rng = np.random.default_rng(1)
+        with pytest.raises(
+            TypeError, match="Allele frequency should be a one dimensional array"
+        ):
+            model.sim_effect_sizes(5, allele_freq, rng)
+
+    @pytest.mark.parametrize("allele_freq", [[0.5, 0], [1, 0.5]])
+    def test_allele_freq_value(self, allele_freq):
+        model = trait_model.TraitModelAlleleFrequency(0, 1, -1)
+        rng = np.random.default_rng(1)
+        with pytest.raises(
+            ValueError, match="Allele frequency should be 0 < Allele frequency < 1"
+        ):
+            model.sim_effect_sizes(5, allele_freq, rng)
+
+    @pytest.mark.parametrize("rng", [1, "a", None])
+    def test_rng(self, rng):
+        model = trait_model.TraitModelAdditive(0, 1)
+        with pytest.raises(TypeError, match="rng should be a numpy random generator"):
+            model.sim_effect_sizes(5, np.array([0.5]), rng)
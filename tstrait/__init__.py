@@ -1,19 +1,50 @@
-from tstrait.simulate_phenotype import GenotypeResult
-from tstrait.simulate_phenotype import PhenotypeResult
-from tstrait.simulate_phenotype import PhenotypeSimulator
-from tstrait.simulate_phenotype import Result
-from tstrait.simulate_phenotype import sim_phenotype
+from tstrait.profiling import Profile
 from tstrait.trait_model import TraitModel
 from tstrait.trait_model import TraitModelAdditive
 from tstrait.trait_model import TraitModelAlleleFrequency
+from tstrait.trait_model import TraitModelMultivariateNormal
 
 __all__ = [
     "sim_phenotype",
+    "sim_phenotype_replicates",
+    "warmup",
     "PhenotypeSimulator",
+    "SimulationSession",
     "Result",
     "GenotypeResult",
+    "GenotypeMatrix",
     "PhenotypeResult",
+    "Profile",
     "TraitModel",
     "TraitModelAdditive",
     "TraitModelAlleleFrequency",
+    "TraitModelMultivariateNormal",
 ]
+
+# The simulation module imports numba and tskit, which take most of the time
+# of importing tstrait, so its names are only loaded when they are first used.
+_SIMULATE_PHENOTYPE_NAMES = {
+    "sim_phenotype",
+    "sim_phenotype_replicates",
+    "warmup",
+    "PhenotypeSimulator",
+    "SimulationSession",
+    "Result",
+    "GenotypeResult",
+    "GenotypeMatrix",
+    "PhenotypeResult",
+}
+
+
+def __getattr__(name):
+    if name in _SIMULATE_PHENOTYPE_NAMES:
+        from tstrait import simulate_phenotype
+
+        value = getattr(simulate_phenotype, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | _SIMULATE_PHENOTYPE_NAMES)
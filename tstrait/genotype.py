@@ -0,0 +1,942 @@
+import copy
+
+import numba
+import numpy as np
+import tskit
+
+
+@numba.njit(cache=True)
+def _mutation_num_samples(
+    site_id,
+    sites_position,
+    site_mutation_offset,
+    mutations_node,
+    edges_left,
+    edges_right,
+    edges_parent,
+    edges_child,
+    edge_insertion_order,
+    edge_removal_order,
+    is_sample,
+    sequence_length,
+):
+    """
+    Numba to compute the number of samples below the node of each mutation of the
+    sorted causal sites in `site_id`. The tree sequence is traversed once from left
+    to right by using edge insertions and removals, and the number of samples below
+    each node is updated along the path to the root. Entries of mutations that are
+    not located at the causal sites are set to -1.
+    """
+    num_edges = len(edges_left)
+    parent = np.full(len(is_sample), -1, dtype=np.int32)
+    num_samples = is_sample.astype(np.int64)
+    mutation_num_samples = np.full(len(mutations_node), -1, dtype=np.int64)
+    j = 0
+    k = 0
+    left = 0.0
+    i = 0
+    while i < len(site_id) and left < sequence_length:
+        while k < num_edges and edges_right[edge_removal_order[k]] == left:
+            e = edge_removal_order[k]
+            child = edges_child[e]
+            u = edges_parent[e]
+            while u != -1:
+                num_samples[u] -= num_samples[child]
+                u = parent[u]
+            parent[child] = -1
+            k += 1
+        while j < num_edges and edges_left[edge_insertion_order[j]] == left:
+            e = edge_insertion_order[j]
+            child = edges_child[e]
+            u = edges_parent[e]
+            parent[child] = u
+            while u != -1:
+                num_samples[u] += num_samples[child]
+                u = parent[u]
+            j += 1
+        right = sequence_length
+        if j < num_edges:
+            right = min(right, edges_left[edge_insertion_order[j]])
+        if k < num_edges:
+            right = min(right, edges_right[edge_removal_order[k]])
+        while i < len(site_id) and sites_position[site_id[i]] < right:
+            site = site_id[i]
+            for m in range(site_mutation_offset[site], site_mutation_offset[site + 1]):
+                mutation_num_samples[m] = num_samples[mutations_node[m]]
+            i += 1
+        left = right
+
+    return mutation_num_samples
+
+
+@numba.njit(cache=True)
+def _allele_count(
+    site_id,
+    site_mutation_offset,
+    mutations_parent,
+    mutation_code,
+    site_code,
+    mutation_num_samples,
+    num_samples,
+):
+    """
+    Numba to compute the number of samples that carry each non-ancestral allele of
+    the causal sites. The alleles of the i-th causal site are the entries
+    `allele_offset[i]` to `allele_offset[i + 1]` of the `allele_mutation` and
+    `allele_count` arrays. They are listed in the order in which they first appear
+    as the derived state of a non-silent mutation, and alleles that are not present
+    in the samples are removed. An allele is identified by the ID of the first
+    mutation that has it as the derived state, or by -1 for the ancestral state,
+    which is only used when no other allele is present in the samples.
+    """
+    num_mutations = 0
+    for site in site_id:
+        num_mutations += site_mutation_offset[site + 1] - site_mutation_offset[site]
+    allele_offset = np.zeros(len(site_id) + 1, dtype=np.int64)
+    allele_mutation = np.zeros(num_mutations + len(site_id), dtype=np.int32)
+    allele_count = np.zeros(num_mutations + len(site_id), dtype=np.int64)
+    # Index of the first mutation of the site with the same derived state, or -1
+    # if the derived state is the ancestral state
+    mutation_state = np.full(len(mutations_parent), -1, dtype=np.int32)
+    count = np.zeros(len(mutations_parent), dtype=np.int64)
+    num_alleles = 0
+    for i in range(len(site_id)):
+        site = site_id[i]
+        start = site_mutation_offset[site]
+        end = site_mutation_offset[site + 1]
+        for m in range(start, end):
+            if mutation_code[m] != site_code[site]:
+                mutation_state[m] = m
+                for other in range(start, m):
+                    if mutation_code[m] == mutation_code[other]:
+                        mutation_state[m] = other
+                        break
+        site_start = num_alleles
+        for m in range(start, end):
+            state = mutation_state[m]
+            current_state = -1
+            if mutations_parent[m] != -1:
+                current_state = mutation_state[mutations_parent[m]]
+            # Silent mutations do nothing
+            if current_state != state:
+                if state != -1:
+                    if count[state] == 0 and not _is_listed(
+                        allele_mutation, site_start, num_alleles, state
+                    ):
+                        allele_mutation[num_alleles] = state
+                        num_alleles += 1
+                    count[state] += mutation_num_samples[m]
+                if current_state != -1:
+                    count[current_state] -= mutation_num_samples[m]
+        num_present = site_start
+        for a in range(site_start, num_alleles):
+            state = allele_mutation[a]
+            if count[state] != 0:
+                allele_mutation[num_present] = state
+                allele_count[num_present] = count[state]
+                num_present += 1
+            count[state] = 0
+        num_alleles = num_present
+        if num_alleles == site_start:
+            allele_mutation[num_alleles] = -1
+            allele_count[num_alleles] = num_samples
+            num_alleles += 1
+        allele_offset[i + 1] = num_alleles
+
+    return (
+        allele_offset,
+        allele_mutation[:num_alleles],
+        allele_count[:num_alleles],
+    )
+
+
+@numba.njit(cache=True)
+def _is_listed(array, start, end, value):
+    """
+    Numba to check whether `value` is in `array[start:end]`.
+    """
+    for k in range(start, end):
+        if array[k] == value:
+            return True
+    return False
+
+
+@numba.njit(cache=True)
+def _site_carrier(
+    site,
+    causal_code,
+    site_code,
+    site_mutation_offset,
+    mutations_node,
+    mutation_code,
+    nodes_individual,
+    node_tracked,
+    left_child_array,
+    right_sib_array,
+    stack,
+    has_mutation,
+    last_mutation,
+    carrier,
+):
+    """
+    Numba to find the individuals that carry the causal allele of a site, whose
+    state code is `causal_code`. The individual ID of each
+    node that carries the causal allele is written into `carrier`, so an individual
+    is listed once for each of its nodes, and the number of entries is returned.
+    Mutations of a site `j` are the rows `site_mutation_offset[j]` to
+    `site_mutation_offset[j + 1]` of the mutation table. The `stack`, `has_mutation`
+    and `last_mutation` scratch arrays must have a length of at least
+    `num_nodes + 1`, and `has_mutation` must be all False. It is reset before
+    returning. Subtrees whose root is not marked in `node_tracked` contain no
+    tracked sample nodes, and they are not traversed.
+    """
+    num_nodes = len(nodes_individual)
+    start = site_mutation_offset[site]
+    end = site_mutation_offset[site + 1]
+    for m in range(start, end):
+        node = mutations_node[m]
+        has_mutation[node] = True
+        last_mutation[node] = m
+
+    # The state of a node is given by the last mutation above it on its branch
+    num_stack = 0
+    if site_code[site] == causal_code:
+        stack[num_stack] = num_nodes
+        num_stack += 1
+    for m in range(start, end):
+        node = mutations_node[m]
+        if (
+            last_mutation[node] == m
+            and mutation_code[m] == causal_code
+            and node_tracked[node]
+        ):
+            stack[num_stack] = node
+            num_stack += 1
+
+    num_carrier = 0
+    while num_stack > 0:
+        num_stack -= 1
+        parent_node_id = stack[num_stack]
+        if parent_node_id != num_nodes:
+            individual_id = nodes_individual[parent_node_id]
+            if individual_id > -1:
+                carrier[num_carrier] = individual_id
+                num_carrier += 1
+        child_node_id = left_child_array[parent_node_id]
+        while child_node_id != -1:
+            if not has_mutation[child_node_id] and node_tracked[child_node_id]:
+                stack[num_stack] = child_node_id
+                num_stack += 1
+            child_node_id = right_sib_array[child_node_id]
+
+    for m in range(start, end):
+        has_mutation[mutations_node[m]] = False
+
+    return num_carrier
+
+
+@numba.njit(cache=True)
+def _tree_genotype_matrix(
+    site_id,
+    causal_code,
+    site_code,
+    site_mutation_offset,
+    mutations_node,
+    mutation_code,
+    nodes_individual,
+    node_tracked,
+    left_child_array,
+    right_sib_array,
+    stack,
+    has_mutation,
+    last_mutation,
+    carrier,
+    individual_count,
+):
+    """
+    Numba to compute the genotype of individuals at all causal sites of a tree as
+    the columns of a sparse matrix in compressed sparse column format, where only
+    the individuals that carry the causal allele are stored. Row indices are sorted
+    within each column. The `individual_count` scratch array must be all zero and
+    have a length of `num_individuals`. It is reset before returning.
+    """
+    indptr = np.zeros(len(site_id) + 1, dtype=np.int64)
+    indices = np.zeros(len(carrier), dtype=np.int32)
+    data = np.zeros(len(carrier), dtype=np.int32)
+    nnz = 0
+    for i in range(len(site_id)):
+        num_carrier = _site_carrier(
+            site_id[i],
+            causal_code[i],
+            site_code,
+            site_mutation_offset,
+            mutations_node,
+            mutation_code,
+            nodes_individual,
+            node_tracked,
+            left_child_array,
+            right_sib_array,
+            stack,
+            has_mutation,
+            last_mutation,
+            carrier,
+        )
+        if nnz + num_carrier > len(indices):
+            size = max(2 * len(indices), nnz + num_carrier)
+            indices = _resize(indices, size)
+            data = _resize(data, size)
+        column_start = nnz
+        for k in range(num_carrier):
+            individual_id = carrier[k]
+            if individual_count[individual_id] == 0:
+                indices[nnz] = individual_id
+                nnz += 1
+            individual_count[individual_id] += 1
+        indices[column_start:nnz].sort()
+        for k in range(column_start, nnz):
+            data[k] = individual_count[indices[k]]
+            individual_count[indices[k]] = 0
+        indptr[i + 1] = nnz
+
+    return indptr, indices[:nnz], data[:nnz]
+
+
+@numba.njit(cache=True)
+def _add_carrier_effect(carrier, num_carrier, beta, individual_count, genetic_value):
+    """
+    Numba to add the effect sizes `beta` of a causal site into the `genetic_value`
+    rows of the individuals in the first `num_carrier` entries of `carrier`, once
+    for each causal allele that they carry. The number of causal alleles of each
+    carrier is counted in the `individual_count` scratch array, which must be all
+    zero and have a length of `num_individuals`. It is reset before returning.
+    """
+    for k in range(num_carrier):
+        individual_count[carrier[k]] += 1
+    for k in range(num_carrier):
+        individual_id = carrier[k]
+        count = individual_count[individual_id]
+        if count > 0:
+            for r in range(len(beta)):
+                genetic_value[individual_id, r] += count * beta[r]
+            individual_count[individual_id] = 0
+
+
+@numba.njit(cache=True)
+def _tree_genetic_value(
+    site_id,
+    causal_code,
+    site_code,
+    site_mutation_offset,
+    mutations_node,
+    mutation_code,
+    nodes_individual,
+    node_tracked,
+    left_child_array,
+    right_sib_array,
+    stack,
+    has_mutation,
+    last_mutation,
+    carrier,
+    individual_count,
+    beta,
+    genetic_value,
+):
+    """
+    Numba to add the genetic values of all causal sites of a tree into the
+    `genetic_value` array in place, where the i-th row of `beta` holds the effect
+    sizes of the i-th causal site. The carriers of each causal site are written
+    into the reusable `carrier` buffer, and added by `_add_carrier_effect`. The
+    causal sites are added in order, so the output is identical to adding the
+    product of the genotype matrix of the causal sites and `beta`.
+    """
+    for i in range(len(site_id)):
+        num_carrier = _site_carrier(
+            site_id[i],
+            causal_code[i],
+            site_code,
+            site_mutation_offset,
+            mutations_node,
+            mutation_code,
+            nodes_individual,
+            node_tracked,
+            left_child_array,
+            right_sib_array,
+            stack,
+            has_mutation,
+            last_mutation,
+            carrier,
+        )
+        _add_carrier_effect(
+            carrier, num_carrier, beta[i], individual_count, genetic_value
+        )
+
+
+@numba.njit(parallel=True, cache=True)
+def _tree_genetic_value_threaded(
+    site_id,
+    causal_code,
+    site_code,
+    site_mutation_offset,
+    mutations_node,
+    mutation_code,
+    nodes_individual,
+    node_tracked,
+    left_child_array,
+    right_sib_array,
+    stack,
+    has_mutation,
+    last_mutation,
+    carrier,
+    num_carrier,
+    individual_count,
+    beta,
+    genetic_value,
+):
+    """
+    Multithreaded version of `_tree_genetic_value`. The causal sites are processed
+    in rounds of one causal site per row of the two dimensional scratch arrays. The
+    carriers of the causal sites of a round are found concurrently, each with its
+    own row of scratch arrays, and they are then added into `genetic_value` in the
+    order of the causal sites. The floating point additions are the same as those
+    of `_tree_genetic_value`, so the output does not depend on the number of
+    threads.
+    """
+    num_sites = len(site_id)
+    num_rows = stack.shape[0]
+    for start in range(0, num_sites, num_rows):
+        end = min(start + num_rows, num_sites)
+        for t in numba.prange(end - start):
+            num_carrier[t] = _site_carrier(
+                site_id[start + t],
+                causal_code[start + t],
+                site_code,
+                site_mutation_offset,
+                mutations_node,
+                mutation_code,
+                nodes_individual,
+                node_tracked,
+                left_child_array,
+                right_sib_array,
+                stack[t],
+                has_mutation[t],
+                last_mutation[t],
+                carrier[t],
+            )
+        for t in range(end - start):
+            _add_carrier_effect(
+                carrier[t],
+                num_carrier[t],
+                beta[start + t],
+                individual_count,
+                genetic_value,
+            )
+
+
+@numba.njit(cache=True)
+def _tree_num_traversed(
+    site_id,
+    causal_code,
+    site_code,
+    site_mutation_offset,
+    mutations_node,
+    mutation_code,
+    nodes_individual,
+    node_tracked,
+    left_child_array,
+    right_sib_array,
+    stack,
+    has_mutation,
+    last_mutation,
+):
+    """
+    Numba to count the nodes that are traversed by `_site_carrier` to find the
+    carriers of the causal alleles of all causal sites of a tree. It follows the
+    same traversal without recording the carriers, and is only used for profiling.
+    """
+    num_nodes = len(nodes_individual)
+    num_traversed = 0
+    for i in range(len(site_id)):
+        site = site_id[i]
+        start = site_mutation_offset[site]
+        end = site_mutation_offset[site + 1]
+        for m in range(start, end):
+            node = mutations_node[m]
+            has_mutation[node] = True
+            last_mutation[node] = m
+        num_stack = 0
+        if site_code[site] == causal_code[i]:
+            stack[num_stack] = num_nodes
+            num_stack += 1
+        for m in range(start, end):
+            node = mutations_node[m]
+            if (
+                last_mutation[node] == m
+                and mutation_code[m] == causal_code[i]
+                and node_tracked[node]
+            ):
+                stack[num_stack] = node
+                num_stack += 1
+        while num_stack > 0:
+            num_stack -= 1
+            num_traversed += 1
+            child_node_id = left_child_array[stack[num_stack]]
+            while child_node_id != -1:
+                if not has_mutation[child_node_id] and node_tracked[child_node_id]:
+                    stack[num_stack] = child_node_id
+                    num_stack += 1
+                child_node_id = right_sib_array[child_node_id]
+        for m in range(start, end):
+            has_mutation[mutations_node[m]] = False
+
+    return num_traversed
+
+
+@numba.njit(cache=True)
+def _mark_tracked_nodes(parent_array, tracked_sample, node_tracked, marked, num_marked):
+    """
+    Numba to mark the nodes of a tree whose subtree contains at least one of the
+    tracked sample nodes in `node_tracked`, by walking up the tree from each tracked
+    sample node until a marked node is reached. The nodes that were marked for the
+    previous tree are the first `num_marked` entries of `marked`, and they are
+    unmarked first. Returns the number of marked nodes.
+    """
+    for j in range(num_marked):
+        node_tracked[marked[j]] = False
+    num_marked = 0
+    for sample in tracked_sample:
+        node = sample
+        while node != -1 and not node_tracked[node]:
+            node_tracked[node] = True
+            marked[num_marked] = node
+            num_marked += 1
+            node = parent_array[node]
+
+    return num_marked
+
+
+@numba.njit(cache=True)
+def _resize(array, size):
+    """
+    Numba to copy an array into a larger array.
+    """
+    output = np.zeros(size, dtype=array.dtype)
+    output[: len(array)] = array
+    return output
+
+
+@numba.njit(cache=True)
+def _csc_dot(indptr, indices, data, x, num_rows):
+    """
+    Numba to multiply a sparse matrix in compressed sparse column format with a
+    two dimensional array.
+    """
+    output = np.zeros((num_rows, x.shape[1]))
+    _csc_accumulate(indptr, indices, data, x, output)
+    return output
+
+
+@numba.njit(cache=True)
+def _csc_accumulate(indptr, indices, data, x, output):
+    """
+    Numba to add the product of a sparse matrix in compressed sparse column format
+    and a two dimensional array into `output` in place. The columns are added in
+    order.
+    """
+    for j in range(len(indptr) - 1):
+        for k in range(indptr[j], indptr[j + 1]):
+            for r in range(x.shape[1]):
+                output[indices[k], r] += data[k] * x[j, r]
+
+
+def _encode_states(ancestral_state, ancestral_state_offset, state, state_offset):
+    """
+    Encodes the ancestral states of the sites and the derived states of the
+    mutations, which are given as ragged columns, as integers such that equal states
+    have the same code. The strings are grouped by length, and the strings of each
+    length are encoded by finding the unique rows of a two dimensional byte array,
+    so no Python string is created for each site or mutation. Returns the codes of
+    the sites, the codes of the mutations and a numpy array with the decoded state
+    of each code.
+    """
+    state = np.concatenate([ancestral_state, state]).view(np.uint8)
+    ancestral_state_offset = ancestral_state_offset.astype(np.int64)
+    state_offset = np.concatenate(
+        [
+            ancestral_state_offset,
+            state_offset[1:].astype(np.int64) + ancestral_state_offset[-1],
+        ]
+    )
+    length = np.diff(state_offset)
+    code = np.zeros(len(length), dtype=np.int32)
+    state_lookup = []
+    for state_length in np.unique(length):
+        index = np.flatnonzero(length == state_length)
+        if state_length == 0:
+            code[index] = len(state_lookup)
+            state_lookup.append("")
+            continue
+        byte = np.ascontiguousarray(
+            state[state_offset[index][:, np.newaxis] + np.arange(state_length)]
+        )
+        unique, inverse = np.unique(
+            byte.view(np.dtype((np.void, state_length))).ravel(),
+            return_inverse=True,
+        )
+        code[index] = inverse.ravel() + len(state_lookup)
+        state_lookup.extend(value.tobytes().decode() for value in unique)
+
+    num_sites = len(ancestral_state_offset) - 1
+    return code[:num_sites], code[num_sites:], np.array(state_lookup, dtype=object)
+
+
+class GenotypeEngine:
+    """Engine that computes the genotype of individuals at causal sites, tree by
+    tree, with compiled kernels. Arrays derived from the tree sequence tables, the
+    tree that is used to traverse the tree sequence and the scratch buffers of the
+    tree traversal are created once and reused across all causal sites, and across
+    all simulations that share the engine.
+
+    :param ts: Tree sequence data with mutation
+    :type ts: tskit.TreeSequence
+    :param individuals: IDs of the individuals that are genotyped, which must have
+        sample nodes. If None, all individuals with sample nodes are genotyped.
+    :type individuals: None or numpy.ndarray(int)
+    """
+
+    def __init__(self, ts, individuals=None):
+        tables = ts.tables
+        self.ts = ts
+        self.nodes_individual = ts.nodes_individual
+        self.sample_individual = self.nodes_individual[ts.samples()]
+        self.individual_ploidy = np.bincount(
+            self.sample_individual[self.sample_individual != tskit.NULL],
+            minlength=ts.num_individuals,
+        )
+        samples = ts.samples()
+        # Allele frequencies are computed among the sample nodes of all individuals,
+        # whichever individuals are genotyped
+        self.num_counted = int(np.sum(self.individual_ploidy))
+        self.node_counted = None
+        if self.num_counted != len(samples):
+            self.node_counted = np.zeros(ts.num_nodes, dtype=bool)
+            self.node_counted[samples] = self.sample_individual != tskit.NULL
+        self._set_individuals(individuals)
+        self.sites_position = ts.sites_position
+        self.breakpoints = ts.breakpoints(as_array=True)
+        self.mutations_node = tables.mutations.node
+        self.mutations_parent = tables.mutations.parent
+        self.site_code, self.mutation_code, self.state_lookup = _encode_states(
+            tables.sites.ancestral_state,
+            tables.sites.ancestral_state_offset,
+            tables.mutations.derived_state,
+            tables.mutations.derived_state_offset,
+        )
+        self.site_mutation_offset = np.searchsorted(
+            tables.mutations.site, np.arange(ts.num_sites + 1)
+        )
+        self.stack = np.zeros(ts.num_nodes + 1, dtype=np.int32)
+        self.has_mutation = np.zeros(ts.num_nodes + 1, dtype=bool)
+        self.last_mutation = np.zeros(ts.num_nodes + 1, dtype=np.int32)
+        self.carrier = np.zeros(ts.num_nodes, dtype=np.int32)
+        self.num_threads = 0
+        self.tree = tskit.Tree(ts)
+        self._site_frequency = None
+        # Engine of all individuals that a subset engine was created from
+        self._parent = None
+
+    def __getstate__(self):
+        # Trees cannot be pickled, so the tree is recreated when the engine is
+        # sent to a worker process
+        state = self.__dict__.copy()
+        del state["tree"]
+        state["_parent"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tree = tskit.Tree(self.ts)
+
+    def _set_individuals(self, individuals):
+        """
+        Sets the individuals that are genotyped. The index of the individual of each
+        of their sample nodes among the genotyped individuals is stored, and other
+        nodes are mapped to -1 so that they are skipped by the kernels. If a subset
+        of individuals is given, their sample nodes are tracked, and the subtrees
+        without tracked sample nodes are not traversed.
+        """
+        num_nodes = self.ts.num_nodes
+        samples = self.ts.samples()
+        if individuals is None:
+            self.individual_id = np.flatnonzero(self.individual_ploidy > 0)
+        else:
+            self.individual_id = np.asarray(individuals, dtype=np.int64)
+        self.ploidy = self.individual_ploidy[self.individual_id]
+        self.num_individuals = len(self.individual_id)
+        self.total_ploidy = int(np.sum(self.ploidy))
+        individual_index = np.full(self.ts.num_individuals + 1, tskit.NULL)
+        individual_index[self.individual_id] = np.arange(self.num_individuals)
+        # The last entry maps the NULL individual to -1
+        sample_index = individual_index[self.sample_individual]
+        self.nodes_genotype_index = np.full(num_nodes, tskit.NULL, dtype=np.int32)
+        self.nodes_genotype_index[samples] = sample_index
+        self.individual_count = np.zeros(self.num_individuals, dtype=np.int32)
+        # The last entry is the virtual root, which is always traversed
+        self.node_tracked = np.ones(num_nodes + 1, dtype=bool)
+        self.tracked_sample = None
+        if individuals is not None:
+            self.tracked_sample = samples[sample_index != tskit.NULL]
+            self.node_tracked[:num_nodes] = False
+            self.tracked_marked = np.zeros(num_nodes, dtype=np.int32)
+            self.num_tracked_marked = 0
+            self.tracked_tree_index = tskit.NULL
+
+    def subset(self, individuals):
+        """
+        Returns a copy of the engine that only genotypes the individuals in
+        `individuals`, in the given order. The arrays derived from the tree sequence
+        tables are shared with this engine, and the minor allele frequencies of the
+        sites are cached on the engine of all individuals, so that they are computed
+        once for all subsets.
+        """
+        engine = copy.copy(self)
+        engine._set_individuals(individuals)
+        engine._parent = self if self._parent is None else self._parent
+        return engine
+
+    def _node_tracked(self, tree):
+        """
+        Returns the boolean array that marks the nodes of `tree` whose subtree
+        contains tracked sample nodes. The marks are updated when the tree changes.
+        """
+        if self.tracked_sample is not None and tree.index != self.tracked_tree_index:
+            self.num_tracked_marked = _mark_tracked_nodes(
+                tree.parent_array,
+                self.tracked_sample,
+                self.node_tracked,
+                self.tracked_marked,
+                self.num_tracked_marked,
+            )
+            self.tracked_tree_index = tree.index
+        return self.node_tracked
+
+    def allele_count(self, site_id, individual_samples=False):
+        """
+        Returns the number of samples that carry each non-ancestral allele of the
+        sorted causal sites in `site_id`, by traversing the tree sequence once. If
+        `individual_samples` is True, only the sample nodes of individuals are
+        counted. The
+        output is a tuple of three numpy arrays `(allele_offset, allele_mutation,
+        allele_count)`, and the alleles of the i-th causal site are the entries
+        `allele_offset[i]` to `allele_offset[i + 1]` of the other two arrays. Each
+        allele is identified by the ID of the first mutation of the site that has it
+        as the derived state, or by -1 for the ancestral state, which is only
+        returned when no other allele is present in the samples.
+        """
+        is_sample = (self.ts.nodes_flags & tskit.NODE_IS_SAMPLE) != 0
+        num_samples = self.ts.num_samples
+        if individual_samples and self.node_counted is not None:
+            is_sample = self.node_counted
+            num_samples = self.num_counted
+        mutation_num_samples = _mutation_num_samples(
+            site_id=site_id,
+            sites_position=self.sites_position,
+            site_mutation_offset=self.site_mutation_offset,
+            mutations_node=self.mutations_node,
+            edges_left=self.ts.edges_left,
+            edges_right=self.ts.edges_right,
+            edges_parent=self.ts.edges_parent,
+            edges_child=self.ts.edges_child,
+            edge_insertion_order=self.ts.indexes_edge_insertion_order,
+            edge_removal_order=self.ts.indexes_edge_removal_order,
+            is_sample=is_sample,
+            sequence_length=self.ts.sequence_length,
+        )
+        allele_offset, allele_mutation, allele_count = _allele_count(
+            site_id=site_id,
+            site_mutation_offset=self.site_mutation_offset,
+            mutations_parent=self.mutations_parent,
+            mutation_code=self.mutation_code,
+            site_code=self.site_code,
+            mutation_num_samples=mutation_num_samples,
+            num_samples=num_samples,
+        )
+
+        return allele_offset, allele_mutation, allele_count
+
+    def causal_allele_frequency(self, site_id, causal_code, allele_count=None):
+        """
+        Returns the frequency of the causal allele of each causal site in `site_id`
+        among the sample nodes of all individuals, so that it does not depend on the
+        individuals that are genotyped by the engine. The state code of the causal
+        allele of each causal site is given by `causal_code`. The output of
+        :meth:`allele_count` for the same causal sites can be given as
+        `allele_count`, and it is reused if all sample nodes belong to individuals.
+        """
+        if allele_count is None or self.node_counted is not None:
+            allele_count = self.allele_count(site_id, individual_samples=True)
+        allele_offset, allele_mutation, count = allele_count
+        num_alleles = np.diff(allele_offset)
+        code = self.site_code[np.repeat(site_id, num_alleles)]
+        derived = allele_mutation != tskit.NULL
+        code[derived] = self.mutation_code[allele_mutation[derived]]
+        is_causal = code == np.repeat(causal_code, num_alleles)
+        num_allele = np.bincount(
+            np.repeat(np.arange(len(site_id)), num_alleles),
+            weights=np.where(is_causal, count, 0),
+            minlength=len(site_id),
+        )
+
+        return num_allele / self.num_counted
+
+    def site_frequency(self):
+        """
+        Returns the minor allele frequency of all sites among the sample nodes of
+        all individuals, as for :meth:`causal_allele_frequency`. The number of
+        samples that carry each allele is computed for all sites in a single pass
+        over the edges of the tree sequence, and all non-ancestral alleles of a site
+        are treated as one allele. The output is computed on the first call and
+        cached.
+        """
+        if self._parent is not None:
+            return self._parent.site_frequency()
+        if self._site_frequency is None:
+            num_sites = self.ts.num_sites
+            allele_offset, allele_mutation, allele_count = self.allele_count(
+                np.arange(num_sites, dtype=np.int32), individual_samples=True
+            )
+            site = np.repeat(np.arange(num_sites), np.diff(allele_offset))
+            num_derived = np.bincount(
+                site,
+                weights=np.where(allele_mutation != tskit.NULL, allele_count, 0),
+                minlength=num_sites,
+            )
+            frequency = num_derived / self.num_counted
+            self._site_frequency = np.minimum(frequency, 1 - frequency)
+
+        return self._site_frequency
+
+    def allele_code(self, site, allele):
+        """
+        Returns the state code of an allele of a site, which is identified by the ID
+        of a mutation or by -1 for the ancestral state.
+        """
+        if allele == tskit.NULL:
+            return self.site_code[site]
+        return self.mutation_code[allele]
+
+    def allele_state(self, site, allele):
+        """
+        Returns the state of an allele of a site, which is identified by the ID of a
+        mutation or by -1 for the ancestral state.
+        """
+        return self.state_lookup[self.allele_code(site, allele)]
+
+    def state_code(self, state):
+        """
+        Returns a numpy array with the state code of each string in `state`. A
+        string that is not the state of any site or mutation gets the code -1.
+        """
+        code = {value: j for j, value in enumerate(self.state_lookup)}
+        return np.array([code.get(value, -1) for value in state], dtype=np.int32)
+
+    def _tree_kernel_args(self, tree, site_id, causal_code):
+        return dict(
+            site_id=site_id,
+            causal_code=causal_code,
+            site_code=self.site_code,
+            site_mutation_offset=self.site_mutation_offset,
+            mutations_node=self.mutations_node,
+            mutation_code=self.mutation_code,
+            nodes_individual=self.nodes_genotype_index,
+            node_tracked=self._node_tracked(tree),
+            left_child_array=tree.left_child_array,
+            right_sib_array=tree.right_sib_array,
+            stack=self.stack,
+            has_mutation=self.has_mutation,
+            last_mutation=self.last_mutation,
+            carrier=self.carrier,
+        )
+
+    def _thread_buffers(self):
+        """
+        Creates one row of scratch buffers per numba thread for the multithreaded
+        kernel. The buffers are created on first use and recreated when the number
+        of numba threads changes.
+        """
+        num_threads = numba.get_num_threads()
+        if num_threads != self.num_threads:
+            size = self.ts.num_nodes + 1
+            self.thread_stack = np.zeros((num_threads, size), dtype=np.int32)
+            self.thread_has_mutation = np.zeros((num_threads, size), dtype=bool)
+            self.thread_last_mutation = np.zeros((num_threads, size), dtype=np.int32)
+            self.thread_carrier = np.zeros((num_threads, size - 1), dtype=np.int32)
+            self.thread_num_carrier = np.zeros(num_threads, dtype=np.int64)
+            self.num_threads = num_threads
+        return dict(
+            stack=self.thread_stack,
+            has_mutation=self.thread_has_mutation,
+            last_mutation=self.thread_last_mutation,
+            carrier=self.thread_carrier,
+            num_carrier=self.thread_num_carrier,
+        )
+
+    def tree_genetic_value_threaded(
+        self, tree, site_id, causal_code, beta, genetic_value
+    ):
+        """
+        Multithreaded version of :meth:`tree_genetic_value`. The carriers of the
+        causal sites are found concurrently by using the numba threads, one causal
+        site per thread, and they are added into `genetic_value` in the order of the
+        causal sites, so the output is identical to that of
+        :meth:`tree_genetic_value` for any number of threads.
+        """
+        kernel_args = self._tree_kernel_args(tree, site_id, causal_code)
+        kernel_args.update(self._thread_buffers())
+        _tree_genetic_value_threaded(
+            **kernel_args,
+            individual_count=self.individual_count,
+            beta=beta,
+            genetic_value=genetic_value,
+        )
+
+    def tree_genotype_matrix(self, tree, site_id, causal_code):
+        """
+        Returns the genotype of individuals at the causal sites in `site_id` as a
+        sparse matrix in compressed sparse column format, with one column per causal
+        site. The output is a tuple of three numpy arrays `(indptr, indices, data)`,
+        and only the individuals that carry the causal allele are stored. All causal
+        sites must be located in `tree`.
+        """
+        indptr, indices, data = _tree_genotype_matrix(
+            **self._tree_kernel_args(tree, site_id, causal_code),
+            individual_count=self.individual_count,
+        )
+
+        return indptr, indices, data
+
+    def tree_genetic_value(self, tree, site_id, causal_code, beta, genetic_value):
+        """
+        Adds the genetic values of the causal sites in `site_id` into the
+        `genetic_value` array in place, which has one row per individual and one
+        column per trait. The effect sizes of the causal sites are the rows of
+        `beta`. Only a buffer of the carriers of one causal site and a scratch array
+        with one entry per individual are used, so no genotype is stored. All causal
+        sites must be located in `tree`.
+        """
+        _tree_genetic_value(
+            **self._tree_kernel_args(tree, site_id, causal_code),
+            individual_count=self.individual_count,
+            beta=beta,
+            genetic_value=genetic_value,
+        )
+
+    def tree_num_traversed(self, tree, site_id, causal_code):
+        """
+        Returns the number of nodes that are traversed to compute the genotype of
+        individuals at the causal sites in `site_id`. All causal sites must be
+        located in `tree`.
+        """
+        kernel_args = self._tree_kernel_args(tree, site_id, causal_code)
+        del kernel_args["carrier"]
+
+        return _tree_num_traversed(**kernel_args)
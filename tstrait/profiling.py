@@ -0,0 +1,116 @@
+import contextlib
+import time
+import tracemalloc
+from dataclasses import dataclass
+from dataclasses import field
+
+
+@dataclass
+class Profile:
+    """Data class that contains the time spent in each phase of a simulation. It is
+    only computed when `profile=True` is passed to :func:`sim_phenotype`. See the
+    :ref:`sec_simulation_profile` section for the list of phases.
+
+    :param wall_time: Wall time of each phase in seconds.
+    :type wall_time: dict
+    :param num_calls: Number of times that each phase was entered.
+    :type num_calls: dict
+    :param bytes_allocated: Number of bytes allocated by each phase, which is the
+        increase of the peak memory traced by :mod:`tracemalloc` in each call of the
+        phase, summed over the calls.
+    :type bytes_allocated: dict
+    :param num_trees: Number of trees that were visited to compute genotypes.
+    :type num_trees: int
+    :param num_nodes: Number of nodes that were traversed to compute genotypes.
+    :type num_nodes: int
+    """
+
+    wall_time: dict = field(default_factory=dict)
+    num_calls: dict = field(default_factory=dict)
+    bytes_allocated: dict = field(default_factory=dict)
+    num_trees: int = 0
+    num_nodes: int = 0
+
+    @property
+    def total_time(self):
+        """
+        Total wall time of all phases in seconds.
+        """
+        return sum(self.wall_time.values())
+
+    def __str__(self):
+        lines = [f"{'phase':<18}{'wall_time':>12}{'num_calls':>12}{'bytes':>14}"]
+        for name, wall_time in self.wall_time.items():
+            lines.append(
+                f"{name:<18}{wall_time:>12.6f}{self.num_calls[name]:>12}"
+                f"{self.bytes_allocated[name]:>14}"
+            )
+        lines.append(f"{'total':<18}{self.total_time:>12.6f}")
+        lines.append(f"num_trees: {self.num_trees}")
+        lines.append(f"num_nodes: {self.num_nodes}")
+        return "\n".join(lines)
+
+
+class _Profiler:
+    """
+    Records the phases of a simulation into a :class:`Profile` object. Memory
+    allocations are traced with :mod:`tracemalloc` while the profiler is running,
+    and phases must not be nested, as each phase resets the traced peak memory.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.profile = Profile()
+        self._stop_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._stop_tracing = True
+
+    def stop(self):
+        if self._stop_tracing:
+            tracemalloc.stop()
+            self._stop_tracing = False
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        memory_start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        time_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - time_start
+            _, memory_peak = tracemalloc.get_traced_memory()
+            profile = self.profile
+            profile.wall_time[name] = profile.wall_time.get(name, 0) + wall_time
+            profile.num_calls[name] = profile.num_calls.get(name, 0) + 1
+            profile.bytes_allocated[name] = profile.bytes_allocated.get(name, 0) + (
+                memory_peak - memory_start
+            )
+
+
+class _NullProfiler:
+    """
+    Profiler that records nothing, which is used when profiling is disabled.
+    """
+
+    enabled = False
+    profile = None
+
+    def __init__(self):
+        self._context = contextlib.nullcontext()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def phase(self, name):
+        return self._context
+
+
+_NULL_PROFILER = _NullProfiler()
@@ -1,10 +1,15 @@
-import collections
+import concurrent.futures
+import json
+import multiprocessing
 import numbers
+import os
 from dataclasses import dataclass
 
 import numba
 import numpy as np
 import tskit
+import tstrait.genotype as genotype
+import tstrait.profiling as profiling
 import tstrait.trait_model as trait_model
 
 
@@ -42,6 +47,86 @@ class PhenotypeResult:
         )
         return output
 
+    def sim_h2_sweep(self, h2, trait_var, random_seed=None):
+        """Simulates the phenotypes of individuals for multiple narrow-sense
+        heritabilities, by reusing the genetic values of the result.
+
+        The environmental noise of all heritabilities is simulated with a single call
+        to the random generator, so a heritability sweep does not repeat the
+        simulation of the genetic values. The environmental noise is simulated in the
+        same way as in :func:`sim_phenotype`.
+
+        :param h2: Narrow-sense heritabilities. Each value must be between 0 and 1.
+        :type h2: list or numpy.ndarray(float)
+        :param trait_var: Trait variance of the trait model that the result was
+            simulated from, such as ``model.trait_var``, which is used as the
+            variance of the environmental noise when the narrow-sense heritability is
+            0. If the genetic values have one column per trait, an array with one
+            trait variance per trait can be given.
+        :type trait_var: float or numpy.ndarray(float)
+        :param random_seed: The random seed. If this is not specified or None,
+            simulation will be done randomly.
+        :type random_seed: None or int
+        :return: Returns a :class:`PhenotypeResult` object whose `phenotype` and
+            `environment_noise` arrays have an additional first axis with one entry
+            per heritability, such that the phenotypes of a single trait have shape
+            (len(h2), num_individuals). The `individual_id` and `genetic_value`
+            arrays are the arrays of this result.
+        :rtype: PhenotypeResult
+        """
+        h2 = np.asarray(h2)
+        if h2.dtype.kind not in "iuf":
+            raise TypeError("Heritability should be a number")
+        if h2.ndim != 1:
+            raise ValueError("Heritability should be a one dimensional array")
+        if np.any(h2 > 1) or np.any(h2 < 0):
+            raise ValueError("Heritability should be 0 <= h2 <= 1")
+        phenotype, environment_noise = _sim_environment_sweep(
+            self.genetic_value,
+            h2.astype(np.float64),
+            np.sqrt(trait_var),
+            np.random.default_rng(random_seed),
+        )
+        return PhenotypeResult(
+            individual_id=self.individual_id,
+            phenotype=phenotype,
+            environment_noise=environment_noise,
+            genetic_value=self.genetic_value,
+        )
+
+
+def _sim_environment_sweep(genetic_value, h2, trait_sd, rng):
+    """
+    Simulates the environmental noise and the phenotypes of individuals for each
+    narrow-sense heritability in `h2` with a single call to the random generator.
+    The outputs have a first axis with one entry per heritability, followed by the
+    axes of the genetic values.
+    """
+    genetic_value = np.asarray(genetic_value, dtype=np.float64)
+    h2 = h2.reshape((len(h2),) + (1,) * genetic_value.ndim)
+    return _sim_environment(genetic_value, h2, trait_sd, rng)
+
+
+def _sim_environment(genetic_value, h2, trait_sd, rng):
+    """
+    Simulates the environmental noise and the phenotypes of individuals with a
+    single call to the random generator. The narrow-sense heritability `h2` is
+    broadcast against the variance of the genetic values among individuals, and the
+    outputs have the broadcast shape of `h2` and the genetic values. The trait
+    standard deviation `trait_sd` is used as the scale of the noise where `h2` is 0.
+    """
+    genetic_var = np.var(genetic_value, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        env_std = np.sqrt((1 - h2) / h2 * genetic_var)
+    env_std = np.where(h2 == 0, trait_sd, env_std)
+    env_std = np.broadcast_to(
+        env_std, np.broadcast_shapes(env_std.shape, genetic_value.shape)
+    )
+    E = rng.normal(loc=0.0, scale=env_std)
+    phenotype = np.where(h2 == 0, E, genetic_value + E)
+
+    return phenotype, E
+
 
 @dataclass
 class GenotypeResult:
@@ -49,14 +134,18 @@ class GenotypeResult:
 
     For each randomly chosen causal site, this data class object returns site ID,
     causal allele, frequency of the causal allele, and simulated effect size. The arrays
-    inside the data class are aligned based on site IDs. See the
+    inside the data class are aligned based on site IDs. The causal alleles are stored
+    as integer state codes, which are decoded into strings by the `allele_state`
+    lookup table when the `causal_allele` attribute is accessed. See the
     :ref:`sec_simulation_output_genotype` section for more details on the output of this
     object.
 
     :param site_id: Causal site IDs
     :type site_id: numpy.ndarray(int)
-    :param causal_allele: Causal allele
-    :type causal_allele: numpy.ndarray(object)
+    :param causal_allele_code: State code of causal allele
+    :type causal_allele_code: numpy.ndarray(int)
+    :param allele_state: Lookup table of the state of each state code
+    :type allele_state: numpy.ndarray(object)
     :param effect_size: Effect size
     :type effect_size: numpy.ndarray(float)
     :param allele_frequency: Frequency of causal allele
@@ -64,10 +153,18 @@ class GenotypeResult:
     """
 
     site_id: np.ndarray
-    causal_allele: np.ndarray
+    causal_allele_code: np.ndarray
+    allele_state: np.ndarray
     effect_size: np.ndarray
     allele_frequency: np.ndarray
 
+    @property
+    def causal_allele(self):
+        """
+        Causal allele of each causal site, which is decoded from the state codes.
+        """
+        return self.allele_state[self.causal_allele_code]
+
     def __str__(self):
         output = (
             f"site_id: {self.site_id}"
@@ -78,6 +175,197 @@ class GenotypeResult:
         return output
 
 
+@dataclass
+class GenotypeMatrix:
+    """Data class that contains the genotype of individuals at the causal sites as a
+    sparse matrix in compressed sparse column format.
+
+    The matrix has one row per individual and one column per causal site, and it is
+    aligned with the arrays inside :class:`PhenotypeResult` and
+    :class:`GenotypeResult`. Only the individuals that carry the causal allele are
+    stored. The row indices of the j-th column are `indices[indptr[j]:indptr[j + 1]]`
+    and the corresponding entries of `data` are the number of causal alleles in
+    these individuals.
+
+    :param indptr: Offsets of the columns in `indices` and `data`
+    :type indptr: numpy.ndarray(int)
+    :param indices: Row indices of the stored entries
+    :type indices: numpy.ndarray(int)
+    :param data: Number of causal alleles of the stored entries
+    :type data: numpy.ndarray(int)
+    :param shape: Number of individuals and number of causal sites
+    :type shape: tuple(int, int)
+    """
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+    shape: tuple
+
+    def __str__(self):
+        output = (
+            f"indptr: {self.indptr}"
+            f"\nindices: {self.indices}"
+            f"\ndata: {self.data}"
+            f"\nshape: {self.shape}"
+        )
+        return output
+
+    def dot(self, effect_size):
+        """Multiplies the genotype matrix with effect sizes.
+
+        :param effect_size: Effect sizes of causal sites. A two dimensional array
+            with one row per causal site computes the product for each column.
+        :type effect_size: numpy.ndarray(float)
+        :return: Returns the genetic values of individuals.
+        :rtype: numpy.ndarray(float)
+        """
+        effect_size = np.asarray(effect_size, dtype=np.float64)
+        output = genotype._csc_dot(
+            self.indptr,
+            self.indices,
+            self.data,
+            effect_size.reshape(len(effect_size), -1),
+            self.shape[0],
+        )
+        return output.reshape((self.shape[0],) + effect_size.shape[1:])
+
+    def to_dense(self):
+        """Returns the genotype matrix as a dense numpy array.
+
+        :return: Returns the number of causal alleles with one row per individual
+            and one column per causal site.
+        :rtype: numpy.ndarray(int)
+        """
+        output = np.zeros(self.shape, dtype=self.data.dtype)
+        column = np.repeat(np.arange(self.shape[1]), np.diff(self.indptr))
+        output[self.indices, column] = self.data
+        return output
+
+    def to_scipy(self):
+        """Returns the genotype matrix as a :class:`scipy.sparse.csc_matrix` object.
+        This requires scipy to be installed.
+
+        :return: Returns the genotype matrix.
+        :rtype: scipy.sparse.csc_matrix
+        """
+        import scipy.sparse
+
+        return scipy.sparse.csc_matrix(
+            (self.data, self.indices, self.indptr), shape=self.shape
+        )
+
+
+# Arrays of a Result object that have a replicate axis in the output of
+# sim_phenotype_replicates.
+_REPLICATE_ARRAYS = ("phenotype", "environment_noise", "genetic_value", "effect_size")
+
+_GENOTYPE_MATRIX_ARRAYS = (
+    "genotype_matrix_indptr",
+    "genotype_matrix_indices",
+    "genotype_matrix_data",
+    "genotype_matrix_shape",
+)
+
+
+def _result_arrays(result):
+    """
+    Returns a dictionary with the arrays of a :class:`Result` object, where the
+    allele states are converted to a unicode array.
+    """
+    arrays = {
+        "individual_id": result.phenotype.individual_id,
+        "phenotype": result.phenotype.phenotype,
+        "environment_noise": result.phenotype.environment_noise,
+        "genetic_value": result.phenotype.genetic_value,
+        "site_id": result.genotype.site_id,
+        "causal_allele_code": result.genotype.causal_allele_code,
+        "allele_state": np.array(list(result.genotype.allele_state), dtype=str),
+        "effect_size": result.genotype.effect_size,
+        "allele_frequency": result.genotype.allele_frequency,
+    }
+    if result.genotype_matrix is not None:
+        arrays["genotype_matrix_indptr"] = result.genotype_matrix.indptr
+        arrays["genotype_matrix_indices"] = result.genotype_matrix.indices
+        arrays["genotype_matrix_data"] = result.genotype_matrix.data
+        arrays["genotype_matrix_shape"] = np.array(result.genotype_matrix.shape)
+
+    return {name: np.asarray(array) for name, array in arrays.items()}
+
+
+def _arrays_result(arrays):
+    """
+    Returns a :class:`Result` object from a dictionary of arrays that was obtained
+    by :func:`_result_arrays`.
+    """
+    genotype_matrix = None
+    if "genotype_matrix_indptr" in arrays:
+        genotype_matrix = GenotypeMatrix(
+            indptr=arrays["genotype_matrix_indptr"],
+            indices=arrays["genotype_matrix_indices"],
+            data=arrays["genotype_matrix_data"],
+            shape=tuple(int(x) for x in arrays["genotype_matrix_shape"]),
+        )
+    allele_state = np.empty(len(arrays["allele_state"]), dtype=object)
+    allele_state[:] = arrays["allele_state"].tolist()
+
+    return Result(
+        phenotype=PhenotypeResult(
+            individual_id=arrays["individual_id"],
+            phenotype=arrays["phenotype"],
+            environment_noise=arrays["environment_noise"],
+            genetic_value=arrays["genetic_value"],
+        ),
+        genotype=GenotypeResult(
+            site_id=arrays["site_id"],
+            causal_allele_code=arrays["causal_allele_code"],
+            allele_state=allele_state,
+            effect_size=arrays["effect_size"],
+            allele_frequency=arrays["allele_frequency"],
+        ),
+        genotype_matrix=genotype_matrix,
+    )
+
+
+def _append_npy(filename, array):
+    """
+    Appends an array along the first axis of the array that is stored in a .npy
+    file. The data is written at the end of the file and the shape is rewritten in
+    the header, which numpy pads so that the first axis can grow in place. The file
+    is only rewritten if the padding is too small.
+    """
+    with open(filename, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        header_start = f.tell()
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            header_start += 2
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            header_start += 4
+        header_end = f.tell()
+        array = np.asarray(array)
+        if fortran_order or array.dtype != dtype or array.shape[1:] != shape[1:]:
+            raise ValueError(
+                "Appended arrays should have the same data type and shape as the "
+                "stored arrays, except for the replicate axis"
+            )
+        new_shape = (shape[0] + array.shape[0],) + shape[1:]
+        header = (
+            f"{{'descr': {np.lib.format.dtype_to_descr(dtype)!r}, "
+            f"'fortran_order': False, 'shape': {new_shape!r}, }}"
+        )
+        header_length = header_end - header_start
+        if len(header) < header_length:
+            f.seek(header_start)
+            f.write(header.ljust(header_length - 1).encode("latin1") + b"\n")
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(array).tobytes())
+            return
+
+    np.save(filename, np.concatenate([np.load(filename), array]))
+
+
 @dataclass
 class Result:
     """Data class that contains the simulated result. See the
@@ -90,173 +378,778 @@ class Result:
     :param genotype: A :class:`GenotypeResult` object that contains simulated genotypic
         information of causal sites.
     :type genotype: GenotypeResult
+    :param genotype_matrix: A :class:`GenotypeMatrix` object that contains the
+        genotype of individuals at the causal sites. This is only computed when
+        `genotype_matrix=True` is passed to :func:`sim_phenotype`.
+    :type genotype_matrix: GenotypeMatrix or None
+    :param profile: A :class:`Profile` object that contains the time spent in each
+        phase of the simulation. This is only computed when `profile=True` is passed
+        to :func:`sim_phenotype`, and it is not written by the output methods.
+    :type profile: Profile or None
     """
 
     phenotype: PhenotypeResult
     genotype: GenotypeResult
+    genotype_matrix: GenotypeMatrix = None
+    profile: profiling.Profile = None
+
+    def to_npz(self, file, compressed=False):
+        """Writes the result to a single numpy .npz file, which can be read by
+        :meth:`Result.from_npz`.
+
+        :param file: Path of the output file.
+        :type file: str or os.PathLike
+        :param compressed: Whether the arrays are compressed.
+        :type compressed: bool
+        """
+        arrays = _result_arrays(self)
+        if compressed:
+            np.savez_compressed(file, **arrays)
+        else:
+            np.savez(file, **arrays)
+
+    @classmethod
+    def from_npz(cls, file):
+        """Reads a result that was written by :meth:`Result.to_npz`.
+
+        :param file: Path of the input file.
+        :type file: str or os.PathLike
+        :return: Returns the :class:`Result` object.
+        :rtype: Result
+        """
+        with np.load(file) as data:
+            arrays = {name: data[name] for name in data.files}
+        return _arrays_result(arrays)
+
+    def to_directory(self, path, replicates=False, append=False):
+        """Writes the result to a directory with one numpy .npy file per array,
+        which can be read by :meth:`Result.from_directory` with memory mapping.
+
+        If `replicates` is True, the `phenotype`, `environment_noise`,
+        `genetic_value` and `effect_size` arrays are treated as having one column
+        per replicate, as in the output of :func:`sim_phenotype_replicates`, and
+        they are stored with the replicates along the first axis. The replicates of
+        further results that share the same individuals, causal sites and causal
+        alleles can then be appended to the directory with `append=True`, so that
+        the replicates of a long simulation are written in chunks without holding
+        all of them in memory.
+
+        :param path: Path of the output directory.
+        :type path: str or os.PathLike
+        :param replicates: Whether the result has a replicate axis.
+        :type replicates: bool
+        :param append: Whether to append the replicates of the result to the
+            replicates in an existing directory that was written with
+            `replicates=True`.
+        :type append: bool
+        """
+        arrays = _result_arrays(self)
+        if replicates or append:
+            for name in _REPLICATE_ARRAYS:
+                if arrays[name].ndim < 2:
+                    raise ValueError(
+                        "Result should have a replicate axis to be written with "
+                        "replicates"
+                    )
+                arrays[name] = np.ascontiguousarray(np.moveaxis(arrays[name], 1, 0))
+        if not append:
+            os.makedirs(path, exist_ok=True)
+            for name, array in arrays.items():
+                np.save(os.path.join(path, f"{name}.npy"), array)
+            with open(os.path.join(path, "attributes.json"), "w") as f:
+                json.dump({"replicates": bool(replicates)}, f)
+            return
+
+        with open(os.path.join(path, "attributes.json")) as f:
+            if not json.load(f)["replicates"]:
+                raise ValueError(
+                    "Replicates can only be appended to a directory that was "
+                    "written with replicates"
+                )
+        for name in ["individual_id", "site_id", "causal_allele_code"]:
+            if not np.array_equal(
+                arrays[name], np.load(os.path.join(path, f"{name}.npy"))
+            ):
+                raise ValueError(
+                    "Appended replicates should have the same individuals, causal "
+                    "sites and causal alleles as the stored replicates"
+                )
+        for name in _REPLICATE_ARRAYS:
+            _append_npy(os.path.join(path, f"{name}.npy"), arrays[name])
+
+    @classmethod
+    def from_directory(cls, path, mmap_mode="r"):
+        """Reads a result that was written by :meth:`Result.to_directory`. The
+        arrays are memory mapped by default, so that they are only read from disk
+        when they are accessed. The arrays with replicates have one column per
+        replicate, as in the output of :func:`sim_phenotype_replicates`.
+
+        :param path: Path of the input directory.
+        :type path: str or os.PathLike
+        :param mmap_mode: Memory mapping mode that is passed to :func:`numpy.load`.
+            If None, the arrays are read into memory.
+        :type mmap_mode: None or str
+        :return: Returns the :class:`Result` object.
+        :rtype: Result
+        """
+        with open(os.path.join(path, "attributes.json")) as f:
+            replicates = json.load(f)["replicates"]
+        arrays = {}
+        for name in [
+            "individual_id",
+            "site_id",
+            "causal_allele_code",
+            "allele_state",
+            "allele_frequency",
+            *_REPLICATE_ARRAYS,
+            *_GENOTYPE_MATRIX_ARRAYS,
+        ]:
+            filename = os.path.join(path, f"{name}.npy")
+            if os.path.exists(filename):
+                arrays[name] = np.load(filename, mmap_mode=mmap_mode)
+        if replicates:
+            for name in _REPLICATE_ARRAYS:
+                arrays[name] = np.moveaxis(arrays[name], 0, 1)
+        return _arrays_result(arrays)
+
+
+# Minimum estimated number of carriers per causal site of a tree for the genetic
+# values of its causal sites to be computed by the multithreaded kernel, below which
+# the traversal of a site is too short to be worth a round of the numba threads.
+_THREADED_MIN_CARRIERS = 1000
 
+# Number of causal sites in a chunk of the parallel simulation. The chunks do not
+# depend on the number of workers, so that the output is deterministic.
+_PARALLEL_CHUNK_SIZE = 1000
 
-@numba.njit
-def _traversal_genotype(
-    nodes_individual,
-    left_child_array,
-    right_sib_array,
-    stack,
-    has_mutation,
-    num_individuals,
-    num_nodes,
+# Simulator and genotype engine of a worker process of the parallel simulation.
+_worker_simulator = None
+_worker_engine = None
+
+
+def _init_worker(simulator):
+    """
+    Initializes a worker process of the parallel simulation, such that the genotype
+    engine is created once per worker.
+    """
+    global _worker_simulator, _worker_engine
+    if simulator is not None and simulator.num_workers > 1:
+        # Avoid oversubscription by numba threads of the worker processes
+        numba.set_num_threads(1)
+    _worker_simulator = simulator
+    _worker_engine = None if simulator is None else simulator._genotype_engine()
+
+
+def _worker_chunk(
+    causal_site_array, causal_code_array, allele_frequency, seed_sequence
 ):
     """
-    Numba to speed up the tree traversal algorithm to determine the genotype of
-    individuals.
-    Stack has to be Typed List in numba to use numba.
+    Simulates a chunk of causal sites in a worker process. Every chunk is processed
+    by the single-threaded kernel, whichever the number of workers, so that the
+    output does not depend on the numba threads of the process that runs it.
     """
+    return _worker_simulator._sim_chunk_genetic_value(
+        _worker_engine,
+        causal_site_array,
+        causal_code_array,
+        allele_frequency,
+        np.random.default_rng(seed_sequence),
+        threaded=False,
+    )
 
-    genotype = np.zeros(num_individuals)
-    while len(stack) > 0:
-        parent_node_id = stack.pop()
-        if parent_node_id == num_nodes:
-            individual_id = -1
-        else:
-            individual_id = nodes_individual[parent_node_id]
-        if individual_id > -1:
-            genotype[individual_id] += 1
-        child_node_id = left_child_array[parent_node_id]
-        while child_node_id != -1:
-            if not has_mutation[child_node_id]:
-                stack.append(child_node_id)
-            child_node_id = right_sib_array[child_node_id]
 
-    return genotype
+def _concatenate_genotype_matrix(genotype_matrix_list):
+    """
+    Concatenates the columns of :class:`GenotypeMatrix` objects that have the same
+    number of rows.
+    """
+    indptr_list = [np.zeros(1, dtype=np.int64)]
+    num_entries = 0
+    num_columns = 0
+    for genotype_matrix in genotype_matrix_list:
+        indptr_list.append(genotype_matrix.indptr[1:] + num_entries)
+        num_entries += len(genotype_matrix.data)
+        num_columns += genotype_matrix.shape[1]
+
+    return GenotypeMatrix(
+        indptr=np.concatenate(indptr_list),
+        indices=np.concatenate([x.indices for x in genotype_matrix_list]),
+        data=np.concatenate([x.data for x in genotype_matrix_list]),
+        shape=(genotype_matrix_list[0].shape[0], num_columns),
+    )
 
 
 class PhenotypeSimulator:
     """Simulator class to simulate quantitative traits of individuals.
 
-    :param ts: Tree sequence data with mutation
-    :type ts: tskit.TreeSequence
+    :param ts: Tree sequence data with mutation, or the path of the file that it is
+        loaded from
+    :type ts: tskit.TreeSequence or str or os.PathLike
     :param num_causal: Number of causal sites
     :type num_causal: int
     :param h2: Narrow-sense heritability
-    :type h2: float
+    :type h2: float or numpy.ndarray(float)
     :param model: Trait model
     :type model: TraitModel
+    :param genotype_matrix: Whether to compute genetic values through a sparse
+        genotype matrix of the causal sites, which is stored in the
+        `causal_genotype_matrix` attribute.
+    :type genotype_matrix: bool
+    :param num_workers: Number of worker processes that compute the genetic values
+        of contiguous genomic chunks of causal sites. If None, the causal sites are
+        processed in a single pass in the current process.
+    :type num_workers: None or int
+    :param candidate_site: Sorted IDs of the sites that can be chosen as causal
+        sites. If None, all sites can be chosen.
+    :type candidate_site: None or numpy.ndarray(int)
+    :param frequency_bins: Frequency bins of the causal sites, given as a list of
+        `(lower, upper, num_causal)` tuples. If this is specified, `num_causal`
+        causal sites are chosen among the sites whose minor allele frequency is in
+        the interval [lower, upper) of each bin.
+    :type frequency_bins: None or list
+    :param frequency_weight: Function that returns the sampling weight of the sites
+        given their minor allele frequencies. If this is specified, the causal sites
+        are chosen with probability proportional to their weight.
+    :type frequency_weight: None or callable
+    :param engine: Genotype engine of the tree sequence data, whose cached arrays
+        are reused by the simulator. If None, the engine is created on first use.
+    :type engine: None or tstrait.genotype.GenotypeEngine
+    :param ts_path: Path of the file that the tree sequence data was loaded from. If
+        this is given, worker processes load the tree sequence data from the file
+        instead of receiving a copy of it.
+    :type ts_path: None or str
+    :param individuals: IDs of the individuals whose phenotypes are simulated. If
+        None, the phenotypes of all individuals with sample nodes are simulated.
+    :type individuals: None or numpy.ndarray(int)
+    :param profile: Whether to record the time spent in each phase of the
+        simulation in the `profiler` attribute. The phases of worker processes are
+        not recorded.
+    :type profile: bool
     """
 
-    def __init__(self, ts, num_causal, h2, model, random_seed):
-        self.ts = ts
+    def __init__(
+        self,
+        ts,
+        num_causal,
+        h2,
+        model,
+        random_seed,
+        genotype_matrix=False,
+        num_workers=None,
+        candidate_site=None,
+        frequency_bins=None,
+        frequency_weight=None,
+        engine=None,
+        ts_path=None,
+        individuals=None,
+        profile=False,
+    ):
+        self.ts, path = _load_tree_sequence(ts)
+        self.ts_path = path if ts_path is None else ts_path
         self.num_causal = num_causal
         self.h2 = h2
         self.model = model
         self.rng = np.random.default_rng(random_seed)
+        self.genotype_matrix = genotype_matrix
+        self.num_workers = num_workers
+        self.candidate_site = candidate_site
+        self.frequency_bins = frequency_bins
+        self.frequency_weight = frequency_weight
+        self.causal_genotype_matrix = None
+        self.individuals = individuals
+        if engine is not None and individuals is not None:
+            engine = engine.subset(individuals)
+        self.engine = engine
+        if profile:
+            self.profiler = profiling._Profiler()
+        else:
+            self.profiler = profiling._NULL_PROFILER
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["profiler"] = profiling._NULL_PROFILER
+        if self.ts_path is not None:
+            # The tree sequence is loaded from the file in the worker process
+            state["ts"] = None
+            state["engine"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.ts is None:
+            self.ts, _ = _load_tree_sequence(self.ts_path)
+
+    def _genotype_engine(self):
+        """
+        Returns the genotype engine of the tree sequence data, which is created on
+        the first call if it was not given to the simulator.
+        """
+        if self.engine is None:
+            self.engine = genotype.GenotypeEngine(self.ts, self.individuals)
+        return self.engine
+
+    def site_frequency(self):
+        """Returns the minor allele frequency of all sites.
+
+        The frequencies are computed among the sample nodes of all individuals, like
+        the frequencies of the causal alleles. The number of samples that carry each
+        allele is computed for all sites in a single pass over the edges of the tree
+        sequence, and all non-ancestral alleles of a site are treated as one allele.
+        The output is computed on the first call and cached.
+
+        :return: Returns a numpy array with the minor allele frequency of each site.
+        :rtype: numpy.ndarray(float)
+        """
+        return self._genotype_engine().site_frequency()
 
     def _choose_causal_site(self):
         """
         Obtain site ID based on their position (site IDs are aligned
-        based on their positions in tree sequence data requirement).
+        based on their positions in tree sequence data requirement). The number of
+        sites is passed to the random generator instead of a range of site IDs, so
+        that the site IDs are not materialized. The random generator then samples
+        the causal sites in O(num_causal) time and memory when num_causal is much
+        smaller than the number of sites, and the output is identical to sampling
+        from the range. If `candidate_site` is given, the causal sites are chosen
+        among the candidate sites.
         """
-        site_id = self.rng.choice(
-            range(self.ts.num_sites), size=self.num_causal, replace=False
-        )
+        if self.frequency_bins is not None or self.frequency_weight is not None:
+            site_id = self._choose_causal_site_by_frequency()
+        elif self.candidate_site is None:
+            site_id = self.rng.choice(
+                self.ts.num_sites, size=self.num_causal, replace=False
+            )
+        else:
+            site_id = self.candidate_site[
+                self.rng.choice(
+                    len(self.candidate_site), size=self.num_causal, replace=False
+                )
+            ]
         site_id = np.sort(site_id)
 
         return site_id
 
-    def _obtain_allele_frequency(self, tree, site):
-        """
-        Obtain a dictionary of allele frequency counts, excluding the ancestral state
-        Input is the tree sequence site (ts.site(ID)).
-        Remove sites from dictionary having no items.
-        If only the ancestral state exists, don't delete the ancestral state.
-        """
-        counts = collections.Counter({site.ancestral_state: self.ts.num_samples})
-        for m in site.mutations:
-            current_state = site.ancestral_state
-            if m.parent != tskit.NULL:
-                current_state = self.ts.mutation(m.parent).derived_state
-            # Silent mutations do nothing
-            if current_state != m.derived_state:
-                num_samples = tree.num_samples(m.node)
-                counts[m.derived_state] += num_samples
-                counts[current_state] -= num_samples
-        del counts[site.ancestral_state]
-        counts = {x: y for x, y in counts.items() if y != 0}
-        if len(counts) == 0:
-            counts = {site.ancestral_state: self.ts.num_samples}
-        return counts
-
-    def _individual_genotype(self, tree, site, causal_state, num_nodes):
-        """
-        Returns a numpy array that describes the number of causal mutation in an
-        individual.
-        """
-        has_mutation = np.zeros(num_nodes + 1, dtype=bool)
-        state_transitions = {tree.virtual_root: site.ancestral_state}
-        for m in site.mutations:
-            state_transitions[m.node] = m.derived_state
-            has_mutation[m.node] = True
-        stack = numba.typed.List()
-        for node, state in state_transitions.items():
-            if state == causal_state:
-                stack.append(node)
-
-        genotype = _traversal_genotype(
-            nodes_individual=self.ts.nodes_individual,
-            left_child_array=tree.left_child_array,
-            right_sib_array=tree.right_sib_array,
-            stack=stack,
-            has_mutation=has_mutation,
-            num_individuals=self.ts.num_individuals,
-            num_nodes=num_nodes,
+    def _choose_causal_site_by_frequency(self):
+        """
+        Choose the causal sites based on the minor allele frequency of the candidate
+        sites, either uniformly within each frequency bin or with probability
+        proportional to a weight function of the frequency.
+        """
+        if self.candidate_site is None:
+            candidate_site = np.arange(self.ts.num_sites)
+        else:
+            candidate_site = self.candidate_site
+        frequency = self.site_frequency()[candidate_site]
+        if self.frequency_bins is not None:
+            site_id_list = []
+            for lower, upper, num_causal in self.frequency_bins:
+                bin_site = candidate_site[(frequency >= lower) & (frequency < upper)]
+                if num_causal > len(bin_site):
+                    raise ValueError(
+                        "There are less number of sites in the frequency bin "
+                        f"[{lower}, {upper}) than its number of causal sites"
+                    )
+                site_id_list.append(
+                    self.rng.choice(bin_site, size=int(num_causal), replace=False)
+                )
+            site_id = np.concatenate(site_id_list)
+        else:
+            weight = np.asarray(self.frequency_weight(frequency), dtype=np.float64)
+            if (
+                weight.shape != frequency.shape
+                or not np.all(np.isfinite(weight))
+                or np.any(weight < 0)
+            ):
+                raise ValueError(
+                    "Frequency weight should return a non-negative finite weight for "
+                    "each site"
+                )
+            if np.count_nonzero(weight) < self.num_causal:
+                raise ValueError(
+                    "There are less number of sites with a positive frequency weight "
+                    "than the inputted number of causal sites"
+                )
+            site_id = candidate_site[
+                self.rng.choice(
+                    len(candidate_site),
+                    size=self.num_causal,
+                    replace=False,
+                    p=weight / np.sum(weight),
+                )
+            ]
+
+        return site_id
+
+    def _group_sites_by_tree(self, site_id):
+        """
+        Group the sorted site IDs by the tree that they belong to, so that the tree
+        sequence can be traversed once from left to right. Returns the indexes of the
+        trees that contain at least one of the sites, and the offsets of the first
+        site in each of these trees (the last offset is the number of sites).
+        """
+        engine = self._genotype_engine()
+        position = engine.sites_position[site_id]
+        site_tree_index = (
+            np.searchsorted(engine.breakpoints, position, side="right") - 1
         )
+        tree_index, tree_start = np.unique(site_tree_index, return_index=True)
+        tree_start = np.append(tree_start, len(site_id))
+
+        return tree_index, tree_start
+
+    def _choose_causal_allele(self, engine, causal_site_array):
+        """
+        Randomly choose the causal allele of each causal site among the non-ancestral
+        alleles that are present in the samples. The ancestral state is chosen when no
+        other allele is present. Returns the state codes of the causal alleles, and
+        the allele counts of the causal sites, which are reused to compute the
+        frequencies of the causal alleles.
+        """
+        allele_count = engine.allele_count(causal_site_array)
+        allele_offset, allele_mutation, _ = allele_count
+        # One allele of each causal site is drawn with a single call to the random
+        # generator
+        allele = allele_mutation[
+            allele_offset[:-1] + self.rng.integers(0, np.diff(allele_offset))
+        ]
+        causal_code_array = np.where(
+            allele == tskit.NULL,
+            engine.site_code[causal_site_array],
+            engine.mutation_code[allele],
+        ).astype(np.int32)
 
-        return genotype
+        return causal_code_array, allele_count
+
+    def _causal_genotype_matrix(self, engine, causal_site_array, causal_code_array):
+        """
+        Returns the genotype of individuals at the causal sites as a
+        :class:`GenotypeMatrix` object, which is computed in a single pass over the
+        trees that contain causal sites.
+        """
+        tree = engine.tree
+        indptr_list = [np.zeros(1, dtype=np.int64)]
+        indices_list = [np.zeros(0, dtype=np.int32)]
+        data_list = [np.zeros(0, dtype=np.int32)]
+        num_entries = 0
+
+        tree_index, tree_start = self._group_sites_by_tree(causal_site_array)
+        for j, index in enumerate(tree_index):
+            with self.profiler.phase("seek"):
+                tree.seek_index(index)
+            start = tree_start[j]
+            end = tree_start[j + 1]
+            with self.profiler.phase("genotype"):
+                indptr, indices, data = engine.tree_genotype_matrix(
+                    tree=tree,
+                    site_id=causal_site_array[start:end],
+                    causal_code=causal_code_array[start:end],
+                )
+            self._profile_traversal(
+                engine, tree, causal_site_array[start:end], causal_code_array[start:end]
+            )
+            indptr_list.append(indptr[1:] + num_entries)
+            indices_list.append(indices)
+            data_list.append(data)
+            num_entries += len(data)
+
+        genotype_matrix = GenotypeMatrix(
+            indptr=np.concatenate(indptr_list),
+            indices=np.concatenate(indices_list),
+            data=np.concatenate(data_list),
+            shape=(engine.num_individuals, len(causal_site_array)),
+        )
+
+        return genotype_matrix
+
+    def _profile_traversal(self, engine, tree, causal_site_array, causal_code_array):
+        """
+        Records the visit of a tree and the number of nodes that are traversed to
+        compute the genotypes of its causal sites, if profiling is enabled. The
+        nodes are counted by a separate traversal outside of the timed phases.
+        """
+        if self.profiler.enabled:
+            profile = self.profiler.profile
+            profile.num_trees += 1
+            profile.num_nodes += engine.tree_num_traversed(
+                tree, causal_site_array, causal_code_array
+            )
+
+    def _stream_tree_genetic_value(
+        self,
+        engine,
+        tree,
+        causal_site_array,
+        causal_code_array,
+        beta_array,
+        individual_genetic_array,
+        threaded=False,
+    ):
+        """
+        Adds the genetic values of the causal sites of a tree, whose effect sizes
+        are given by `beta_array`, into `individual_genetic_array` in place. The
+        effect size of each causal site is added to the individuals that carry the
+        causal allele as they are found, so the memory used does not depend on the
+        number of carriers. If `threaded` is True, the carriers are found by the
+        multithreaded kernel, which gives the same output.
+        """
+        tree_genetic_value = engine.tree_genetic_value
+        if threaded:
+            tree_genetic_value = engine.tree_genetic_value_threaded
+        with self.profiler.phase("genotype"):
+            tree_genetic_value(
+                tree=tree,
+                site_id=causal_site_array,
+                causal_code=causal_code_array,
+                beta=beta_array.reshape(len(beta_array), -1),
+                genetic_value=individual_genetic_array.reshape(
+                    engine.num_individuals, -1
+                ),
+            )
+        self._profile_traversal(engine, tree, causal_site_array, causal_code_array)
+
+    def _sim_chunk_genetic_value(
+        self,
+        engine,
+        causal_site_array,
+        causal_code_array,
+        allele_frequency,
+        rng,
+        threaded=True,
+    ):
+        """
+        Simulates the effect sizes of the given causal sites from the frequencies of
+        their causal alleles by using the `rng` random generator, and returns the
+        effect sizes, the contribution of the causal sites to the genetic values of
+        individuals and the genotype matrix of the causal sites (None if
+        `genotype_matrix` is False). If `threaded` is False, the multithreaded
+        kernel is not used.
+        """
+        with self.profiler.phase("effect_size"):
+            beta_array = self.model.sim_effect_sizes(
+                self.num_causal, allele_frequency, rng
+            )
+
+        if self.genotype_matrix:
+            genotype_matrix = self._causal_genotype_matrix(
+                engine, causal_site_array, causal_code_array
+            )
+            with self.profiler.phase("genetic_value"):
+                individual_genetic_array = genotype_matrix.dot(beta_array)
+        else:
+            genotype_matrix = None
+            trait_shape = np.shape(self.model.trait_mean)
+            individual_genetic_array = np.zeros((engine.num_individuals,) + trait_shape)
+            tree = engine.tree
+            tree_index, tree_start = self._group_sites_by_tree(causal_site_array)
+            for j, index in enumerate(tree_index):
+                with self.profiler.phase("seek"):
+                    tree.seek_index(index)
+                start = tree_start[j]
+                end = tree_start[j + 1]
+                # The number of carriers of each causal site is estimated from the
+                # frequency of its causal allele
+                tree_threaded = (
+                    threaded
+                    and end - start > 1
+                    and numba.get_num_threads() > 1
+                    and np.mean(allele_frequency[start:end]) * engine.total_ploidy
+                    >= _THREADED_MIN_CARRIERS
+                )
+                self._stream_tree_genetic_value(
+                    engine,
+                    tree,
+                    causal_site_array[start:end],
+                    causal_code_array[start:end],
+                    beta_array[start:end],
+                    individual_genetic_array,
+                    tree_threaded,
+                )
+
+        return beta_array, individual_genetic_array, genotype_matrix
+
+    def _sim_parallel_genetic_value(
+        self, causal_site_array, causal_code_array, allele_frequency
+    ):
+        """
+        Splits the causal sites into contiguous genomic chunks of
+        `_PARALLEL_CHUNK_SIZE` sites, and processes each chunk in a worker process
+        by using its own random generator. The random generators are spawned from a
+        single draw of the simulator's random generator, and the chunks do not
+        depend on `num_workers`, so the output does not depend on the number of
+        workers.
+        """
+        num_chunks = -(-len(causal_site_array) // _PARALLEL_CHUNK_SIZE)
+        seed_sequence = np.random.SeedSequence(self.rng.integers(2**63))
+        chunk_args = [
+            (
+                causal_site_array[j : j + _PARALLEL_CHUNK_SIZE],
+                causal_code_array[j : j + _PARALLEL_CHUNK_SIZE],
+                allele_frequency[j : j + _PARALLEL_CHUNK_SIZE],
+                chunk_seed,
+            )
+            for j, chunk_seed in zip(
+                range(0, len(causal_site_array), _PARALLEL_CHUNK_SIZE),
+                seed_sequence.spawn(num_chunks),
+            )
+        ]
+        beta_array = []
+        genotype_matrix = []
+        genetic_value = None
+
+        def add_chunks(chunk_output):
+            # Chunks arrive in genomic order, so that their genetic values are
+            # summed in a fixed order, and only one genetic value buffer is kept
+            nonlocal genetic_value
+            for chunk_beta, chunk_genetic_value, chunk_genotype in chunk_output:
+                beta_array.append(chunk_beta)
+                genotype_matrix.append(chunk_genotype)
+                if genetic_value is None:
+                    genetic_value = chunk_genetic_value
+                else:
+                    genetic_value += chunk_genetic_value
+
+        if self.num_workers == 1:
+            _init_worker(self)
+            try:
+                add_chunks(_worker_chunk(*args) for args in chunk_args)
+            finally:
+                _init_worker(None)
+        else:
+            # Worker processes are spawned, as forking a process that has started
+            # numba threads is not safe with all threading layers
+            with self.profiler.phase("workers"):
+                with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self,),
+                ) as executor:
+                    add_chunks(executor.map(_worker_chunk, *zip(*chunk_args)))
+
+        if self.genotype_matrix:
+            genotype_matrix = _concatenate_genotype_matrix(genotype_matrix)
+        else:
+            genotype_matrix = None
+
+        return np.concatenate(beta_array), genetic_value, genotype_matrix
 
     def sim_genetic_value(self):
         """Simulates genetic values of individuals.
 
         This method randomly chooses causal sites and the corresponding causal state
-        based on the `num_causal` input. Afterwards, effect size of each causal site
-        is simulated based on the trait model given by the `model` input. Genetic
+        based on the `num_causal` input. The frequencies of the causal alleles are
+        obtained from the allele counts of the causal sites among the sample nodes of
+        all individuals, and the effect size of each causal site is simulated based
+        on the trait model given by the `model` input. Genetic
         values are computed by using the simulated effect sizes and mutation
-        information of individuals.
+        information of individuals. The tree sequence is traversed once from left to
+        right, and all causal sites that fall within a tree are processed together.
+        Only the individuals that carry the causal allele of each causal site are
+        recorded, and the genetic values are accumulated in place in a single array.
+        The causal sites of trees with many causal sites are processed concurrently
+        by using the numba threads, each with its own genetic value array.
+        If `genotype_matrix` is True, the genotypes are stored in a sparse
+        :class:`GenotypeMatrix` object in the `causal_genotype_matrix` attribute, and
+        the genetic values are obtained as a single sparse matrix-vector product.
+        If `num_workers` is not None, contiguous genomic chunks of causal sites are
+        processed in separate worker processes, and the genetic values of the chunks
+        are summed.
 
         :return: Returns a :class:`Genotype` object that includes simulated
             genetic information of each causal site, and a numpy array of simulated
             genetic values.
         :rtype: (GenotypeResult, numpy.ndarray(float))
         """
-        causal_site_array = self._choose_causal_site()
-        num_nodes = self.ts.num_nodes
-        tree = tskit.Tree(self.ts)
-
-        individual_genetic_array = np.zeros(self.ts.num_individuals)
-        causal_state_array = np.zeros(self.num_causal, dtype=object)
-        beta_array = np.zeros(self.num_causal)
-        allele_frequency = np.zeros(self.num_causal)
-
-        for i, single_id in enumerate(causal_site_array):
-            site = self.ts.site(single_id)
-            tree.seek(site.position)
-            counts = self._obtain_allele_frequency(tree, site)
-            causal_state_array[i] = self.rng.choice(list(counts))
-            individual_genotype = self._individual_genotype(
-                tree=tree,
-                site=site,
-                causal_state=causal_state_array[i],
-                num_nodes=num_nodes,
+        with self.profiler.phase("engine"):
+            engine = self._genotype_engine()
+        with self.profiler.phase("causal_site"):
+            causal_site_array = self._choose_causal_site()
+        with self.profiler.phase("causal_allele"):
+            causal_code_array, allele_count = self._choose_causal_allele(
+                engine, causal_site_array
+            )
+        with self.profiler.phase("allele_frequency"):
+            allele_frequency = engine.causal_allele_frequency(
+                causal_site_array, causal_code_array, allele_count
             )
-            allele_frequency[i] = np.sum(individual_genotype) / (
-                2 * len(individual_genotype)
+        if self.num_workers is None:
+            (
+                beta_array,
+                individual_genetic_array,
+                self.causal_genotype_matrix,
+            ) = self._sim_chunk_genetic_value(
+                engine, causal_site_array, causal_code_array, allele_frequency, self.rng
             )
-            beta_array[i] = self.model.sim_effect_size(
-                self.num_causal, allele_frequency[i], self.rng
+        else:
+            (
+                beta_array,
+                individual_genetic_array,
+                self.causal_genotype_matrix,
+            ) = self._sim_parallel_genetic_value(
+                causal_site_array, causal_code_array, allele_frequency
             )
-            individual_genetic_array += individual_genotype * beta_array[i]
 
         genotypic_effect_data = GenotypeResult(
             site_id=causal_site_array,
-            causal_allele=causal_state_array,
+            causal_allele_code=causal_code_array,
+            allele_state=engine.state_lookup,
+            effect_size=beta_array,
+            allele_frequency=allele_frequency,
+        )
+
+        return genotypic_effect_data, individual_genetic_array
+
+    def sim_genetic_value_replicates(self, num_replicates, genotype_result=None):
+        """Simulates genetic values of individuals in multiple replicates that share
+        the same causal sites.
+
+        This method chooses the causal sites and causal alleles once, and computes the
+        genotypes of individuals at the causal sites once as a sparse
+        :class:`GenotypeMatrix` object, which is stored in the
+        `causal_genotype_matrix` attribute. Effect sizes of all replicates are then
+        simulated in bulk, and the genetic values of all replicates are obtained by a
+        single sparse matrix product.
+
+        :param num_replicates: Number of replicates.
+        :type num_replicates: int
+        :param genotype_result: The :class:`GenotypeResult` object of a previous call
+            to this method. If this is specified, the causal sites, the causal alleles
+            and the genotypes of the previous call are reused, and only the effect
+            sizes of the new replicates are simulated.
+        :type genotype_result: None or GenotypeResult
+        :return: Returns a :class:`GenotypeResult` object whose `effect_size` array has
+            one column per replicate, and a numpy array of simulated genetic values with
+            one column per replicate.
+        :rtype: (GenotypeResult, numpy.ndarray(float))
+        """
+        if genotype_result is None:
+            causal_site_array = self._choose_causal_site()
+            engine = self._genotype_engine()
+            causal_code_array, allele_count = self._choose_causal_allele(
+                engine, causal_site_array
+            )
+            allele_frequency = engine.causal_allele_frequency(
+                causal_site_array, causal_code_array, allele_count
+            )
+            self.causal_genotype_matrix = self._causal_genotype_matrix(
+                engine, causal_site_array, causal_code_array
+            )
+            allele_state = engine.state_lookup
+        else:
+            causal_site_array = genotype_result.site_id
+            causal_code_array = genotype_result.causal_allele_code
+            allele_frequency = genotype_result.allele_frequency
+            allele_state = genotype_result.allele_state
+        trait_shape = np.shape(self.model.trait_mean)
+        beta_array = self.model.sim_effect_sizes(
+            self.num_causal, np.repeat(allele_frequency, num_replicates), self.rng
+        ).reshape((self.num_causal, num_replicates) + trait_shape)
+        individual_genetic_array = self.causal_genotype_matrix.dot(beta_array)
+
+        genotypic_effect_data = GenotypeResult(
+            site_id=causal_site_array,
+            causal_allele_code=causal_code_array,
+            allele_state=allele_state,
             effect_size=beta_array,
             allele_frequency=allele_frequency,
         )
@@ -266,21 +1159,32 @@ class PhenotypeSimulator:
     def _sim_environment_noise(self, individual_genetic_array):
         """
         Add environmental noise to the genetic value of individuals given the genetic
-        value of individuals. The simulation assumes the additive model.
+        value of individuals. The simulation assumes the additive model. A two
+        dimensional array with one column per replicate is processed column by
+        column, with a single call to the random generator. If `h2` is an array, it
+        gives the narrow-sense heritability of each trait on the last axis of the
+        genetic value array.
         """
         trait_sd = np.sqrt(self.model.trait_var)
-        num_ind = len(individual_genetic_array)
-        if self.h2 == 1:
-            E = np.zeros(num_ind)
+        shape = individual_genetic_array.shape
+        if np.ndim(self.h2) > 0:
+            phenotype, E = _sim_environment(
+                individual_genetic_array,
+                np.asarray(self.h2, dtype=np.float64),
+                trait_sd,
+                self.rng,
+            )
+        elif self.h2 == 1:
+            E = np.zeros(shape)
             phenotype = individual_genetic_array
         elif self.h2 == 0:
-            E = self.rng.normal(loc=0.0, scale=trait_sd, size=num_ind)
+            E = self.rng.normal(loc=0.0, scale=trait_sd, size=shape)
             phenotype = E
         else:
             env_std = np.sqrt(
-                (1 - self.h2) / self.h2 * np.var(individual_genetic_array)
+                (1 - self.h2) / self.h2 * np.var(individual_genetic_array, axis=0)
             )
-            E = self.rng.normal(loc=0.0, scale=env_std, size=num_ind)
+            E = self.rng.normal(loc=0.0, scale=env_std, size=shape)
             phenotype = individual_genetic_array + E
 
         return phenotype, E
@@ -297,15 +1201,18 @@ class PhenotypeSimulator:
         :class:`PhenotypeResult` object, which includes individual ID, phenotype,
         environmental noise and genetic value.
 
-        :param individual_genetic_value: Genetic value of individuals.
+        :param individual_genetic_value: Genetic value of individuals. A two
+            dimensional array with one column per replicate can be used to simulate the
+            environmental noise of all replicates at once.
         :type individual_genetic_value: numpy.ndarray(float)
         :return: Returns the :class:`PhenotypeResult` object, which includes individual
             ID, phenotype, environmental noise and genetic value.
         :rtype: PhenotypeResult
         """
-        phenotype, E = self._sim_environment_noise(individual_genetic_value)
+        with self.profiler.phase("environment"):
+            phenotype, E = self._sim_environment_noise(individual_genetic_value)
         phenotype_individuals = PhenotypeResult(
-            individual_id=np.arange(self.ts.num_individuals),
+            individual_id=self._genotype_engine().individual_id,
             phenotype=phenotype,
             environment_noise=E,
             genetic_value=individual_genetic_value,
@@ -314,15 +1221,255 @@ class PhenotypeSimulator:
         return phenotype_individuals
 
 
-def sim_phenotype(ts, num_causal, model, h2=0.3, random_seed=None):
+def _load_tree_sequence(ts):
+    """
+    Returns the tree sequence and the path of the file that it was loaded from. If
+    `ts` is a path, the tree sequence is loaded from the file without its reference
+    sequence, which is not used by the simulation. Otherwise, `ts` is returned as it
+    is and the path is None.
+    """
+    if isinstance(ts, (str, os.PathLike)):
+        return tskit.load(ts, skip_reference_sequence=True), os.fspath(ts)
+    return ts, None
+
+
+def _check_sim_input(ts, num_causal, model, h2):
+    """
+    Validate the inputs that are shared by the simulation functions.
+    """
+    if not isinstance(ts, tskit.TreeSequence):
+        raise TypeError("Input should be a tree sequence data")
+    if not isinstance(num_causal, numbers.Number):
+        raise TypeError("Number of causal sites should be an integer")
+    if int(num_causal) != num_causal or num_causal <= 0:
+        raise ValueError("Number of causal sites should be a positive integer")
+    if not isinstance(model, trait_model.TraitModel):
+        raise TypeError("Trait model must be an instance of TraitModel")
+    if isinstance(model, trait_model.TraitModelMultivariateNormal) and not (
+        isinstance(h2, numbers.Number)
+    ):
+        h2 = np.asarray(h2)
+        if h2.dtype.kind not in "iuf":
+            raise TypeError("Heritability should be a number")
+        if h2.shape != (model.num_trait,):
+            raise ValueError(
+                "Heritability should be a number or an array with one value per trait"
+            )
+    elif not isinstance(h2, numbers.Number):
+        raise TypeError("Heritability should be a number")
+    if np.any(h2 > 1) or np.any(h2 < 0):
+        raise ValueError("Heritability should be 0 <= h2 <= 1")
+    num_sites = ts.num_sites
+    if num_sites == 0:
+        raise ValueError("No mutation in the provided data")
+    if num_causal > num_sites:
+        raise ValueError(
+            "There are less number of sites in the tree sequence than the inputted "
+            "number of causal sites"
+        )
+
+
+def _check_num_replicates(num_replicates, name="Number of replicates"):
+    """
+    Validate the number of replicates of the replicate simulation functions.
+    """
+    if not isinstance(num_replicates, numbers.Number):
+        raise TypeError(f"{name} should be an integer")
+    if int(num_replicates) != num_replicates or num_replicates <= 0:
+        raise ValueError(f"{name} should be a positive integer")
+
+
+def _check_individuals(ts, individuals):
+    """
+    Validate the IDs of the individuals whose phenotypes are simulated, and return
+    them as a numpy array, or None if they are not given.
+    """
+    if individuals is None:
+        return None
+    individuals = np.asarray(individuals)
+    if individuals.ndim != 1 or individuals.dtype.kind not in "iu":
+        raise TypeError("Individuals should be a one dimensional array of integers")
+    if len(individuals) == 0:
+        raise ValueError("Individuals should not be empty")
+    if np.any(individuals < 0) or np.any(individuals >= ts.num_individuals):
+        raise ValueError("Individuals should be valid individual IDs")
+    if len(np.unique(individuals)) != len(individuals):
+        raise ValueError("Individuals should not contain duplicates")
+    sample_individual = ts.nodes_individual[ts.samples()]
+    if not np.all(np.isin(individuals, sample_individual)):
+        raise ValueError("Individuals should have at least one sample node")
+    return individuals.astype(np.int64)
+
+
+def _candidate_site(ts, site_mask, intervals):
+    """
+    Returns the sorted IDs of the sites that are selected by a boolean site mask
+    and that are located in a set of genomic intervals, or None if neither is
+    given. The intervals are resolved against the site positions by binary search,
+    so the tree sequence is not copied.
+    """
+    if site_mask is None and intervals is None:
+        return None
+    if site_mask is not None:
+        site_mask = np.asarray(site_mask)
+        if site_mask.dtype != bool or site_mask.shape != (ts.num_sites,):
+            raise ValueError(
+                "Site mask should be a boolean array with one entry per site"
+            )
+    if intervals is not None:
+        intervals = np.asarray(intervals, dtype=np.float64)
+        if intervals.ndim != 2 or intervals.shape[1] != 2:
+            raise ValueError("Intervals should be an array of shape (num_intervals, 2)")
+        if np.any(intervals[:, 0] >= intervals[:, 1]) or np.any(
+            intervals[1:, 0] < intervals[:-1, 1]
+        ):
+            raise ValueError(
+                "Intervals should be sorted and non-overlapping, with left < right"
+            )
+        if np.any(intervals < 0) or np.any(intervals > ts.sequence_length):
+            raise ValueError("Intervals should be within the sequence length")
+
+    position = ts.sites_position
+    if site_mask is None:
+        start = np.searchsorted(position, intervals[:, 0])
+        end = np.searchsorted(position, intervals[:, 1])
+        candidate_site = np.concatenate(
+            [np.zeros(0, dtype=np.int64)]
+            + [np.arange(left, right) for left, right in zip(start, end)]
+        )
+    else:
+        candidate_site = np.flatnonzero(site_mask)
+        if intervals is not None:
+            # A position is in an interval if an odd number of interval endpoints
+            # are less than or equal to it
+            index = np.searchsorted(
+                intervals.ravel(), position[candidate_site], side="right"
+            )
+            candidate_site = candidate_site[index % 2 == 1]
+
+    return candidate_site
+
+
+def _sim_phenotype(
+    ts,
+    ts_path,
+    engine,
+    num_causal,
+    model,
+    h2,
+    random_seed,
+    genotype_matrix,
+    num_workers,
+    site_mask,
+    intervals,
+    frequency_bins,
+    frequency_weight,
+    individuals,
+    profile,
+):
+    """
+    Validates the inputs of :func:`sim_phenotype` and simulates quantitative traits
+    of individuals. The genotype engine is reused if it is given.
+    """
+    _check_sim_input(ts, num_causal, model, h2)
+    individuals = _check_individuals(ts, individuals)
+    if num_workers is not None:
+        if not isinstance(num_workers, numbers.Number):
+            raise TypeError("Number of workers should be an integer")
+        if int(num_workers) != num_workers or num_workers <= 0:
+            raise ValueError("Number of workers should be a positive integer")
+        num_workers = int(num_workers)
+    candidate_site = _candidate_site(ts, site_mask, intervals)
+    if candidate_site is not None and num_causal > len(candidate_site):
+        raise ValueError(
+            "There are less number of candidate sites than the inputted number of "
+            "causal sites"
+        )
+    if frequency_bins is not None and frequency_weight is not None:
+        raise ValueError("Frequency bins and frequency weight cannot both be specified")
+    if frequency_bins is not None:
+        for frequency_bin in frequency_bins:
+            if len(frequency_bin) != 3:
+                raise ValueError(
+                    "Frequency bins should be a list of (lower, upper, num_causal) "
+                    "tuples"
+                )
+            bin_num_causal = frequency_bin[2]
+            if int(bin_num_causal) != bin_num_causal or bin_num_causal < 0:
+                raise ValueError(
+                    "Number of causal sites of a frequency bin should be a "
+                    "non-negative integer"
+                )
+        edges = np.array([frequency_bin[:2] for frequency_bin in frequency_bins])
+        if np.any(edges[:, 0] >= edges[:, 1]) or np.any(edges[1:, 0] < edges[:-1, 1]):
+            raise ValueError(
+                "Frequency bins should be sorted and non-overlapping, with lower < "
+                "upper"
+            )
+        if sum(frequency_bin[2] for frequency_bin in frequency_bins) != num_causal:
+            raise ValueError(
+                "Number of causal sites of the frequency bins should sum to the "
+                "number of causal sites"
+            )
+    if frequency_weight is not None and not callable(frequency_weight):
+        raise TypeError("Frequency weight should be a callable")
+
+    simulator = PhenotypeSimulator(
+        ts=ts,
+        num_causal=num_causal,
+        h2=h2,
+        model=model,
+        random_seed=random_seed,
+        genotype_matrix=genotype_matrix,
+        num_workers=num_workers,
+        candidate_site=candidate_site,
+        frequency_bins=frequency_bins,
+        frequency_weight=frequency_weight,
+        engine=engine,
+        ts_path=ts_path,
+        individuals=individuals,
+        profile=profile,
+    )
+    simulator.profiler.start()
+    try:
+        genotypic_effect_data, individual_genetic_array = simulator.sim_genetic_value()
+        phenotype_data = simulator.sim_environment(individual_genetic_array)
+    finally:
+        simulator.profiler.stop()
+    sim_result = Result(
+        phenotype=phenotype_data,
+        genotype=genotypic_effect_data,
+        genotype_matrix=simulator.causal_genotype_matrix,
+        profile=simulator.profiler.profile,
+    )
+    return sim_result
+
+
+def sim_phenotype(
+    ts,
+    num_causal,
+    model,
+    h2=0.3,
+    random_seed=None,
+    genotype_matrix=False,
+    num_workers=None,
+    site_mask=None,
+    intervals=None,
+    frequency_bins=None,
+    frequency_weight=None,
+    individuals=None,
+    profile=False,
+):
     """Simulates quantitative traits of individuals based on the inputted tree sequence
     and the specified trait model, and returns a :class:`Result` object. See the
     :ref:`sec_simulation_output` section for more details on the output of the simulation
     model.
 
     :param ts: The tree sequence data that will be used in the quantitative trait
-        simulation. The tree sequence data must include a mutation.
-    :type ts: tskit.TreeSequence
+        simulation. The tree sequence data must include a mutation. If this is a
+        path, the tree sequence data is loaded from the file, and worker processes
+        load it from the same file instead of receiving a copy of it.
+    :type ts: tskit.TreeSequence or str or os.PathLike
     :param num_causal: Number of causal sites that will be chosen randomly. It should
         be a positive integer that is greater than the number of sites in the tree
         sequence data.
@@ -332,11 +1479,70 @@ def sim_phenotype(ts, num_causal, model, h2=0.3, random_seed=None):
         and examples.
     :type model: TraitModel
     :param h2: Narrow-sense heritability, which will be used to simulate environmental
-        noise. Narrow-sense heritability must be between 0 and 1.
-    :type h2: float
+        noise. Narrow-sense heritability must be between 0 and 1. If `model` is a
+        :class:`TraitModelMultivariateNormal` object, an array with one
+        narrow-sense heritability per trait can be given.
+    :type h2: float or numpy.ndarray(float)
     :param random_seed: The random seed. If this is not specified or None, simulation
-        will be done randomly.
+        will be done randomly. The causal alleles of all causal sites are drawn
+        before their effect sizes, so a given random seed does not reproduce the
+        output of tstrait 0.0.1.
     :type random_seed: None or int
+    :param genotype_matrix: If True, the genotypes of individuals at the causal sites
+        are stored as a sparse :class:`GenotypeMatrix` object in the output, and the
+        genetic values are computed from it by a single sparse matrix-vector product.
+        This uses memory proportional to the number of carriers of the causal
+        alleles.
+    :type genotype_matrix: bool
+    :param num_workers: Number of worker processes. If this is specified, the causal
+        sites are split into contiguous genomic chunks, and each chunk is processed
+        in a worker process with its own random generator by the single-threaded
+        kernel. For a given random seed, the output does not depend on the number of
+        workers or numba threads, but it differs from the output obtained without
+        specifying `num_workers`. The worker processes are started by spawning, so
+        scripts that use more than one worker must guard their entry point with
+        ``if __name__ == "__main__":``.
+    :type num_workers: None or int
+    :param site_mask: Boolean array with one entry per site in the tree sequence
+        data. If this is specified, the causal sites are only chosen among the sites
+        whose entry is True.
+    :type site_mask: None or numpy.ndarray(bool)
+    :param intervals: Array of shape (num_intervals, 2) of sorted, non-overlapping
+        genomic intervals [left, right). If this is specified, the causal sites are
+        only chosen among the sites located in the intervals. If both `site_mask`
+        and `intervals` are specified, the causal sites must satisfy both. The tree
+        sequence data is not copied in either case.
+    :type intervals: None or numpy.ndarray(float)
+    :param frequency_bins: List of `(lower, upper, num_causal)` tuples. If this is
+        specified, `num_causal` causal sites are chosen uniformly at random among the
+        sites whose minor allele frequency is in [lower, upper) for each bin, and the
+        numbers of causal sites of the bins must sum to `num_causal`. The minor
+        allele frequencies of all sites are computed in a single pass over the tree
+        sequence.
+    :type frequency_bins: None or list
+    :param frequency_weight: Function that takes a numpy array of minor allele
+        frequencies and returns the non-negative sampling weight of each site. If
+        this is specified, the causal sites are chosen with probability proportional
+        to their weight. It cannot be used together with `frequency_bins`.
+    :type frequency_weight: None or callable
+    :param individuals: IDs of the individuals whose phenotypes are simulated. If
+        this is specified, only the sample nodes of these individuals are genotyped,
+        the subtrees that do not contain any of them are not traversed, and the
+        arrays of the :class:`PhenotypeResult` object and the rows of the genotype
+        matrix follow the order of `individuals`. The causal alleles, their
+        frequencies and the effect sizes are the same as in the simulation of all
+        individuals, so the genetic values are the genetic values of these
+        individuals in that simulation. The environmental noise is computed among
+        these individuals. If this is not specified, the phenotypes of all
+        individuals with sample nodes are simulated.
+    :type individuals: None or numpy.ndarray(int)
+    :param profile: If True, the wall time, the number of calls and the allocated
+        memory of each phase of the simulation, and the numbers of trees visited and
+        nodes traversed, are recorded in a :class:`Profile` object in the `profile`
+        attribute of the output. Memory is traced with :mod:`tracemalloc` while
+        profiling, which slows the simulation down. See the
+        :ref:`sec_simulation_profile` section for more details.
+    :type profile: bool
     :return: Returns the :class:`Result` object that includes the simulated information
         obtained from `tstrait`. The :class:`Result` object includes a
         :class:`PhenotypeResult` object and a :class:`GenotypeResult` object. A
@@ -344,34 +1550,351 @@ def sim_phenotype(ts, num_causal, model, h2=0.3, random_seed=None):
         individuals, as explained in :ref:`sec_simulation_output_phenotype` section. A
         :class:`GenotypeResult` object contains simulated information regarding the
         causal sites, as explained in :ref:`sec_simulation_output_genotype` section.
+        If `model` is a :class:`TraitModelMultivariateNormal` object, the
+        `phenotype`, `environment_noise` and `genetic_value` arrays have one column
+        per trait, and the `effect_size` array has one column per trait.
     :rtype: Result
     """
 
-    if not isinstance(ts, tskit.TreeSequence):
-        raise TypeError("Input should be a tree sequence data")
-    if not isinstance(num_causal, numbers.Number):
-        raise TypeError("Number of causal sites should be an integer")
-    if int(num_causal) != num_causal or num_causal <= 0:
-        raise ValueError("Number of causal sites should be a positive integer")
-    if not isinstance(model, trait_model.TraitModel):
-        raise TypeError("Trait model must be an instance of TraitModel")
-    if not isinstance(h2, numbers.Number):
-        raise TypeError("Heritability should be a number")
-    if h2 > 1 or h2 < 0:
-        raise ValueError("Heritability should be 0 <= h2 <= 1")
-    num_sites = ts.num_sites
-    if num_sites == 0:
-        raise ValueError("No mutation in the provided data")
-    if num_causal > num_sites:
-        raise ValueError(
-            "There are less number of sites in the tree sequence than the inputted "
-            "number of causal sites"
-        )
+    ts, ts_path = _load_tree_sequence(ts)
+    return _sim_phenotype(
+        ts=ts,
+        ts_path=ts_path,
+        engine=None,
+        num_causal=num_causal,
+        model=model,
+        h2=h2,
+        random_seed=random_seed,
+        genotype_matrix=genotype_matrix,
+        num_workers=num_workers,
+        site_mask=site_mask,
+        intervals=intervals,
+        frequency_bins=frequency_bins,
+        frequency_weight=frequency_weight,
+        individuals=individuals,
+        profile=profile,
+    )
+
+
+def _sim_phenotype_replicates(
+    ts, ts_path, engine, num_causal, model, h2, num_replicates, random_seed
+):
+    """
+    Validates the inputs of :func:`sim_phenotype_replicates` and simulates multiple
+    replicates of quantitative traits. The genotype engine is reused if it is given.
+    """
+    _check_sim_input(ts, num_causal, model, h2)
+    _check_num_replicates(num_replicates)
 
     simulator = PhenotypeSimulator(
-        ts=ts, num_causal=num_causal, h2=h2, model=model, random_seed=random_seed
+        ts=ts,
+        num_causal=num_causal,
+        h2=h2,
+        model=model,
+        random_seed=random_seed,
+        engine=engine,
+        ts_path=ts_path,
     )
-    genotypic_effect_data, individual_genetic_array = simulator.sim_genetic_value()
+    (
+        genotypic_effect_data,
+        individual_genetic_array,
+    ) = simulator.sim_genetic_value_replicates(int(num_replicates))
     phenotype_data = simulator.sim_environment(individual_genetic_array)
-    sim_result = Result(phenotype=phenotype_data, genotype=genotypic_effect_data)
+    sim_result = Result(
+        phenotype=phenotype_data,
+        genotype=genotypic_effect_data,
+        genotype_matrix=simulator.causal_genotype_matrix,
+    )
     return sim_result
+
+
+def _iter_phenotype_replicates(simulator, num_replicates, chunk_size):
+    """
+    Yields :class:`Result` objects with chunks of replicates that share the causal
+    sites, the causal alleles and the genotypes of the first chunk.
+    """
+    genotypic_effect_data = None
+    for start in range(0, num_replicates, chunk_size):
+        (
+            genotypic_effect_data,
+            individual_genetic_array,
+        ) = simulator.sim_genetic_value_replicates(
+            min(chunk_size, num_replicates - start), genotypic_effect_data
+        )
+        phenotype_data = simulator.sim_environment(individual_genetic_array)
+        yield Result(
+            phenotype=phenotype_data,
+            genotype=genotypic_effect_data,
+            genotype_matrix=simulator.causal_genotype_matrix,
+        )
+
+
+def sim_phenotype_replicates(
+    ts, num_causal, model, h2=0.3, num_replicates=1, random_seed=None
+):
+    """Simulates multiple replicates of quantitative traits of individuals that share
+    the same causal sites and causal alleles, and returns a :class:`Result` object.
+
+    The causal sites, the causal alleles and the genotypes of individuals at the
+    causal sites are computed once and reused by all replicates. Effect sizes and
+    environmental noise of all replicates are simulated in bulk, and genetic values
+    are obtained by a single sparse matrix product. The results differ from those of
+    repeated calls to :func:`sim_phenotype`, as the random numbers are drawn in a
+    different order.
+
+    :param ts: The tree sequence data that will be used in the quantitative trait
+        simulation. The tree sequence data must include a mutation. If this is a
+        path, the tree sequence data is loaded from the file, and worker processes
+        load it from the same file instead of receiving a copy of it.
+    :type ts: tskit.TreeSequence or str or os.PathLike
+    :param num_causal: Number of causal sites that will be chosen randomly. It should
+        be a positive integer that is greater than the number of sites in the tree
+        sequence data.
+    :type num_causal: int
+    :param model: Trait model that will be used to simulate effect sizes of causal sites.
+        See the :ref:`sec_trait_model` section for more details on the available models
+        and examples.
+    :type model: TraitModel
+    :param h2: Narrow-sense heritability, which will be used to simulate environmental
+        noise. Narrow-sense heritability must be between 0 and 1. If `model` is a
+        :class:`TraitModelMultivariateNormal` object, an array with one
+        narrow-sense heritability per trait can be given.
+    :type h2: float or numpy.ndarray(float)
+    :param num_replicates: Number of replicates. It should be a positive integer.
+    :type num_replicates: int
+    :param random_seed: The random seed. If this is not specified or None, simulation
+        will be done randomly.
+    :type random_seed: None or int
+    :return: Returns the :class:`Result` object that includes the simulated information
+        of all replicates. The `phenotype`, `environment_noise` and `genetic_value`
+        arrays of the :class:`PhenotypeResult` object and the `effect_size` array of
+        the :class:`GenotypeResult` object have one column per replicate. The
+        genotypes of individuals at the causal sites are returned as a
+        :class:`GenotypeMatrix` object. If `model` is a
+        :class:`TraitModelMultivariateNormal` object, these arrays have an additional
+        last axis with one entry per trait.
+    :rtype: Result
+    """
+
+    ts, ts_path = _load_tree_sequence(ts)
+    return _sim_phenotype_replicates(
+        ts=ts,
+        ts_path=ts_path,
+        engine=None,
+        num_causal=num_causal,
+        model=model,
+        h2=h2,
+        num_replicates=num_replicates,
+        random_seed=random_seed,
+    )
+
+
+class SimulationSession:
+    """Simulation session that is bound to one tree sequence, and that simulates
+    quantitative traits of individuals repeatedly with amortized setup cost.
+
+    The arrays that are derived from the tree sequence data are computed once when
+    the session is created, and they are reused by all simulations of the session.
+    These include the node to individual map, the individual of each sample node, the
+    ploidy of each individual, the site positions, the tree breakpoints, the mutation
+    parents and the integer codes of the allele states. The minor allele frequencies
+    of the sites are computed on first use and cached. For a given random seed, the
+    output of :meth:`simulate` is identical to the output of :func:`sim_phenotype`.
+
+    :param ts: The tree sequence data that will be used in the quantitative trait
+        simulations. The tree sequence data must include a mutation. If this is a
+        path, the tree sequence data is loaded from the file.
+    :type ts: tskit.TreeSequence or str or os.PathLike
+    """
+
+    def __init__(self, ts):
+        ts, self.ts_path = _load_tree_sequence(ts)
+        if not isinstance(ts, tskit.TreeSequence):
+            raise TypeError("Input should be a tree sequence data")
+        self.ts = ts
+        self.engine = genotype.GenotypeEngine(ts)
+        self.nodes_individual = self.engine.nodes_individual
+        self.sample_individual = self.engine.sample_individual
+        self.individual_ploidy = self.engine.individual_ploidy
+        self.sites_position = self.engine.sites_position
+        self.mutations_parent = self.engine.mutations_parent
+
+    def site_frequency(self):
+        """Returns the minor allele frequency of all sites, which is computed on the
+        first call and cached.
+
+        :return: Returns a numpy array with the minor allele frequency of each site.
+        :rtype: numpy.ndarray(float)
+        """
+        return self.engine.site_frequency()
+
+    def simulate(
+        self,
+        num_causal,
+        model,
+        h2=0.3,
+        random_seed=None,
+        genotype_matrix=False,
+        num_workers=None,
+        site_mask=None,
+        intervals=None,
+        frequency_bins=None,
+        frequency_weight=None,
+        individuals=None,
+        profile=False,
+    ):
+        """Simulates quantitative traits of individuals based on the tree sequence of
+        the session, and returns a :class:`Result` object. The arguments are the
+        same as the arguments of :func:`sim_phenotype`.
+
+        :return: Returns the :class:`Result` object that includes the simulated
+            information obtained from `tstrait`.
+        :rtype: Result
+        """
+        return _sim_phenotype(
+            ts=self.ts,
+            ts_path=self.ts_path,
+            engine=self.engine,
+            num_causal=num_causal,
+            model=model,
+            h2=h2,
+            random_seed=random_seed,
+            genotype_matrix=genotype_matrix,
+            num_workers=num_workers,
+            site_mask=site_mask,
+            intervals=intervals,
+            frequency_bins=frequency_bins,
+            frequency_weight=frequency_weight,
+            individuals=individuals,
+            profile=profile,
+        )
+
+    def simulate_replicates(
+        self, num_causal, model, h2=0.3, num_replicates=1, random_seed=None
+    ):
+        """Simulates multiple replicates of quantitative traits of individuals that
+        share the same causal sites and causal alleles, and returns a :class:`Result`
+        object. The arguments are the same as the arguments of
+        :func:`sim_phenotype_replicates`.
+
+        :return: Returns the :class:`Result` object that includes the simulated
+            information of all replicates.
+        :rtype: Result
+        """
+        return _sim_phenotype_replicates(
+            ts=self.ts,
+            ts_path=self.ts_path,
+            engine=self.engine,
+            num_causal=num_causal,
+            model=model,
+            h2=h2,
+            num_replicates=num_replicates,
+            random_seed=random_seed,
+        )
+
+    def iter_replicates(
+        self,
+        num_causal,
+        model,
+        h2=0.3,
+        num_replicates=1,
+        chunk_size=1,
+        random_seed=None,
+    ):
+        """Simulates multiple replicates of quantitative traits of individuals that
+        share the same causal sites and causal alleles in chunks, and returns an
+        iterator over :class:`Result` objects with `chunk_size` replicates each
+        (the last chunk can be smaller). The causal sites, the causal alleles and the
+        genotypes of individuals are computed for the first chunk and reused by the
+        other chunks, so the chunks can be appended to a directory with
+        :meth:`Result.to_directory` without holding all replicates in memory. The
+        other arguments are the same as the arguments of
+        :func:`sim_phenotype_replicates`, but the results differ from those of
+        :meth:`simulate_replicates`, as the random numbers are drawn in a different
+        order.
+
+        :param chunk_size: Number of replicates of each chunk. It should be a
+            positive integer.
+        :type chunk_size: int
+        :return: Returns an iterator over :class:`Result` objects.
+        :rtype: iterator
+        """
+        _check_sim_input(self.ts, num_causal, model, h2)
+        _check_num_replicates(num_replicates)
+        _check_num_replicates(chunk_size, name="Chunk size")
+        simulator = PhenotypeSimulator(
+            ts=self.ts,
+            num_causal=num_causal,
+            h2=h2,
+            model=model,
+            random_seed=random_seed,
+            engine=self.engine,
+            ts_path=self.ts_path,
+        )
+        return _iter_phenotype_replicates(
+            simulator, int(num_replicates), int(chunk_size)
+        )
+
+
+def _warmup_tree_sequence():
+    """
+    Returns a small tree sequence with two trees, two diploid individuals and
+    sites with multiple mutations, which is used to compile the numba kernels.
+    """
+    tables = tskit.Tree.generate_balanced(4, span=10).tree_sequence.dump_tables()
+    tables.edges.clear()
+    # Nodes 0-3 are samples, and the root is node 6 in both trees
+    tables.edges.add_row(0, 10, 4, 0)
+    tables.edges.add_row(0, 10, 4, 1)
+    tables.edges.add_row(0, 5, 5, 2)
+    tables.edges.add_row(0, 5, 5, 3)
+    tables.edges.add_row(5, 10, 4, 2)
+    tables.edges.add_row(5, 10, 6, 3)
+    tables.edges.add_row(0, 5, 6, 4)
+    tables.edges.add_row(0, 5, 6, 5)
+    tables.edges.add_row(5, 10, 6, 4)
+    tables.individuals.add_row()
+    tables.individuals.add_row()
+    individual = tables.nodes.individual
+    individual[:4] = [0, 0, 1, 1]
+    tables.nodes.individual = individual
+    tables.sites.add_row(2, "A")
+    tables.sites.add_row(7, "A")
+    tables.mutations.add_row(site=0, node=4, derived_state="T")
+    tables.mutations.add_row(site=0, node=0, derived_state="C", parent=0)
+    tables.mutations.add_row(site=1, node=3, derived_state="T")
+    tables.sort()
+    tables.build_index()
+    tables.compute_mutation_parents()
+    return tables.tree_sequence()
+
+
+def warmup():
+    """Compiles all numba kernels of tstrait by running small simulations.
+
+    The kernels are compiled on their first call with the argument types that
+    tstrait passes to them, and the compiled code is cached on disk, so that later
+    processes load the kernels from the cache instead of compiling them. Calling
+    this function once, for example when building a container image or before
+    starting many short-lived worker processes, removes the compilation time from
+    the first simulation of each process. The location of the cache can be set
+    with the ``NUMBA_CACHE_DIR`` environment variable.
+    """
+    ts = _warmup_tree_sequence()
+    model = trait_model.TraitModelAdditive(trait_mean=0, trait_var=1)
+    session = SimulationSession(ts)
+    session.site_frequency()
+    for genotype_matrix in [False, True]:
+        session.simulate(2, model, random_seed=1, genotype_matrix=genotype_matrix)
+    session.simulate(2, model, random_seed=1, individuals=[0])
+    session.simulate(2, model, random_seed=1, profile=True)
+    session.simulate_replicates(2, model, num_replicates=2, random_seed=1)
+
+    engine = session.engine
+    tree = engine.tree
+    tree.first()
+    site_id = np.array([0], dtype=np.int64)
+    causal_code = engine.state_code(["T"])
+    engine.tree_genetic_value_threaded(
+        tree, site_id, causal_code, np.zeros((1, 1)), np.zeros((2, 1))
+    )
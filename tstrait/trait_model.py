@@ -35,6 +35,21 @@ class TraitModel:
         :return: Simulated effect size of a causal mutation.
         :rtype: float
         """
+        self._check_effect_size_input(num_causal, allele_freq, rng)
+
+        if self.trait_var == 0:
+            beta = self.trait_mean / num_causal
+        else:
+            beta = rng.normal(
+                loc=self.trait_mean / num_causal,
+                scale=np.sqrt(self.trait_var / num_causal),
+            )
+        return beta
+
+    def _check_effect_size_input(self, num_causal, allele_freq, rng):
+        """
+        Validate the inputs of `sim_effect_size`.
+        """
         if not isinstance(num_causal, numbers.Number):
             raise TypeError("Number of causal sites should be a number")
         if not isinstance(allele_freq, numbers.Number):
@@ -44,12 +59,57 @@ class TraitModel:
         if not isinstance(rng, np.random.Generator):
             raise TypeError("rng should be a numpy random generator")
 
+    def sim_effect_sizes(self, num_causal, allele_freq, rng):
+        """
+        This method simulates the effect sizes of multiple causal mutations at once,
+        assuming that they follow a normal distribution with a constant standard
+        deviation. The inputs are validated once, and all effect sizes are simulated
+        by a single call to the random generator. The `allele_freq` input is only
+        used to determine the number of effect sizes.
+
+        :param num_causal: Number of causal sites.
+        :type num_causal: int
+        :param allele_freq: Allele frequencies of the causal mutations.
+        :type allele_freq: numpy.ndarray(float)
+        :param rng: Random generator that will be used to simulate effect sizes.
+        :type rng: numpy.random.Generator
+        :return: Simulated effect sizes of the causal mutations, with one entry per
+            entry of `allele_freq`.
+        :rtype: numpy.ndarray(float)
+        """
+        allele_freq = self._check_effect_sizes_input(num_causal, allele_freq, rng)
+        beta = self._sim_effect_sizes(num_causal, allele_freq, rng)
+        return beta
+
+    def _check_effect_sizes_input(self, num_causal, allele_freq, rng):
+        """
+        Validate the inputs of `sim_effect_sizes`, and return the allele frequencies
+        as a numpy array.
+        """
+        if not isinstance(num_causal, numbers.Number):
+            raise TypeError("Number of causal sites should be a number")
+        if int(num_causal) != num_causal or num_causal <= 0:
+            raise ValueError("Number of causal sites should be a positive integer")
+        allele_freq = np.asarray(allele_freq)
+        if allele_freq.ndim != 1 or allele_freq.dtype.kind not in "iuf":
+            raise TypeError("Allele frequency should be a one dimensional array")
+        if not isinstance(rng, np.random.Generator):
+            raise TypeError("rng should be a numpy random generator")
+        return allele_freq
+
+    def _sim_effect_sizes(self, num_causal, allele_freq, rng):
+        """
+        Simulates the effect sizes of causal mutations whose allele frequencies are
+        given by the `allele_freq` array, by using a single call to the random
+        generator. The inputs are not validated.
+        """
         if self.trait_var == 0:
-            beta = self.trait_mean / num_causal
+            beta = np.full(len(allele_freq), self.trait_mean / num_causal)
         else:
             beta = rng.normal(
                 loc=self.trait_mean / num_causal,
                 scale=np.sqrt(self.trait_var / num_causal),
+                size=len(allele_freq),
             )
         return beta
 
@@ -93,6 +153,23 @@ class TraitModelAdditive(TraitModel):
         beta = super().sim_effect_size(num_causal, allele_freq, rng)
         return beta
 
+    def sim_effect_sizes(self, num_causal, allele_freq, rng):
+        """
+        This method uses `sim_effect_sizes` from `TraitModel` to simulate the effect
+        sizes of multiple causal mutations at once.
+
+        :param num_causal: Number of causal sites.
+        :type num_causal: int
+        :param allele_freq: Allele frequencies of the causal mutations.
+        :type allele_freq: numpy.ndarray(float)
+        :param rng: Random generator that will be used to simulate effect sizes.
+        :type rng: numpy.random.Generator
+        :return: Simulated effect sizes of the causal mutations.
+        :rtype: numpy.ndarray(float)
+        """
+        beta = super().sim_effect_sizes(num_causal, allele_freq, rng)
+        return beta
+
 
 class TraitModelAlleleFrequency(TraitModel):
     """Allele frequency trait model class, where the distribution of effect size
@@ -143,5 +220,106 @@ class TraitModelAlleleFrequency(TraitModel):
         beta = super().sim_effect_size(num_causal, allele_freq, rng)
         if allele_freq >= 1 or allele_freq <= 0:
             raise ValueError("Allele frequency should be 0 < Allele frequency < 1")
-        beta *= np.sqrt(pow(2 * allele_freq * (1 - allele_freq), self.alpha))
+        beta *= np.sqrt(np.power(2 * allele_freq * (1 - allele_freq), self.alpha))
+        return beta
+
+    def sim_effect_sizes(self, num_causal, allele_freq, rng):
+        """
+        This method simulates the effect sizes of multiple causal mutations at once
+        from :func:`TraitModel.sim_effect_sizes`, and multiplies them by a constant
+        that depends on `allele_freq` and `alpha` as a single array operation.
+
+        :param num_causal: Number of causal sites
+        :type num_causal: int
+        :param allele_freq: Allele frequencies of the causal mutations
+        :type allele_freq: numpy.ndarray(float)
+        :param rng: Random generator that will be used to simulate effect sizes
+        :type rng: numpy.random.Generator
+        :return: Simulated effect sizes of the causal mutations
+        :rtype: numpy.ndarray(float)
+        """
+        beta = super().sim_effect_sizes(num_causal, allele_freq, rng)
+        return beta
+
+    def _sim_effect_sizes(self, num_causal, allele_freq, rng):
+        """
+        Simulates the effect sizes of causal mutations whose allele frequencies are
+        given by the `allele_freq` array, and scales them by the allele frequency
+        dependent constant.
+        """
+        if np.any((allele_freq >= 1) | (allele_freq <= 0)):
+            raise ValueError("Allele frequency should be 0 < Allele frequency < 1")
+        beta = super()._sim_effect_sizes(num_causal, allele_freq, rng)
+        beta *= np.sqrt(np.power(2 * allele_freq * (1 - allele_freq), self.alpha))
+        return beta
+
+
+class TraitModelMultivariateNormal(TraitModel):
+    """Multivariate normal trait model class, which simulates the effect sizes of
+    multiple correlated traits at once. The effect sizes of each causal site on all
+    traits are simulated from a multivariate normal distribution, and the
+    distribution does not depend on allele frequency. See the
+    :ref:`sec_trait_model_multivariate` section for more details on this model.
+
+    :param trait_mean: Mean vector of the simulated effect sizes, with one value per
+        trait.
+    :type trait_mean: list or numpy.ndarray(float)
+    :param trait_cov: Covariance matrix of the simulated effect sizes, with one row
+        and one column per trait. It must be symmetric and positive semi-definite.
+    :type trait_cov: list or numpy.ndarray(float)
+    """
+
+    def __init__(self, trait_mean, trait_cov):
+        trait_mean = np.asarray(trait_mean, dtype=np.float64)
+        trait_cov = np.asarray(trait_cov, dtype=np.float64)
+        if trait_mean.ndim != 1 or len(trait_mean) == 0:
+            raise ValueError("Trait mean should be a one dimensional array")
+        num_trait = len(trait_mean)
+        if trait_cov.shape != (num_trait, num_trait):
+            raise ValueError(
+                "Trait covariance should be a square matrix with one row and one "
+                "column per trait"
+            )
+        if not np.allclose(trait_cov, trait_cov.T):
+            raise ValueError("Trait covariance should be a symmetric matrix")
+        # Same tolerance as numpy.random.Generator.multivariate_normal
+        if np.linalg.eigvalsh(trait_cov).min() < -1e-8:
+            raise ValueError("Trait covariance should be positive semi-definite")
+        super().__init__("multi_normal", trait_mean, np.diag(trait_cov).copy())
+        self.trait_cov = trait_cov
+        self.num_trait = num_trait
+
+    def sim_effect_size(self, num_causal, allele_freq, rng):
+        """
+        This method simulates the effect sizes of a causal mutation on all traits
+        from a multivariate normal distribution. The `allele_freq` input is not used
+        to simulate the effect sizes.
+
+        :param num_causal: Number of causal sites.
+        :type num_causal: int
+        :param allele_freq: Allele frequency of the causal mutation.
+        :type allele_freq: float
+        :param rng: Random generator that will be used to simulate effect size.
+        :type rng: numpy.random.Generator
+        :return: Simulated effect sizes of a causal mutation, with one value per
+            trait.
+        :rtype: numpy.ndarray(float)
+        """
+        self._check_effect_size_input(num_causal, allele_freq, rng)
+        beta = self._sim_effect_sizes(num_causal, np.array([allele_freq]), rng)[0]
+        return beta
+
+    def _sim_effect_sizes(self, num_causal, allele_freq, rng):
+        """
+        Simulates the effect sizes of causal mutations on all traits, with one row
+        per entry of the `allele_freq` array and one column per trait.
+        """
+        if not np.any(self.trait_cov):
+            beta = np.tile(self.trait_mean / num_causal, (len(allele_freq), 1))
+        else:
+            beta = rng.multivariate_normal(
+                mean=self.trait_mean / num_causal,
+                cov=self.trait_cov / num_causal,
+                size=len(allele_freq),
+            )
         return beta